@@ -1,32 +1,18 @@
-
-
 from flask import Flask, session, send_from_directory
 from flask_cors import CORS
 from flask_login import LoginManager
 import os
 
+import db
 from config import get_secret_key
 from extensions import mail
 from models.models import User
+from profiling import init_profiling
 from routes.authnew import auth_bp
-
-# 📦 App Flask
-app = Flask(__name__)
-app.secret_key = get_secret_key()
-CORS(app, supports_credentials=True)
-
-# 📧 Configuration mail
-app.config['MAIL_SERVER'] = 'smtp.gmail.com'
-app.config['MAIL_PORT'] = 587
-app.config['MAIL_USE_TLS'] = True
-app.config['MAIL_USERNAME'] = 'cesarboutoile@gmail.com'
-app.config['MAIL_PASSWORD'] = 'ufnp rloc neqo accx'
-app.config['MAIL_DEFAULT_SENDER'] = 'cesarboutoile@gmail.com'
-mail.init_app(app)
+from televersements import init_televersements
 
 # 🔐 Authentification
 login_manager = LoginManager()
-login_manager.init_app(app)
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -36,30 +22,90 @@ def load_user(user_id):
 UPLOAD_FOLDER = os.path.join(os.getcwd(), 'uploads')
 PROFILS_FOLDER = os.path.join(UPLOAD_FOLDER, 'profils')
 
-# Crée le dossier profils s'il n'existe pas
-os.makedirs(PROFILS_FOLDER, exist_ok=True)
-
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-# Route pour servir les avatars
-@app.route('/uploads/profils/<path:filename>')
-def uploaded_file(filename):
-    return send_from_directory(PROFILS_FOLDER, filename)
 
-# 🔄 Enregistrement des routes
-app.register_blueprint(auth_bp, url_prefix="/auth")
+# 📦 Fabrique de l'application Flask
+def create_app(config=None):
+    app = Flask(__name__)
+    app.secret_key = get_secret_key()
+    CORS(app, supports_credentials=True)
+
+    # 📧 Configuration mail
+    app.config['MAIL_SERVER'] = 'smtp.gmail.com'
+    app.config['MAIL_PORT'] = 587
+    app.config['MAIL_USE_TLS'] = True
+    app.config['MAIL_USERNAME'] = 'cesarboutoile@gmail.com'
+    app.config['MAIL_PASSWORD'] = 'ufnp rloc neqo accx'
+    app.config['MAIL_DEFAULT_SENDER'] = 'cesarboutoile@gmail.com'
+
+    # 🗄️ Pool de connexions PostgreSQL (par worker)
+    app.config['DB_POOL_MIN'] = 1
+    app.config['DB_POOL_MAX'] = 10
+
+    app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+
+    # 📤 Fichiers envoyés : taille plafonnée, écrits sur disque pendant la réception
+    app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_UPLOAD_MB', 200)) * 1024 * 1024
+    app.config['UPLOAD_SPOOL_FOLDER'] = os.path.join(UPLOAD_FOLDER, 'spool')
+    app.config['UPLOAD_SPOOL_TTL'] = 24 * 3600
+
+    # 👀 Aperçus d'import : artefacts Arrow conservés une heure
+    app.config['IMPORT_ARTEFACTS_FOLDER'] = os.path.join(UPLOAD_FOLDER, 'imports')
+    app.config['IMPORT_ARTEFACTS_TTL'] = 3600
+
+    # 🗃️ Archive des fichiers importés (adressée par contenu), pour rejouer les imports
+    app.config['IMPORT_ARCHIVE_FOLDER'] = os.path.join(UPLOAD_FOLDER, 'archive')
 
-# ✅ Test de vie
-@app.route("/")
-def index():
-    return "API en ligne"
+    # 🧩 Envois fragmentés (gros fichiers) : abandonnés après 24 h sans fragment reçu
+    app.config['IMPORT_ENVOIS_FOLDER'] = os.path.join(UPLOAD_FOLDER, 'envois')
+    app.config['IMPORT_ENVOIS_TTL'] = 24 * 3600
 
-# ▶️ Lancement
+    # 🔬 Profilage à la demande (en-tête X-Profile: 1, administrateurs uniquement) :
+    # profils conservés 7 jours, 200 au plus
+    app.config['PROFILING_ENABLED'] = True
+    app.config['PROFILING_TTL'] = 7 * 24 * 3600
+    app.config['PROFILING_MAX'] = 200
+
+    # Surcharges fournies par l'appelant (tests, wsgi, scripts...)
+    if config:
+        app.config.update(config)
+
+    mail.init_app(app)
+    login_manager.init_app(app)
+
+    # Crée le dossier profils s'il n'existe pas
+    os.makedirs(PROFILS_FOLDER, exist_ok=True)
+
+    # Route pour servir les avatars
+    @app.route('/uploads/profils/<path:filename>')
+    def uploaded_file(filename):
+        return send_from_directory(PROFILS_FOLDER, filename)
+
+    # 🔄 Enregistrement des routes
+    app.register_blueprint(auth_bp, url_prefix="/auth")
+    init_profiling(app)
+    init_televersements(app)
+
+    # ✅ Test de vie
+    @app.route("/")
+    def index():
+        return "API en ligne"
+
+    return app
+
+
+# ⚙️ Initialisation propre à chaque worker (après le fork)
+def init_worker(app):
+    """Ressources qui ne doivent pas être partagées entre processus : pool DB, caches."""
+    db.init_pool(app.config['DB_POOL_MIN'], app.config['DB_POOL_MAX'])
+
+
+# ▶️ Lancement (serveur de développement)
 if __name__ == "__main__":
+    app = create_app()
+    init_worker(app)
     app.run(host="0.0.0.0", port=5000, debug=True)
-
@@ -0,0 +1,96 @@
+"""
+Comparaison des formats d'import (xlsx, csv, csv.gz, ods, parquet) sur un même jeu de données.
+
+Le classeur fourni est converti dans chaque format (dossier temporaire), puis
+chaque fichier est lu et préparé comme par import_excel. Le débit de lecture
+est mesuré, et l'empreinte des lignes comparée à celle du classeur : un format
+qui ne produit pas les mêmes lignes est signalé. Aucune écriture en base.
+
+Usage (depuis backend/) :
+    python benchmarks/bench_formats.py classeur.xlsx
+    python benchmarks/bench_formats.py classeur.xlsx --formats xlsx,csv,parquet --sortie resultats.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from importation import entetes, pipeline, plans
+
+EXTENSIONS = {"xlsx": ".xlsx", "csv": ".csv", "csv.gz": ".csv.gz", "ods": ".ods", "parquet": ".parquet"}
+
+
+def convertir(brut, fmt, chemin):
+    if fmt == "csv":
+        brut.to_csv(chemin, index=False)
+    elif fmt == "csv.gz":
+        brut.to_csv(chemin, index=False, compression="gzip")
+    elif fmt == "ods":
+        brut.to_excel(chemin, index=False, engine="odf")
+    elif fmt == "parquet":
+        brut.to_parquet(chemin, index=False)
+
+
+def mesurer(chemin, fmt, plan, repetitions):
+    """Meilleure durée de lecture + préparation, et DataFrame préparé."""
+    format_fichier = "csv" if fmt == "csv.gz" else fmt
+    durees = []
+    for _ in range(repetitions):
+        with open(chemin, "rb") as f:
+            debut = time.perf_counter()
+            df = plans.appliquer(plan, pipeline.lire_fichier(f, plan, format_fichier))
+            durees.append(time.perf_counter() - debut)
+    return min(durees), df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark des formats d'import.")
+    parser.add_argument('fichier', help="Classeur .xlsx de référence")
+    parser.add_argument('--formats', default=','.join(EXTENSIONS))
+    parser.add_argument('--repetitions', type=int, default=3)
+    parser.add_argument('--sortie', help="Fichier JSON (format compare_baseline.py)")
+    args = parser.parse_args(argv)
+
+    with open(args.fichier, "rb") as f:
+        type_fichier = entetes.detecter(entetes.lire_entetes(f) or [])
+    if type_fichier is None:
+        parser.error("en-têtes du classeur non reconnus")
+    plan = plans.plan(type_fichier)
+
+    # Données sources telles que lues dans le classeur (toutes colonnes, types d'origine)
+    brut = pd.read_excel(args.fichier)
+    reference = None
+
+    resultats = {'import_formats': {}}
+    print(f"{'format':<8} {'taille (Ko)':>12} {'lecture (s)':>12} {'lignes/s':>10} {'identique':>10}")
+    with tempfile.TemporaryDirectory() as dossier:
+        for fmt in args.formats.split(','):
+            chemin = args.fichier
+            if fmt != "xlsx":
+                chemin = os.path.join(dossier, "donnees" + EXTENSIONS[fmt])
+                convertir(brut, fmt, chemin)
+
+            duree, df = mesurer(chemin, fmt, plan, args.repetitions)
+            empreintes = pipeline.empreintes_lignes(df)
+            if reference is None:
+                reference = empreintes
+            identique = len(empreintes) == len(reference) and (empreintes == reference).all()
+
+            debit = len(df) / duree
+            print(f"{fmt:<8} {os.path.getsize(chemin) / 1024:>12.0f} {duree:>12.3f} {debit:>10.0f} "
+                  f"{'oui' if identique else 'NON':>10}")
+            resultats['import_formats'][fmt] = {'rows_per_second': round(debit, 1)}
+
+    if args.sortie:
+        with open(args.sortie, 'w') as f:
+            json.dump(resultats, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Mesure du débit de chargement de import_excel selon le moteur et le nombre de connexions.
+
+Le fichier est lu et préparé une fois, puis chargé pour chaque configuration
+dans une transaction annulée à la fin (les faits ne sont pas conservés ; les
+dimensions ajoutées par le mode parallèle, si).
+
+Usage (depuis backend/, avec config.ini) :
+    python benchmarks/bench_import.py classeur.xlsx --id-type-projet 1 --connexions 1,2,4,8
+    python benchmarks/bench_import.py classeur.xlsx --id-type-projet 1 --moteur lignes --sortie resultats.json
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+from importation import pipeline, plans
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark du chargement des imports.")
+    parser.add_argument('fichier')
+    parser.add_argument('--id-type-projet', required=True)
+    parser.add_argument('--moteur', choices=pipeline.MOTEURS, default='sql')
+    parser.add_argument('--connexions', default='1', help="Liste de K séparés par des virgules, ex. 1,2,4,8")
+    parser.add_argument('--repetitions', type=int, default=3)
+    parser.add_argument('--sortie', help="Fichier JSON (format compare_baseline.py)")
+    args = parser.parse_args(argv)
+
+    liste_k = [int(k) for k in args.connexions.split(',')]
+    db.init_pool(1, max(liste_k) + 2)
+
+    conn = db.get_connection()
+    with conn.cursor() as cur:
+        cur.execute("SELECT type_fichier FROM type_projet WHERE id_type_projet = %s", (args.id_type_projet,))
+        type_fichier = cur.fetchone()[0]
+    conn.rollback()
+
+    plan = plans.plan(type_fichier)
+    df = pipeline.preparer(pipeline.lire_excel(args.fichier, plan), plan)
+
+    resultats = {'import_excel': {}}
+    print(f"{'moteur':<8} {'K':>3} {'lignes':>8} {'meilleur (s)':>13} {'lignes/s':>10}")
+    for k in liste_k:
+        mesures = [
+            pipeline.charger(conn, df, args.id_type_projet, 'benchmark', os.path.basename(args.fichier),
+                             moteur=args.moteur, connexions=k, valider=False)
+            for _ in range(args.repetitions)
+        ]
+        meilleure = min(mesures, key=lambda m: m['duree_chargement_s'])
+        print(f"{args.moteur:<8} {k:>3} {meilleure['lignes']:>8} {meilleure['duree_chargement_s']:>13.3f} "
+              f"{meilleure['lignes_par_seconde']:>10.1f}")
+        resultats['import_excel'][f"{args.moteur}_connexions_{k}"] = {
+            'rows_per_second': meilleure['lignes_par_seconde'],
+        }
+
+    conn.close()
+    db.close_pool()
+
+    if args.sortie:
+        with open(args.sortie, 'w', encoding='utf-8') as f:
+            json.dump(resultats, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+"""
+Comparaison des résultats de benchmark avec une baseline enregistrée.
+
+Format attendu (JSON), identique pour la baseline et les résultats :
+
+    {
+        "import_excel": {"rows_per_second": 850.0},
+        "endpoints": {
+            "/auth/stats/credits-par-commune": {"p50_ms": 35.2, "p95_ms": 80.1}
+        }
+    }
+
+La baseline regroupe les résultats de plusieurs scripts (bench_import.py,
+loadtest.py, import_budget.py...), chacun sous sa propre section de premier
+niveau. Seules les sections présentes dans les résultats sont comparées :
+un script lancé seul ne signale pas les métriques des autres comme absentes.
+Plusieurs fichiers de résultats peuvent être fournis, ils sont fusionnés.
+
+La baseline peut contenir une clé "tolerances" ({"motif glob": 0.25}).
+Les tolérances de la ligne de commande (--tol) l'emportent sur celles de la
+baseline pour une même métrique.
+Les valeurs numériques sont aplaties en clés pointées
+(ex. "endpoints./auth/stats/credits-par-commune.p95_ms").
+Sens d'une métrique : *_per_second => plus grand est meilleur,
+*_ms / error_rate => plus petit est meilleur.
+
+Usage :
+    python benchmarks/compare_baseline.py resultats.json
+    python benchmarks/compare_baseline.py resultats.json --tolerance 0.15 --tol "*.p95_ms=0.25"
+    python benchmarks/compare_baseline.py import.json charge.json budget.json
+    python benchmarks/compare_baseline.py resultats.json --update-baseline
+
+Code de sortie : 0 si aucune régression, 1 sinon, 2 en cas d'erreur d'usage.
+"""
+import argparse
+import fnmatch
+import json
+import os
+import sys
+
+BASELINE_PAR_DEFAUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+HIGHER_IS_BETTER = ('_per_second',)
+LOWER_IS_BETTER = ('_ms', 'error_rate')
+
+
+def aplatir(data, prefixe=''):
+    """Transforme un JSON imbriqué en {cle.pointee: valeur numérique}."""
+    resultat = {}
+    for cle, valeur in data.items():
+        nom = f"{prefixe}.{cle}" if prefixe else str(cle)
+        if isinstance(valeur, dict):
+            resultat.update(aplatir(valeur, nom))
+        elif isinstance(valeur, (int, float)) and not isinstance(valeur, bool):
+            resultat[nom] = float(valeur)
+    return resultat
+
+
+def fusionner(cible, source):
+    """Fusionne récursivement source dans cible (les valeurs de source l'emportent)."""
+    for cle, valeur in source.items():
+        if isinstance(valeur, dict) and isinstance(cible.get(cle), dict):
+            fusionner(cible[cle], valeur)
+        else:
+            cible[cle] = valeur
+    return cible
+
+
+def sens_metrique(nom):
+    if nom.endswith(HIGHER_IS_BETTER):
+        return 'haut'
+    if nom.endswith(LOWER_IS_BETTER):
+        return 'bas'
+    return None
+
+
+def tolerance_pour(nom, tolerances, defaut):
+    # Le dernier motif qui correspond l'emporte
+    tol = defaut
+    for motif, valeur in tolerances:
+        if fnmatch.fnmatch(nom, motif):
+            tol = valeur
+    return tol
+
+
+def comparer(baseline, actuel, tolerances, defaut):
+    """Retourne une liste de lignes (nom, base, actuel, delta, statut)."""
+    lignes = []
+    for nom in sorted(set(baseline) | set(actuel)):
+        base = baseline.get(nom)
+        valeur = actuel.get(nom)
+
+        if valeur is None:
+            lignes.append((nom, base, None, None, 'ABSENT'))
+            continue
+        if base is None:
+            lignes.append((nom, None, valeur, None, 'NOUVEAU'))
+            continue
+
+        if base:
+            delta = (valeur - base) / base
+        else:
+            # Baseline à zéro (ex. error_rate) : toute hausse est une régression
+            delta = 0.0 if valeur == base else float('inf') if valeur > base else float('-inf')
+        sens = sens_metrique(nom)
+        tol = tolerance_pour(nom, tolerances, defaut)
+
+        if sens == 'haut' and delta < -tol:
+            statut = 'REGRESSION'
+        elif sens == 'bas' and delta > tol:
+            statut = 'REGRESSION'
+        elif sens is None:
+            statut = 'info'
+        else:
+            statut = 'ok'
+        lignes.append((nom, base, valeur, delta, statut))
+    return lignes
+
+
+def afficher(lignes):
+    def fmt(v):
+        return '-' if v is None else f"{v:.2f}"
+
+    largeur = max([len(l[0]) for l in lignes] + [len('metrique')])
+    print(f"{'metrique':<{largeur}}  {'baseline':>12}  {'actuel':>12}  {'delta':>8}  statut")
+    for nom, base, valeur, delta, statut in lignes:
+        d = '-' if delta is None else f"{delta:+.1%}"
+        print(f"{nom:<{largeur}}  {fmt(base):>12}  {fmt(valeur):>12}  {d:>8}  {statut}")
+
+
+def parse_tol(valeurs):
+    tolerances = []
+    for item in valeurs:
+        if '=' not in item:
+            raise argparse.ArgumentTypeError(f"Tolérance invalide : {item} (attendu motif=valeur)")
+        motif, valeur = item.rsplit('=', 1)
+        tolerances.append((motif, float(valeur)))
+    return tolerances
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare des résultats de benchmark à la baseline.")
+    parser.add_argument('resultats', nargs='+', help="Fichier(s) JSON des résultats des benchmarks")
+    parser.add_argument('--baseline', default=BASELINE_PAR_DEFAUT, help="Fichier JSON de référence")
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help="Tolérance relative par défaut (0.10 = 10%%)")
+    parser.add_argument('--tol', action='append', default=[],
+                        help="Tolérance par métrique, motif glob : 'endpoints.*.p95_ms=0.25'")
+    parser.add_argument('--update-baseline', action='store_true',
+                        help="Remplace dans la baseline les sections des résultats fournis")
+    args = parser.parse_args(argv)
+
+    resultats = {}
+    for chemin in args.resultats:
+        with open(chemin, encoding='utf-8') as f:
+            fusionner(resultats, json.load(f))
+
+    if args.update_baseline:
+        # Les autres sections et les tolérances de l'ancienne baseline sont conservées
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding='utf-8') as f:
+                baseline = json.load(f)
+        resultats.pop('tolerances', None)
+        baseline.update(resultats)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2, ensure_ascii=False)
+            f.write('\n')
+        print(f"Baseline mise à jour : {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"Baseline introuvable : {args.baseline} (utiliser --update-baseline)", file=sys.stderr)
+        return 2
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    # Le dernier motif qui correspond l'emporte : les --tol, ajoutés après, priment sur la baseline
+    tolerances = [(motif, float(v)) for motif, v in baseline.pop('tolerances', {}).items()]
+    try:
+        tolerances += parse_tol(args.tol)
+    except argparse.ArgumentTypeError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+
+    resultats.pop('tolerances', None)
+    baseline = {section: valeurs for section, valeurs in baseline.items() if section in resultats}
+    if not baseline:
+        print("Aucune section des résultats n'existe dans la baseline (utiliser --update-baseline)",
+              file=sys.stderr)
+        return 2
+    lignes = comparer(aplatir(baseline), aplatir(resultats), tolerances, args.tolerance)
+    afficher(lignes)
+
+    echecs = [l for l in lignes if l[4] in ('REGRESSION', 'ABSENT')]
+    if echecs:
+        print(f"\n❌ {len(echecs)} régression(s) détectée(s)")
+        return 1
+    print("\n✅ Aucune régression")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""
+Budget de temps d'import au démarrage de l'application.
+
+Lance `python -X importtime -c "import app"` dans un processus neuf et échoue si :
+  - le temps cumulé d'import de `app` dépasse le budget ;
+  - un module réservé au pipeline d'import (pandas, numpy...) est chargé au démarrage.
+
+Usage (depuis backend/) :
+    python benchmarks/import_budget.py --budget-ms 800
+    python benchmarks/import_budget.py --sortie budget.json    # format compare_baseline.py
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules qui ne doivent être chargés qu'à la première importation de fichier
+MODULES_INTERDITS = ['pandas', 'numpy', 'importation.pipeline']
+
+LIGNE_IMPORTTIME = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$')
+
+
+def mesurer(module='app'):
+    """Retourne {module: (self_us, cumulatif_us)} pour les modules de premier niveau de l'arbre."""
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=BACKEND_DIR, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Import de {module} impossible :\n{proc.stderr[-2000:]}")
+
+    mesures = {}
+    for ligne in proc.stderr.splitlines():
+        m = LIGNE_IMPORTTIME.match(ligne)
+        if m:
+            self_us, cumul_us, _, nom = m.groups()
+            mesures[nom] = (int(self_us), int(cumul_us))
+    return mesures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Vérifie le budget de temps d'import de l'application.")
+    parser.add_argument('--budget-ms', type=float, default=800.0,
+                        help="Temps cumulé maximal d'import de app (ms)")
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--top', type=int, default=10, help="Nombre de modules les plus lents affichés")
+    parser.add_argument('--sortie', help="Fichier JSON (format compare_baseline.py)")
+    args = parser.parse_args(argv)
+
+    mesures = mesurer(args.module)
+    total_ms = mesures[args.module][1] / 1000.0
+
+    print("Modules les plus lents (temps propre) :")
+    for nom, (self_us, cumul_us) in sorted(mesures.items(), key=lambda x: -x[1][0])[:args.top]:
+        print(f"  {nom:<40} {self_us / 1000.0:>8.1f} ms  (cumulé {cumul_us / 1000.0:.1f} ms)")
+
+    echec = False
+    print(f"\nImport de {args.module} : {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    if total_ms > args.budget_ms:
+        print("❌ Budget dépassé")
+        echec = True
+
+    charges = [m for m in MODULES_INTERDITS if m in mesures]
+    if charges:
+        print(f"❌ Modules chargés au démarrage alors qu'ils doivent être différés : {', '.join(charges)}")
+        echec = True
+
+    if not echec:
+        print("✅ Budget respecté")
+
+    if args.sortie:
+        with open(args.sortie, 'w', encoding='utf-8') as f:
+            json.dump({'import_budget': {f"{args.module}_import_ms": round(total_ms, 1)}}, f, indent=2)
+    return 1 if echec else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""
+Test de charge local : utilisateurs du dashboard + imports concurrents.
+
+Deux profils tournent en parallèle pendant --duree secondes :
+  - N utilisateurs virtuels qui se connectent puis enchaînent les appels
+    des pages Graphiques et Toutes les opérations ;
+  - M importeurs qui envoient en boucle un fichier à /auth/import_excel.
+
+Usage (application et PostgreSQL lancés en local) :
+    python benchmarks/loadtest.py --email admin@exemple.com --mot-de-passe xxx \\
+        --utilisateurs 20 --importeurs 2 --fichier ../frontend/dashboard/src/assets/class.xlsx \\
+        --id-type-projet 1 --duree 60 --sortie resultats.json
+
+Le JSON produit est directement comparable avec benchmarks/compare_baseline.py.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+# Appels effectués par la page Graphiques (voir frontend/dashboard/src/pages/Graphiques.js)
+ENDPOINTS_GRAPHIQUES = [
+    'projets-par-departement', 'credits-par-departement',
+    'projets-par-commune', 'credits-par-commune',
+    'promoteurs-par-filiere', 'credits-par-filiere',
+    'projets-par-pda', 'credits-par-pda',
+]
+
+# Page Toutes les opérations
+ENDPOINTS_OPERATIONS = ['projets_financement']
+
+
+class Statistiques:
+    """Collecte thread-safe des latences et erreurs par endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latences = defaultdict(list)
+        self.erreurs = defaultdict(int)
+
+    def enregistrer(self, endpoint, duree_ms, ok):
+        with self._lock:
+            self.latences[endpoint].append(duree_ms)
+            if not ok:
+                self.erreurs[endpoint] += 1
+
+
+def percentile(valeurs, p):
+    if not valeurs:
+        return 0.0
+    valeurs = sorted(valeurs)
+    rang = max(0, min(len(valeurs) - 1, int(round(p / 100.0 * len(valeurs))) - 1))
+    return valeurs[rang]
+
+
+def appel(stats, session, methode, url, nom, **kwargs):
+    debut = time.perf_counter()
+    try:
+        reponse = session.request(methode, url, timeout=kwargs.pop('timeout', 30), **kwargs)
+        ok = reponse.status_code < 400
+    except requests.RequestException:
+        reponse, ok = None, False
+    stats.enregistrer(nom, (time.perf_counter() - debut) * 1000, ok)
+    return reponse
+
+
+def connexion(stats, base_url, email, mot_de_passe):
+    session = requests.Session()
+    appel(stats, session, 'POST', f"{base_url}/auth/signin", '/auth/signin',
+          json={'email': email, 'mot_de_passe': mot_de_passe})
+    return session
+
+
+def utilisateur_dashboard(stats, args, fin):
+    session = connexion(stats, args.base_url, args.email, args.mot_de_passe)
+    params = {'start_date': args.start_date, 'end_date': args.end_date}
+    while time.monotonic() < fin:
+        for path in ENDPOINTS_GRAPHIQUES:
+            appel(stats, session, 'GET', f"{args.base_url}/auth/{path}", f"/auth/{path}", params=params)
+        for path in ENDPOINTS_OPERATIONS:
+            appel(stats, session, 'GET', f"{args.base_url}/auth/{path}", f"/auth/{path}")
+
+
+def importeur(stats, args, fin):
+    session = connexion(stats, args.base_url, args.email, args.mot_de_passe)
+    nom_fichier = os.path.basename(args.fichier)
+    with open(args.fichier, 'rb') as f:
+        contenu = f.read()
+    while time.monotonic() < fin:
+        appel(stats, session, 'POST', f"{args.base_url}/auth/selection_type_projet",
+              '/auth/selection_type_projet', json={'id_type_projet': args.id_type_projet})
+        appel(stats, session, 'POST', f"{args.base_url}/auth/import_excel", '/auth/import_excel',
+              files={'file': (nom_fichier, contenu)}, data={'id_type_projet': args.id_type_projet},
+              timeout=args.timeout_import)
+
+
+def rapport(stats, duree):
+    resultats = {'endpoints': {}}
+    for endpoint in sorted(stats.latences):
+        latences = stats.latences[endpoint]
+        total = len(latences)
+        resultats['endpoints'][endpoint] = {
+            'requetes': total,
+            'erreurs': stats.erreurs[endpoint],
+            'error_rate': stats.erreurs[endpoint] / total if total else 0.0,
+            'requests_per_second': total / duree if duree else 0.0,
+            'p50_ms': percentile(latences, 50),
+            'p95_ms': percentile(latences, 95),
+            'p99_ms': percentile(latences, 99),
+        }
+    return resultats
+
+
+def afficher(resultats):
+    largeur = max([len(e) for e in resultats['endpoints']] + [len('endpoint')])
+    print(f"{'endpoint':<{largeur}}  {'req':>6}  {'req/s':>7}  {'err%':>6}  {'p50':>8}  {'p95':>8}  {'p99':>8}")
+    for endpoint, m in resultats['endpoints'].items():
+        print(f"{endpoint:<{largeur}}  {m['requetes']:>6}  {m['requests_per_second']:>7.1f}  "
+              f"{m['error_rate']:>6.1%}  {m['p50_ms']:>8.1f}  {m['p95_ms']:>8.1f}  {m['p99_ms']:>8.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Test de charge du dashboard et des imports.")
+    parser.add_argument('--base-url', default='http://localhost:5000')
+    parser.add_argument('--email', required=True)
+    parser.add_argument('--mot-de-passe', required=True)
+    parser.add_argument('--utilisateurs', type=int, default=10, help="Utilisateurs virtuels du dashboard")
+    parser.add_argument('--importeurs', type=int, default=0, help="Imports concurrents")
+    parser.add_argument('--fichier', help="Fichier envoyé par les importeurs")
+    parser.add_argument('--id-type-projet', help="Facilité utilisée pour les imports")
+    parser.add_argument('--start-date', default='2020-01-01')
+    parser.add_argument('--end-date', default='2025-01-01')
+    parser.add_argument('--duree', type=float, default=30.0, help="Durée du test en secondes")
+    parser.add_argument('--timeout-import', type=float, default=600.0)
+    parser.add_argument('--sortie', help="Fichier JSON de résultats")
+    args = parser.parse_args(argv)
+
+    if args.importeurs and not (args.fichier and args.id_type_projet):
+        parser.error("--fichier et --id-type-projet sont requis avec --importeurs")
+
+    stats = Statistiques()
+    fin = time.monotonic() + args.duree
+    threads = [threading.Thread(target=utilisateur_dashboard, args=(stats, args, fin))
+               for _ in range(args.utilisateurs)]
+    threads += [threading.Thread(target=importeur, args=(stats, args, fin))
+                for _ in range(args.importeurs)]
+
+    debut = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    duree = time.monotonic() - debut
+
+    resultats = rapport(stats, duree)
+    afficher(resultats)
+
+    if args.sortie:
+        with open(args.sortie, 'w', encoding='utf-8') as f:
+            json.dump(resultats, f, indent=2)
+        print(f"\nRésultats écrits dans {args.sortie}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,11 @@
 import psycopg2
+from psycopg2 import pool
 from configparser import ConfigParser
 
+# Pool de connexions du worker courant (initialisé par init_pool, après le fork)
+_pool = None
+
+
 def config(filename='config.ini', section='postgresql'):
     parser = ConfigParser()
     parser.read(filename)
@@ -12,11 +17,67 @@ def config(filename='config.ini', section='postgresql'):
             db[param[0]] = param[1]
     else:
         raise Exception(f'Section {section} non trouvée dans {filename}')
-    
+
     return db
 
+
+class PooledConnection:
+    """
+    Enveloppe d'une connexion du pool : close() rend la connexion au pool
+    au lieu de la fermer, le reste est délégué à la connexion psycopg2.
+    """
+
+    def __init__(self, conn_pool, conn):
+        self._pool = conn_pool
+        self._conn = conn
+        self._rendue = False
+
+    def close(self):
+        if self._rendue:
+            return
+        self._rendue = True
+        # Ne jamais rendre une transaction ouverte au pool
+        casse = bool(self._conn.closed)
+        if not casse:
+            try:
+                self._conn.rollback()
+            except psycopg2.Error:
+                casse = True
+        self._pool.putconn(self._conn, close=casse)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def init_pool(minconn=1, maxconn=10):
+    """Crée le pool de connexions du processus. À appeler une fois par worker, après le fork."""
+    global _pool
+    close_pool()
+    _pool = pool.ThreadedConnectionPool(minconn, maxconn, **config())
+    return _pool
+
+
+def close_pool():
+    global _pool
+    if _pool is not None:
+        _pool.closeall()
+        _pool = None
+
+
 def get_connection():
     try:
+        if _pool is not None:
+            try:
+                return PooledConnection(_pool, _pool.getconn())
+            except pool.PoolError:
+                # Pool épuisé : on ouvre une connexion directe plutôt que d'échouer
+                pass
         params = config()
         conn = psycopg2.connect(**params)
         return conn
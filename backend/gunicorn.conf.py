@@ -0,0 +1,42 @@
+# Configuration gunicorn pour la production
+#   cd backend && gunicorn -c gunicorn.conf.py
+import multiprocessing
+import os
+
+wsgi_app = 'wsgi:app'
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+
+# Workers pré-forkés avec threads : les requêtes du dashboard sont surtout
+# de l'attente PostgreSQL, les threads couvrent cette attente.
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('WORKER_THREADS', 4))
+
+# Les imports Excel peuvent durer plusieurs minutes
+timeout = int(os.environ.get('WORKER_TIMEOUT', 600))
+graceful_timeout = 30
+
+# Recyclage périodique des workers (fuites mémoire pandas)
+max_requests = int(os.environ.get('MAX_REQUESTS', 1000))
+max_requests_jitter = 100
+
+# Chargement de l'application (et des modules lourds) avant le fork
+preload_app = True
+
+accesslog = '-'
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    # Chaque worker a son propre pool de connexions
+    from app import init_worker
+    from wsgi import app
+
+    app.config['DB_POOL_MAX'] = max(app.config['DB_POOL_MAX'], threads)
+    init_worker(app)
+    server.log.info("Worker %s initialisé (pool DB max=%s)", worker.pid, app.config['DB_POOL_MAX'])
+
+
+def worker_exit(server, worker):
+    import db
+    db.close_pool()
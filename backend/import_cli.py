@@ -0,0 +1,148 @@
+"""
+Import en masse de fichiers, hors du serveur web (reprises initiales, rechargements de fin d'année).
+
+Les fichiers d'un dossier (ou d'un motif glob) passent par le même traitement
+que /auth/import_excel (importation.traitement) : détection du type de fichier,
+doublons, lecture, validation, archivage et chargement, un import par fichier.
+Les fichiers sont répartis sur un pool de processus ; le débit de chaque fichier
+est affiché à mesure, puis un bilan.
+
+Usage (depuis backend/, avec config.ini) :
+    python import_cli.py exports/2025/ --id-type-projet 1
+    python import_cli.py "exports/2025/**/*.csv.gz" --id-type-projet 1 --processus 4
+    python import_cli.py exports/2025/ --id-type-projet 1 --mode delta   # un seul processus, fichiers dans l'ordre
+"""
+import argparse
+import getpass
+import glob
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import db
+
+# Même dossier que l'application (IMPORT_ARCHIVE_FOLDER)
+ARCHIVE_FOLDER = os.path.join(os.getcwd(), 'uploads', 'archive')
+
+
+def lister(source):
+    """Fichiers importables (extension reconnue) d'un dossier ou d'un motif glob, triés par nom."""
+    from importation import lecture
+
+    if os.path.isdir(source):
+        chemins = [os.path.join(source, nom) for nom in os.listdir(source)]
+    else:
+        chemins = glob.glob(source, recursive=True)
+    return sorted(c for c in chemins if os.path.isfile(c) and lecture.format_fichier(c))
+
+
+def _init_processus(connexions):
+    # Le chargement parallèle d'un import prend ses connexions supplémentaires dans le pool
+    db.init_pool(1, connexions + 1)
+
+
+def importer_fichier(chemin, id_type_projet, options, utilisateur, dossier_archive):
+    """Exécutée dans un processus du pool : importe un fichier. Retourne son bilan."""
+    from importation import traitement
+    from televersements import projeter
+
+    debut = time.perf_counter()
+    conn = db.get_connection()
+    if conn is None:
+        return {"fichier": chemin, "statut": 500, "error": "Connexion à la base impossible."}
+    try:
+        with projeter(chemin, os.path.basename(chemin)) as televersement:
+            # Un seul processus de lecture par classeur : le parallélisme est déjà entre les fichiers
+            corps, statut = traitement.importer(conn, televersement, id_type_projet, options, utilisateur,
+                                                dossier_archive, processus=1)
+    except Exception as e:
+        conn.rollback()
+        corps, statut = {"error": str(e)}, 500
+    finally:
+        conn.close()
+    return {"fichier": chemin, "statut": statut, "taille": os.path.getsize(chemin),
+            "duree_s": time.perf_counter() - debut, **corps}
+
+
+def issue(bilan):
+    """importé, doublon, refusé (fichier invalide) ou erreur."""
+    if bilan["statut"] == 200:
+        return "doublon" if bilan.get("doublon") else "importé"
+    return "refusé" if bilan["statut"] < 500 else "erreur"
+
+
+def afficher(bilan):
+    duree = bilan.get("duree_s") or 0
+    lignes = bilan.get("lignes") if issue(bilan) == "importé" else None
+    debit = f"{lignes / duree:>10.0f}" if lignes and duree else f"{'-':>10}"
+    mo_s = f"{bilan.get('taille', 0) / 1024 / 1024 / duree:>7.1f}" if duree else f"{'-':>7}"
+    detail = bilan.get("error") or bilan.get("message", "")
+    if bilan.get("erreurs"):
+        detail += f" (ex. {bilan['erreurs'][0]})"
+    print(f"{os.path.basename(bilan['fichier'])[:40]:<40} {issue(bilan):<8} {lignes or '-':>8} {duree:>9.2f} "
+          f"{debit} {mo_s}  {detail}", flush=True)
+
+
+def main(argv=None):
+    from importation import pipeline, classeur
+
+    parser = argparse.ArgumentParser(description="Import en masse de fichiers, même traitement que import_excel.")
+    parser.add_argument('source', help="Dossier, ou motif glob entre guillemets (ex. \"exports/**/*.xlsx\")")
+    parser.add_argument('--id-type-projet', type=int, required=True)
+    parser.add_argument('--mode', choices=pipeline.MODES, default='complet')
+    parser.add_argument('--feuilles', choices=classeur.FEUILLES, default='premiere')
+    parser.add_argument('--connexions', type=int, default=1, help="Connexions de chargement par import")
+    parser.add_argument('--processus', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--force', action='store_true', help="Réimporter les fichiers déjà importés")
+    parser.add_argument('--utilisateur', default=f"import_cli ({getpass.getuser()})")
+    parser.add_argument('--archive', default=ARCHIVE_FOLDER, help="Dossier de l'archive")
+    args = parser.parse_args(argv)
+
+    if not 1 <= args.connexions <= pipeline.MAX_CONNEXIONS:
+        parser.error(f"--connexions doit être compris entre 1 et {pipeline.MAX_CONNEXIONS}")
+    if args.mode == 'delta' and args.connexions > 1:
+        parser.error("le mode delta utilise une seule connexion")
+
+    fichiers = lister(args.source)
+    if not fichiers:
+        sys.exit(f"Aucun fichier importable dans {args.source}.")
+
+    options = {"moteur": "sql", "connexions": args.connexions, "mode": args.mode,
+               "feuilles": args.feuilles, "force": args.force}
+    # Chaque import delta se compare à l'état laissé par le précédent : un fichier après l'autre
+    processus = 1 if args.mode == 'delta' else max(1, min(args.processus, len(fichiers)))
+    print(f"{len(fichiers)} fichier(s), {processus} processus, mode {args.mode}")
+    print(f"{'fichier':<40} {'issue':<8} {'lignes':>8} {'durée (s)':>9} {'lignes/s':>10} {'Mo/s':>7}  détail")
+
+    debut = time.perf_counter()
+    bilans = []
+    if processus == 1:
+        _init_processus(args.connexions)
+        for chemin in fichiers:
+            bilans.append(importer_fichier(chemin, args.id_type_projet, options, args.utilisateur, args.archive))
+            afficher(bilans[-1])
+    else:
+        # spawn, comme la lecture des classeurs : aucun état hérité (pool de connexions, verrous)
+        contexte = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=processus, mp_context=contexte,
+                                 initializer=_init_processus, initargs=(args.connexions,)) as pool:
+            futures = [pool.submit(importer_fichier, chemin, args.id_type_projet, options, args.utilisateur,
+                                   args.archive) for chemin in fichiers]
+            for future in as_completed(futures):
+                bilans.append(future.result())
+                afficher(bilans[-1])
+
+    duree = time.perf_counter() - debut
+    issues = [issue(bilan) for bilan in bilans]
+    lignes = sum(bilan.get("lignes") or 0 for bilan, i in zip(bilans, issues) if i == "importé")
+    print(f"\n{issues.count('importé')} importé(s), {issues.count('doublon')} doublon(s), "
+          f"{issues.count('refusé')} refusé(s), {issues.count('erreur')} erreur(s)")
+    print(f"{lignes} lignes en {duree:.1f} s ({lignes / duree:.0f} lignes/s)")
+    if issues.count('refusé') or issues.count('erreur'):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
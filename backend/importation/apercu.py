@@ -0,0 +1,89 @@
+"""
+Artefacts d'aperçu des imports.
+
+L'aperçu lit, convertit et valide le classeur une seule fois, puis enregistre
+le DataFrame préparé au format Arrow IPC (Feather v2, compressé zstd) sous
+un jeton d'upload, avec ses métadonnées (facilité, fichier, empreinte...).
+La validation de l'import relit cet artefact au lieu de reparser l'Excel.
+Les artefacts expirent après un TTL : ils sont purgés à chaque aperçu.
+"""
+import json
+import os
+import re
+import time
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+
+from importation import staging
+
+FORMAT_JETON = re.compile(r"[0-9a-f]{32}")
+
+
+def _chemins(dossier, jeton):
+    base = os.path.join(dossier, jeton)
+    return base + ".arrow", base + ".json"
+
+
+def jeton_valide(jeton):
+    return bool(FORMAT_JETON.fullmatch(jeton or ""))
+
+
+def enregistrer(dossier, df, meta):
+    """Écrit l'artefact et ses métadonnées. Retourne le jeton."""
+    os.makedirs(dossier, exist_ok=True)
+    jeton = uuid.uuid4().hex
+    donnees, chemin_meta = _chemins(dossier, jeton)
+
+    # Table construite colonne par colonne, comme pour le COPY : NPI, contacts... mêlent nombres et textes
+    table = pa.table({nom: staging.colonne_arrow(df[nom]) for nom in df.columns})
+    feather.write_feather(table, donnees, compression="zstd")
+    # Métadonnées écrites en dernier : un artefact sans .json est incomplet
+    with open(chemin_meta, "w", encoding="utf-8") as f:
+        json.dump({**meta, "cree_le": time.time()}, f)
+    return jeton
+
+
+def lire(dossier, jeton, ttl):
+    """Retourne (df, meta), ou None si le jeton est inconnu ou expiré."""
+    if not jeton_valide(jeton):
+        return None
+    donnees, chemin_meta = _chemins(dossier, jeton)
+    try:
+        with open(chemin_meta, encoding="utf-8") as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        return None
+
+    if time.time() - meta["cree_le"] > ttl:
+        supprimer(dossier, jeton)
+        return None
+    return pd.read_feather(donnees), meta
+
+
+def supprimer(dossier, jeton):
+    for chemin in _chemins(dossier, jeton):
+        try:
+            os.remove(chemin)
+        except FileNotFoundError:
+            pass
+
+
+def purger(dossier, ttl):
+    """Supprime les artefacts plus vieux que le TTL. Retourne le nombre de fichiers supprimés."""
+    if not os.path.isdir(dossier):
+        return 0
+    limite = time.time() - ttl
+    supprimes = 0
+    for nom in os.listdir(dossier):
+        chemin = os.path.join(dossier, nom)
+        try:
+            if os.path.getmtime(chemin) < limite:
+                os.remove(chemin)
+                supprimes += 1
+        except FileNotFoundError:
+            # Purgé en même temps par un autre worker
+            pass
+    return supprimes
@@ -0,0 +1,71 @@
+"""
+Archive des fichiers importés, adressée par contenu.
+
+Chaque fichier importé est conservé compressé (gzip) sous son empreinte
+SHA-256 : <dossier>/<2 premiers caractères>/<sha256><extension>.gz. Un même
+fichier envoyé plusieurs fois n'est stocké qu'une fois, et
+historique_importation.archive pointe vers lui (chemin relatif). Après une
+correction de mapping, retraiter.py rejoue les imports depuis l'archive sans
+redemander les fichiers aux utilisateurs.
+"""
+import contextlib
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+
+# Blocs copiés entre le fichier envoyé et l'archive (jamais entier en mémoire)
+TAILLE_BLOC = 1024 * 1024
+
+# Compression : bon compromis débit / taille pour des classeurs déjà zippés et des CSV
+NIVEAU_GZIP = 6
+
+
+def chemin_relatif(empreinte, nom_fichier):
+    """Adresse du fichier dans l'archive ; l'extension d'origine donne son format à la relecture."""
+    extension = os.path.splitext((nom_fichier or "").lower())[1]
+    return os.path.join(empreinte[:2], f"{empreinte}{extension}.gz")
+
+
+def archiver(dossier, flux, empreinte, nom_fichier):
+    """Archive le flux (s'il ne l'est pas déjà) et retourne son chemin relatif."""
+    relatif = chemin_relatif(empreinte, nom_fichier)
+    chemin = os.path.join(dossier, relatif)
+    if os.path.exists(chemin):
+        return relatif
+
+    os.makedirs(os.path.dirname(chemin), exist_ok=True)
+    # Écrit sous un nom temporaire puis renommé : un fichier de l'archive est toujours complet
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(chemin), suffix=".tmp", delete=False) as tmp:
+        try:
+            flux.seek(0)
+            with gzip.GzipFile(fileobj=tmp, mode="wb", compresslevel=NIVEAU_GZIP) as cible:
+                shutil.copyfileobj(flux, cible, TAILLE_BLOC)
+        except BaseException:
+            os.remove(tmp.name)
+            raise
+        finally:
+            flux.seek(0)
+    os.replace(tmp.name, chemin)
+    return relatif
+
+
+@contextlib.contextmanager
+def extraire(dossier, relatif):
+    """
+    Décompresse un fichier de l'archive dans un fichier temporaire (supprimé en sortie de bloc)
+    et donne son chemin. Le contenu est vérifié contre l'empreinte qui lui sert d'adresse.
+    """
+    empreinte = os.path.basename(relatif).split(".", 1)[0]
+    extension = os.path.basename(relatif)[len(empreinte):-len(".gz")]
+    with gzip.open(os.path.join(dossier, relatif), "rb") as source, \
+            tempfile.NamedTemporaryFile(suffix=extension) as cible:
+        h = hashlib.sha256()
+        for bloc in iter(lambda: source.read(TAILLE_BLOC), b""):
+            h.update(bloc)
+            cible.write(bloc)
+        cible.flush()
+        if h.hexdigest() != empreinte:
+            raise ValueError(f"Archive altérée : {relatif}")
+        yield cible.name
@@ -0,0 +1,69 @@
+"""
+Import des classeurs à plusieurs feuilles (une feuille par SFD ou par PDA).
+
+Le type de chaque feuille est détecté sur sa ligne d'en-têtes ; les feuilles
+non reconnues (synthèse, notes...) sont ignorées. Les feuilles retenues sont
+lues et converties en parallèle dans un pool de processus (le décodage XML
+d'openpyxl est du Python pur, les threads n'y gagneraient rien), puis
+regroupées pour un seul chargement transactionnel. Chaque processus projette
+lui-même le fichier envoyé en mémoire : son contenu n'est jamais copié vers le pool.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+
+from importation import entetes, pipeline, plans
+
+# Feuilles lues : la première (par défaut) ou toutes les feuilles reconnues
+FEUILLES = ("premiere", "toutes")
+
+# Processus de lecture au plus (une feuille par processus)
+MAX_PROCESSUS = os.cpu_count() or 1
+
+
+def detecter_feuilles(flux):
+    """
+    {nom de feuille: type_fichier détecté, ou None si la feuille n'est pas reconnue},
+    dans l'ordre du classeur. None si le fichier n'est pas un classeur lisible.
+    """
+    feuilles = entetes.lire_entetes_feuilles(flux)
+    if feuilles is None:
+        return None
+    return {nom: entetes.detecter(noms) for nom, noms in feuilles.items()}
+
+
+def _lire_feuille(chemin, feuille, type_fichier):
+    """Exécutée dans un processus du pool : lecture projetée et conversions d'une feuille."""
+    plan = plans.plan(type_fichier)
+    with pa.memory_map(chemin, "r") as flux:
+        brut = pipeline.lire_excel(flux, plan, feuille)
+    return brut, plans.appliquer(plan, brut)
+
+
+def lire_feuilles(chemin, feuilles, type_fichier, processus=MAX_PROCESSUS):
+    """
+    Lit et convertit les feuilles `feuilles` (même type de fichier) du classeur `chemin`.
+    Retourne [(feuille, brut, df), ...] dans l'ordre demandé.
+    """
+    processus = max(1, min(processus, len(feuilles)))
+    if processus == 1:
+        resultats = [_lire_feuille(chemin, feuille, type_fichier) for feuille in feuilles]
+    else:
+        # spawn : un fork depuis un worker multi-thread (gunicorn gthread) peut hériter de verrous tenus
+        contexte = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=processus, mp_context=contexte) as pool:
+            resultats = list(pool.map(_lire_feuille, [chemin] * len(feuilles), feuilles,
+                                      [type_fichier] * len(feuilles)))
+
+    return [(feuille, brut, df) for feuille, (brut, df) in zip(feuilles, resultats)]
+
+
+def regrouper(lues):
+    """Un seul DataFrame pour le chargement, et le bilan par feuille : [{feuille, lignes}, ...]."""
+    df = pd.concat([df for _, _, df in lues], ignore_index=True)
+    # Catégories différentes d'une feuille à l'autre : pd.concat revient en objets, on réencode
+    df = df.astype({nom: "category" for nom in plans.CATEGORIES if nom in df.columns})
+    return df, [{"feuille": feuille, "lignes": len(df_feuille)} for feuille, _, df_feuille in lues]
@@ -0,0 +1,125 @@
+"""
+Import différentiel d'une facilité.
+
+Le classeur mensuel d'une facilité reprend tout l'historique. En mode delta,
+chaque ligne est identifiée par son N° (colonne numero) et résumée par une
+empreinte 64 bits de ses colonnes métier (pipeline.empreintes_lignes), puis
+comparée aux lignes vivantes de la même facilité dans credit_facilite :
+  - N° inconnu           -> ligne insérée ;
+  - empreinte différente -> nouvelle version insérée, l'ancienne marquée supprimée ;
+  - empreinte identique  -> aucune écriture ;
+  - N° absent du fichier -> ligne marquée supprimée (supprime_le), jamais effacée.
+Les lignes marquées supprimées portent l'import responsable (id_import_suppression) :
+annuler l'import les restaure (voir importation/lots.py).
+Tout se fait dans la transaction de l'import, sous un verrou consultatif par
+facilité : deux imports différentiels d'une même facilité ne se croisent pas.
+"""
+from psycopg2 import sql
+
+from importation import fusion
+
+# Première clé du verrou consultatif (la seconde est l'id_type_projet)
+VERROU_DELTA = 3500
+
+
+def verifier_numeros(cur, table):
+    """Lève ValueError si un N° manque ou apparaît deux fois dans le fichier."""
+    cur.execute(sql.SQL("""
+        SELECT s.numero, COUNT(*)
+        FROM {} s
+        GROUP BY s.numero
+        HAVING s.numero IS NULL OR COUNT(*) > 1
+        ORDER BY MIN(s.ligne)
+        LIMIT 1
+    """).format(sql.Identifier(table)))
+    anomalie = cur.fetchone()
+    if anomalie is None:
+        return
+    if anomalie[0] is None:
+        raise ValueError("N° manquant sur au moins une ligne : import différentiel impossible.")
+    raise ValueError(f"N° en double dans le fichier : '{anomalie[0]}'")
+
+
+def marquer_supprimees(cur, table, id_type_projet, id_import):
+    """
+    Marque supprimées les lignes vivantes absentes du fichier, ainsi que les
+    doublons de N° laissés par d'anciens imports complets (on garde le plus récent).
+    """
+    cur.execute(sql.SQL("""
+        UPDATE credit_facilite cf
+        SET supprime_le = now(), id_import_suppression = %s
+        WHERE cf.id_type_projet = %s
+          AND cf.supprime_le IS NULL
+          AND (
+              NOT EXISTS (SELECT 1 FROM {} s WHERE s.numero = cf.numero)
+              OR EXISTS (
+                  SELECT 1 FROM credit_facilite r
+                  WHERE r.id_type_projet = cf.id_type_projet
+                    AND r.numero = cf.numero
+                    AND r.supprime_le IS NULL
+                    AND r.id_projet > cf.id_projet
+              )
+          )
+    """).format(sql.Identifier(table)), (id_import, id_type_projet))
+    return cur.rowcount
+
+
+def extraire_modifiees(cur, table, id_type_projet):
+    """
+    Copie dans une table temporaire (supprimée à la fin de la transaction) les lignes
+    de la staging dont l'empreinte n'est pas déjà en base. Retourne (table, lignes inchangées).
+    La staging reste entière, pour la publication dans donnees_importees.
+    """
+    modifiees = f"{table}_delta"
+    cur.execute(sql.SQL("""
+        CREATE TEMPORARY TABLE {} ON COMMIT DROP AS
+        SELECT s.* FROM {} s
+        WHERE NOT EXISTS (
+            SELECT 1 FROM credit_facilite cf
+            WHERE cf.id_type_projet = %s
+              AND cf.supprime_le IS NULL
+              AND cf.numero = s.numero
+              AND cf.empreinte_ligne = s.empreinte_ligne
+        )
+    """).format(sql.Identifier(modifiees), sql.Identifier(table)), (id_type_projet,))
+    ecrites = cur.rowcount
+    cur.execute(sql.SQL("SELECT COUNT(*) FROM {}").format(sql.Identifier(table)))
+    return modifiees, cur.fetchone()[0] - ecrites
+
+
+def remplacer_modifiees(cur, table, id_type_projet, id_import):
+    """Marque supprimée l'ancienne version des lignes modifiées (la nouvelle est insérée ensuite)."""
+    cur.execute(sql.SQL("""
+        UPDATE credit_facilite cf
+        SET supprime_le = now(), id_import_suppression = %s
+        FROM {} s
+        WHERE cf.id_type_projet = %s
+          AND cf.supprime_le IS NULL
+          AND cf.numero = s.numero
+    """).format(sql.Identifier(table)), (id_import, id_type_projet))
+    return cur.rowcount
+
+
+def fusionner(cur, table, id_type_projet, created_by, id_import):
+    """
+    Applique le fichier de la staging en différentiel, dans la transaction courante.
+    La staging n'est pas modifiée : seules les lignes nouvelles ou modifiées sont recopiées.
+    """
+    cur.execute("SELECT pg_advisory_xact_lock(%s, %s)", (VERROU_DELTA, int(id_type_projet)))
+
+    verifier_numeros(cur, table)
+    fusion.verifier_communes(cur, table)
+    fusion.inserer_dimensions(cur, table)
+
+    supprimees = marquer_supprimees(cur, table, id_type_projet, id_import)
+    table_modifiees, inchangees = extraire_modifiees(cur, table, id_type_projet)
+    modifiees = remplacer_modifiees(cur, table_modifiees, id_type_projet, id_import)
+    ecrites = fusion.inserer_faits(cur, table_modifiees, id_type_projet, created_by, id_import)
+
+    return {
+        "lignes_inserees": ecrites - modifiees,
+        "lignes_modifiees": modifiees,
+        "lignes_inchangees": inchangees,
+        "lignes_supprimees": supprimees,
+    }
+
@@ -0,0 +1,33 @@
+"""
+Empreinte SHA-256 des fichiers importés, calculée en flux (sans charger le fichier en mémoire).
+"""
+import hashlib
+
+TAILLE_BLOC = 1024 * 1024
+
+
+def sha256_flux(flux):
+    """Empreinte hexadécimale d'un flux binaire, remis au début après lecture."""
+    h = hashlib.sha256()
+    flux.seek(0)
+    for bloc in iter(lambda: flux.read(TAILLE_BLOC), b''):
+        h.update(bloc)
+    flux.seek(0)
+    return h.hexdigest()
+
+
+def import_existant(cur, id_type_projet, empreinte):
+    """
+    Dernier import réussi du même fichier pour cette facilité : (id, date_import) ou None.
+    Le fichier a pu être importé seul ou dans un lot (historique_importation_fichiers).
+    """
+    cur.execute("""
+        SELECT id, date_import
+        FROM historique_importation
+        WHERE id_type_projet = %s AND statut AND annule_le IS NULL
+          AND (empreinte_sha256 = %s
+               OR id IN (SELECT id_import FROM historique_importation_fichiers WHERE empreinte_sha256 = %s))
+        ORDER BY date_import DESC
+        LIMIT 1
+    """, (id_type_projet, empreinte, empreinte))
+    return cur.fetchone()
@@ -0,0 +1,69 @@
+"""
+Détection du type de fichier à partir de la ligne d'en-têtes.
+
+Seule la première ligne du classeur est lue (openpyxl en lecture seule, les
+autres lignes ne sont jamais décompressées) puis comparée aux en-têtes de
+chaque mapping. Un fichier du mauvais type est refusé avant la lecture
+complète, et la facilité peut être déduite du fichier lui-même.
+"""
+import zipfile
+
+import openpyxl
+
+from importation import lecture
+from importation.plans import MAPPINGS
+
+# Part minimale des en-têtes d'un mapping présents dans le fichier pour le reconnaître
+SEUIL = 0.6
+
+
+def _premiere_ligne(feuille):
+    ligne = next(feuille.iter_rows(max_row=1, values_only=True), ())
+    return [entete for entete in ligne if entete is not None]
+
+
+def _lire(flux, lecture):
+    """Applique lecture(classeur), ou retourne None si le fichier n'est pas un classeur lisible."""
+    try:
+        classeur = openpyxl.load_workbook(flux, read_only=True, data_only=True)
+        try:
+            return lecture(classeur)
+        finally:
+            classeur.close()
+    except (zipfile.BadZipFile, KeyError, OSError, ValueError):
+        return None
+    finally:
+        # pandas relira le fichier depuis le début
+        flux.seek(0)
+
+
+def lire_entetes(flux, format_fichier="xlsx"):
+    """En-têtes de la première feuille (ou du fichier CSV, ODS, Parquet), ou None si le fichier est illisible."""
+    if format_fichier == "xlsx":
+        return _lire(flux, lambda classeur: _premiere_ligne(classeur.active))
+    try:
+        return lecture.ENTETES[format_fichier](flux)
+    except Exception:
+        # Lecteurs hétérogènes (Arrow, odf, gzip...) : tout échec signifie un fichier illisible
+        return None
+
+
+def lire_entetes_feuilles(flux):
+    """{nom de feuille: en-têtes} pour chaque feuille de calcul, ou None si le fichier est illisible."""
+    return _lire(flux, lambda classeur: {feuille.title: _premiere_ligne(feuille) for feuille in classeur.worksheets})
+
+
+def scores(entetes):
+    """{type_fichier: part des en-têtes du mapping présents}. Comparaison exacte, comme le renommage."""
+    presents = set(entetes)
+    return {
+        type_fichier: len(presents & mapping.keys()) / len(mapping)
+        for type_fichier, mapping in MAPPINGS.items()
+    }
+
+
+def detecter(entetes):
+    """Type de fichier reconnu, ou None si aucun mapping n'atteint le seuil."""
+    resultats = scores(entetes)
+    meilleur = max(resultats, key=resultats.get)
+    return meilleur if resultats[meilleur] >= SEUIL else None
@@ -0,0 +1,180 @@
+"""
+Envois fragmentés des gros fichiers (liaisons lentes des antennes).
+
+Au lieu d'un seul POST multipart, le client :
+  1. ouvre un envoi (nom, taille, empreinte SHA-256 du fichier si connue) et
+     reçoit la taille des fragments ;
+  2. envoie chaque fragment par PUT à son offset, avec son SHA-256 ;
+  3. termine l'envoi : le fichier assemblé passe directement au pipeline d'import.
+
+Chaque envoi est un dossier : le fichier (préalloué à sa taille, les fragments
+y sont écrits à leur offset, dans n'importe quel ordre), ses métadonnées et un
+marqueur par fragment reçu et vérifié. Un envoi interrompu reprend en
+demandant l'état de l'envoi : seuls les fragments manquants sont renvoyés.
+Les marqueurs sont des fichiers distincts : des PUT simultanés (threads ou
+workers différents) n'ont aucun état partagé à verrouiller.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+
+FORMAT_ID = re.compile(r"[0-9a-f]{32}")
+FORMAT_SHA256 = re.compile(r"[0-9a-f]{64}")
+
+# Taille des fragments proposée aux clients (le dernier peut être plus court)
+TAILLE_FRAGMENT = 8 * 1024 * 1024
+
+# Lecture du corps des PUT par blocs : un fragment n'est jamais entier en mémoire
+TAILLE_BLOC = 1024 * 1024
+
+FICHIER = "fichier"
+META = "envoi.json"
+RECUS = "recus"
+
+
+def id_valide(id_envoi):
+    return bool(FORMAT_ID.fullmatch(id_envoi or ""))
+
+
+def _chemin(dossier, id_envoi, *parties):
+    return os.path.join(dossier, id_envoi, *parties)
+
+
+def nb_fragments(meta):
+    return max(1, -(-meta["taille"] // meta["taille_fragment"]))
+
+
+def taille_attendue(meta, index):
+    """Taille du fragment `index` : taille_fragment, sauf pour le dernier."""
+    debut = index * meta["taille_fragment"]
+    return min(meta["taille_fragment"], meta["taille"] - debut)
+
+
+def creer(dossier, nom_fichier, taille, meta, taille_fragment=TAILLE_FRAGMENT):
+    """Ouvre un envoi : dossier, fichier préalloué et métadonnées. Retourne (id_envoi, meta)."""
+    id_envoi = uuid.uuid4().hex
+    os.makedirs(_chemin(dossier, id_envoi, RECUS))
+    with open(_chemin(dossier, id_envoi, FICHIER), "wb") as f:
+        f.truncate(taille)
+
+    meta = {**meta, "nom_fichier": nom_fichier, "taille": taille, "taille_fragment": taille_fragment,
+            "cree_le": time.time()}
+    # Métadonnées écrites en dernier : un envoi sans envoi.json est incomplet
+    with open(_chemin(dossier, id_envoi, META), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    return id_envoi, meta
+
+
+def lire(dossier, id_envoi, ttl):
+    """Métadonnées de l'envoi, ou None s'il est inconnu ou expiré."""
+    if not id_valide(id_envoi):
+        return None
+    try:
+        with open(_chemin(dossier, id_envoi, META), encoding="utf-8") as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        return None
+
+    if time.time() - _derniere_activite(dossier, id_envoi) > ttl:
+        supprimer(dossier, id_envoi)
+        return None
+    return meta
+
+
+def recus(dossier, id_envoi):
+    """Index des fragments reçus et vérifiés, triés."""
+    return sorted(int(nom) for nom in os.listdir(_chemin(dossier, id_envoi, RECUS)) if nom.isdigit())
+
+
+def etat(dossier, id_envoi, meta):
+    """État de l'envoi pour le client : fragments reçus et manquants."""
+    deja = recus(dossier, id_envoi)
+    manquants = sorted(set(range(nb_fragments(meta))) - set(deja))
+    return {
+        "id_envoi": id_envoi,
+        "nom_fichier": meta["nom_fichier"],
+        "taille": meta["taille"],
+        "taille_fragment": meta["taille_fragment"],
+        "nb_fragments": nb_fragments(meta),
+        "recus": deja,
+        "manquants": manquants,
+        "complet": not manquants,
+    }
+
+
+def ecrire_fragment(dossier, id_envoi, meta, offset, flux, sha256):
+    """
+    Écrit le fragment lu dans `flux` à `offset` et le marque reçu s'il est conforme.
+    Retourne None, ou le motif du refus (le fragment est alors à renvoyer).
+    """
+    if offset < 0 or offset % meta["taille_fragment"] or offset >= max(meta["taille"], 1):
+        return f"offset invalide : multiple de {meta['taille_fragment']} inférieur à {meta['taille']} attendu"
+    index = offset // meta["taille_fragment"]
+    attendue = taille_attendue(meta, index)
+
+    # Fragment renvoyé : il n'est plus reçu tant que sa nouvelle version n'est pas vérifiée
+    marqueur = _chemin(dossier, id_envoi, RECUS, str(index))
+    try:
+        os.remove(marqueur)
+    except FileNotFoundError:
+        pass
+
+    # Écriture au fil de la réception, à l'offset du fragment
+    h = hashlib.sha256()
+    ecrits = 0
+    fd = os.open(_chemin(dossier, id_envoi, FICHIER), os.O_WRONLY)
+    try:
+        for bloc in iter(lambda: flux.read(TAILLE_BLOC), b""):
+            if ecrits + len(bloc) > attendue:
+                return f"fragment {index} trop long : {attendue} octets attendus"
+            os.pwrite(fd, bloc, offset + ecrits)
+            h.update(bloc)
+            ecrits += len(bloc)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+    if ecrits != attendue:
+        return f"fragment {index} incomplet : {ecrits} octets reçus sur {attendue}"
+    if h.hexdigest() != (sha256 or "").lower():
+        return f"fragment {index} altéré : SHA-256 différent"
+
+    # Marqueur écrit sous un nom temporaire puis renommé : un fragment est reçu ou ne l'est pas
+    with open(marqueur + ".tmp", "w") as f:
+        f.write(h.hexdigest())
+    os.replace(marqueur + ".tmp", marqueur)
+    return None
+
+
+def chemin_fichier(dossier, id_envoi):
+    return _chemin(dossier, id_envoi, FICHIER)
+
+
+def supprimer(dossier, id_envoi):
+    shutil.rmtree(_chemin(dossier, id_envoi), ignore_errors=True)
+
+
+def _derniere_activite(dossier, id_envoi):
+    # Le dossier des marqueurs change à chaque fragment reçu
+    return os.path.getmtime(_chemin(dossier, id_envoi, RECUS))
+
+
+def purger(dossier, ttl):
+    """Supprime les envois sans activité depuis plus que le TTL. Retourne le nombre d'envois supprimés."""
+    if not os.path.isdir(dossier):
+        return 0
+    limite = time.time() - ttl
+    supprimes = 0
+    for id_envoi in os.listdir(dossier):
+        try:
+            if id_valide(id_envoi) and _derniere_activite(dossier, id_envoi) < limite:
+                supprimer(dossier, id_envoi)
+                supprimes += 1
+        except FileNotFoundError:
+            # Terminé ou purgé en même temps par un autre worker
+            pass
+    return supprimes
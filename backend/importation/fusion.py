@@ -0,0 +1,157 @@
+"""
+Chargement ensembliste de la table de staging vers les tables du modèle.
+
+Au lieu d'une dizaine de requêtes par ligne, l'import complet se fait en
+quelques requêtes INSERT ... SELECT exécutées dans PostgreSQL :
+  1. contrôle des communes inconnues ;
+  2. ajout des promoteurs, PSF et filières manquants ;
+  3. insertion de tous les faits dans credit_facilite avec résolution des
+     identifiants par jointure (commune, psf, filière, promoteur).
+"""
+from psycopg2 import sql
+
+from importation.staging import colonnes_table
+
+# Colonnes de credit_facilite reprises telles quelles depuis la staging
+# (projet_data du moteur ligne par ligne, plus la clé et l'empreinte de l'import différentiel)
+COLONNES_FAITS = [
+    "date_comite_validation", "intitule_projet", "cout_total_projet", "credit_solicite",
+    "credit_accorde", "refinancement_accorde", "total_financement", "statut_dossier",
+    "credit_accorde_statut", "garantie_fnda_accordee", "bonification_fnda_accordee",
+    "motif_credit_non_accordee", "notification", "reference_si_notifiee", "date_notification",
+    "montant_decaisse", "date_creation_entite", "date_decaissement", "observations",
+    "chiffre_affaires_annuel", "rang_cycle", "nom_beneficiaire", "nb_beneficiaires_hommes",
+    "nb_beneficiaires_femmes", "total_beneficiaires", "duree", "differe_mois",
+    "date_premiere_echeance", "date_derniere_echeance", "periodicite_remboursement",
+    "contrat_signe", "reference_ligne_refinancement", "date_accord_ligne_refinancement",
+    "numero_reference_tirage", "date_tirage", "garanties_promoteurs", "montant_accorde_sfd_banque",
+    "montant_credit_valide_fnda", "taux_interet_degressif", "capital", "interets_promoteurs",
+    "interets_fnda", "numero", "empreinte_ligne",
+]
+
+# Identifiants résolus par jointure avec les référentiels
+COLONNES_RESOLUES = ["id_commune", "id_filiere", "id_psf", "id_promoteur"]
+
+def verifier_communes(cur, table):
+    """Lève ValueError sur la première commune du fichier absente du référentiel."""
+    cur.execute(sql.SQL("""
+        SELECT s.commune
+        FROM {} s
+        WHERE NOT EXISTS (
+            SELECT 1 FROM commune c
+            WHERE LOWER(TRIM(c.nom_commune)) = LOWER(TRIM(s.commune))
+        )
+        ORDER BY s.ligne
+        LIMIT 1
+    """).format(sql.Identifier(table)))
+    inconnue = cur.fetchone()
+    if inconnue:
+        raise ValueError(f"Commune non trouvée pour : '{inconnue[0]}'")
+
+
+def inserer_dimensions(cur, table):
+    """Ajoute en une requête par table les promoteurs, PSF et filières manquants."""
+    t = sql.Identifier(table)
+
+    # Promoteur (sans doublons) : on garde les attributs de la première ligne du fichier
+    cur.execute(sql.SQL("""
+        INSERT INTO promoteur (nom_promoteur, nom_entite, sexe_promoteur, statut_juridique, adresse_contact)
+        SELECT DISTINCT ON (s.nom_promoteur, s.denomination_entite)
+               s.nom_promoteur, s.denomination_entite, s.sexe_promoteur, s.statut_juridique, s.adresse_contact
+        FROM {} s
+        WHERE s.nom_promoteur IS NOT NULL
+          AND s.denomination_entite IS NOT NULL
+          AND NOT EXISTS (
+              SELECT 1 FROM promoteur p
+              WHERE p.nom_promoteur = s.nom_promoteur AND p.nom_entite = s.denomination_entite
+          )
+        ORDER BY s.nom_promoteur, s.denomination_entite, s.ligne
+    """).format(t))
+
+    cur.execute(sql.SQL("""
+        INSERT INTO psf (nom_psf)
+        SELECT DISTINCT s.psf FROM {} s
+        WHERE s.psf IS NOT NULL
+        ON CONFLICT (nom_psf) DO NOTHING
+    """).format(t))
+
+    cur.execute(sql.SQL("""
+        INSERT INTO filiere (nom_filiere, maillon)
+        SELECT DISTINCT ON (s.filiere) s.filiere, s.maillon_type_credit
+        FROM {} s
+        WHERE s.filiere IS NOT NULL
+        ORDER BY s.filiere, s.ligne
+        ON CONFLICT (nom_filiere) DO NOTHING
+    """).format(t))
+
+
+def requete_faits(cur, table, cible='credit_facilite', avec_ligne=False, partition=None):
+    """
+    Construit l'INSERT ... SELECT des faits de la staging vers `cible`.
+    partition=(i, k) ne traite que les lignes telles que ligne % k = i.
+    Paramètres de la requête : (id_type_projet, created_by, id_import).
+    """
+    types = colonnes_table(cur, 'credit_facilite')
+
+    def source(col):
+        # Conversion explicite vers le type de la colonne de credit_facilite
+        if col in types:
+            return sql.SQL('s.{}::{}').format(sql.Identifier(col), sql.SQL(types[col]))
+        return sql.SQL('s.{}').format(sql.Identifier(col))
+
+    colonnes = COLONNES_FAITS + COLONNES_RESOLUES + ["id_type_projet", "created_by", "id_import"]
+    sources = [source(c) for c in COLONNES_FAITS] + [
+        sql.SQL("c.id_commune"), sql.SQL("f.id_filiere"), sql.SQL("ps.id_psf"),
+        sql.SQL("pr.id_promoteur"), sql.Placeholder(), sql.Placeholder(), sql.Placeholder(),
+    ]
+    if avec_ligne:
+        colonnes.append("ligne")
+        sources.append(sql.SQL("s.ligne"))
+
+    filtre = sql.SQL("")
+    if partition:
+        i, k = partition
+        # %% : la requête est exécutée avec des paramètres
+        filtre = sql.SQL("WHERE s.ligne %% {} = {}").format(sql.Literal(k), sql.Literal(i))
+
+    return sql.SQL("""
+        WITH communes AS (
+            SELECT DISTINCT ON (LOWER(TRIM(nom_commune))) LOWER(TRIM(nom_commune)) AS cle, id_commune
+            FROM commune
+            ORDER BY LOWER(TRIM(nom_commune)), id_commune
+        ),
+        promoteurs AS (
+            SELECT DISTINCT ON (nom_promoteur, nom_entite) nom_promoteur, nom_entite, id_promoteur
+            FROM promoteur
+            ORDER BY nom_promoteur, nom_entite, id_promoteur
+        )
+        INSERT INTO {cible} ({colonnes})
+        SELECT {sources}
+        FROM {table} s
+        JOIN communes c ON c.cle = LOWER(TRIM(s.commune))
+        LEFT JOIN psf ps ON ps.nom_psf = s.psf
+        LEFT JOIN filiere f ON f.nom_filiere = s.filiere
+        LEFT JOIN promoteurs pr
+               ON pr.nom_promoteur = s.nom_promoteur AND pr.nom_entite = s.denomination_entite
+        {filtre}
+        ORDER BY s.ligne
+    """).format(
+        cible=sql.Identifier(cible),
+        colonnes=sql.SQL(', ').join(map(sql.Identifier, colonnes)),
+        sources=sql.SQL(', ').join(sources),
+        table=sql.Identifier(table),
+        filtre=filtre,
+    )
+
+
+def inserer_faits(cur, table, id_type_projet, created_by, id_import):
+    """Insère toutes les lignes de la staging dans credit_facilite. Retourne le nombre de lignes."""
+    cur.execute(requete_faits(cur, table), (id_type_projet, created_by, id_import))
+    return cur.rowcount
+
+
+def fusionner(cur, table, id_type_projet, created_by, id_import):
+    """Charge la staging dans le modèle, dans la transaction courante. Retourne le nombre de faits."""
+    verifier_communes(cur, table)
+    inserer_dimensions(cur, table)
+    return inserer_faits(cur, table, id_type_projet, created_by, id_import)
@@ -0,0 +1,267 @@
+"""
+Lecture des fichiers envoyés, limitée aux colonnes du mapping.
+
+Les classeurs sources portent souvent des dizaines de colonnes calculées ou de
+commentaires que le mapping ignore. pd.read_excel(usecols=...) ne les écarte
+qu'après coup : openpyxl décode quand même chaque cellule (type, style, date).
+Ici, le classeur est ouvert en lecture seule et chaque ligne XML est réduite
+aux colonnes retenues avant le décodage des cellules ; le DataFrame est ensuite
+construit par le TextParser de pandas, avec les mêmes règles que read_excel.
+Cette projection s'appuie sur des API internes d'openpyxl (WorkSheetParser,
+source et chaînes partagées de la feuille) : la version d'openpyxl est fixée
+dans requirements.txt, et si ces API manquent, la lecture revient à
+pd.read_excel(usecols=...), plus lente mais équivalente. Le XML est analysé par
+le parseur d'openpyxl (defusedxml s'il est installé) : les fichiers envoyés ne
+sont pas sûrs.
+
+Les partenaires qui le peuvent envoient plutôt du CSV (éventuellement gzip),
+de l'ODS ou du Parquet : CSV et Parquet sont lus par Arrow (lecteur CSV
+multi-thread, colonnes Parquet lues sans conversion), l'ODS par pandas.
+Tous alimentent ensuite le même mapping et les mêmes conversions.
+"""
+import codecs
+import csv
+import gzip
+import os
+import warnings
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pa_parquet
+from openpyxl.xml.functions import iterparse
+
+try:
+    from openpyxl.worksheet._reader import ROW_TAG, WorkSheetParser
+except ImportError:
+    # API interne absente de cette version d'openpyxl : lecture par pd.read_excel
+    ROW_TAG, WorkSheetParser = None, object
+
+# Formats acceptés, d'après l'extension du fichier envoyé (.gz : CSV compressé)
+FORMATS = {
+    ".xlsx": "xlsx",
+    ".xlsm": "xlsx",
+    ".csv": "csv",
+    ".gz": "csv",
+    ".ods": "ods",
+    ".parquet": "parquet",
+}
+
+# Séparateurs CSV reconnus (le plus fréquent de la ligne d'en-têtes l'emporte)
+SEPARATEURS = (";", ",", "\t")
+
+# Taille des blocs lus pour vérifier l'encodage d'un CSV
+TAILLE_BLOC = 1024 * 1024
+
+# Attributs internes d'openpyxl utilisés par la lecture projetée
+_INTERNES_FEUILLE = ("_get_source", "_shared_strings")
+_INTERNES_CLASSEUR = ("epoch", "_date_formats", "_timedelta_formats")
+
+
+class _ParseurProjete(WorkSheetParser):
+    """Parseur de feuille qui ne décode que les cellules des colonnes `garder` (lettres)."""
+
+    garder = None
+
+    def parse(self):
+        # Seules les lignes nous intéressent (ni mises en forme, ni propriétés de feuille)
+        for _, element in iterparse(self.source):
+            if element.tag == ROW_TAG:
+                yield self.parse_row(element)
+                element.clear()
+
+    def parse_row(self, row):
+        if self.garder is not None:
+            row[:] = [el for el in row if self._retenue(el)]
+        return super().parse_row(row)
+
+    def _retenue(self, cellule):
+        coordonnee = cellule.get("r")
+        # Cellule sans coordonnée : sa colonne dépend des précédentes, on la garde
+        return coordonnee is None or coordonnee.rstrip("0123456789") in self.garder
+
+
+def _valeur(cellule):
+    """Même conversion que pandas (lecteur openpyxl) : vide -> "", erreur -> NaN, entiers exacts en int."""
+    valeur = cellule["value"]
+    if valeur is None:
+        return ""
+    if cellule["data_type"] == "e":
+        return np.nan
+    if cellule["data_type"] == "n":
+        entier = int(valeur)
+        return entier if entier == valeur else float(valeur)
+    return valeur
+
+
+def _lignes(feuille, entetes):
+    """En-têtes retenus puis lignes projetées, en listes de valeurs pandas."""
+    with feuille._get_source() as source:
+        parseur = _ParseurProjete(
+            source,
+            feuille._shared_strings,
+            data_only=True,
+            epoch=feuille.parent.epoch,
+            date_formats=feuille.parent._date_formats,
+            timedelta_formats=feuille.parent._timedelta_formats,
+        )
+        lignes = parseur.parse()
+
+        # Première ligne : en-têtes complets, pour situer les colonnes du mapping
+        _, cellules = next(lignes, (0, []))
+        positions = {}
+        for cellule in cellules:
+            nom = cellule["value"]
+            # Un en-tête en double est renommé "X.1" par pandas : seule la première occurrence est mappée
+            if nom in entetes and nom not in positions.values():
+                positions[cellule["column"]] = nom
+        colonnes = sorted(positions)
+        if not colonnes:
+            return [], []
+        parseur.garder = {openpyxl.utils.get_column_letter(c) for c in colonnes}
+
+        donnees = []
+        attendue = 2
+        vide = [""] * len(colonnes)
+        for numero, cellules in lignes:
+            # Lignes absentes du XML : vides, comme dans read_excel
+            donnees.extend([vide] * (numero - attendue))
+            valeurs = {cellule["column"]: _valeur(cellule) for cellule in cellules}
+            donnees.append([valeurs.get(c, "") for c in colonnes])
+            attendue = numero + 1
+
+    # Lignes vides en fin de feuille ignorées (sur les colonnes retenues)
+    while donnees and donnees[-1] == vide:
+        donnees.pop()
+    return [positions[c] for c in colonnes], donnees
+
+
+def _projection_possible(feuille):
+    """Les API internes d'openpyxl et de pandas dont dépend la lecture projetée sont-elles présentes ?"""
+    return (WorkSheetParser is not object
+            and all(hasattr(feuille, nom) for nom in _INTERNES_FEUILLE)
+            and all(hasattr(feuille.parent, nom) for nom in _INTERNES_CLASSEUR)
+            and hasattr(pd.io.parsers, "TextParser"))
+
+
+def _lire_excel(fichier, entetes, feuille=None):
+    """Repli sans API interne : pd.read_excel, colonnes du mapping seulement."""
+    if hasattr(fichier, "seek"):
+        fichier.seek(0)
+    return pd.read_excel(fichier, sheet_name=feuille or 0, usecols=lambda nom: nom in entetes)
+
+
+def lire_colonnes(fichier, entetes, feuille=None):
+    """
+    Lit la feuille `feuille` (par défaut la première) en ne gardant que les colonnes dont
+    l'en-tête est dans `entetes`. Retourne le même DataFrame que pd.read_excel(fichier)[colonnes présentes].
+    """
+    classeur = openpyxl.load_workbook(fichier, read_only=True, data_only=True, keep_links=False)
+    try:
+        source = classeur.active if feuille is None else classeur[feuille]
+        if not _projection_possible(source):
+            warnings.warn(f"openpyxl {openpyxl.__version__} : lecture projetée indisponible, "
+                          "repli sur pd.read_excel (plus lent)")
+            return _lire_excel(fichier, entetes, feuille)
+        noms, donnees = _lignes(source, set(entetes))
+    finally:
+        classeur.close()
+
+    if not noms:
+        return pd.DataFrame()
+    parseur = pd.io.parsers.TextParser([noms] + donnees, header=0, skip_blank_lines=False)
+    return parseur.read()
+
+
+def format_fichier(nom):
+    """Format du fichier d'après son extension, ou None s'il n'est pas pris en charge."""
+    return FORMATS.get(os.path.splitext((nom or "").lower())[1])
+
+
+def _ouvrir_csv(flux):
+    """Flux du CSV, décompressé à la volée s'il est gzip (reconnu à sa signature, pas à son nom)."""
+    flux.seek(0)
+    signature = flux.read(2)
+    flux.seek(0)
+    return gzip.GzipFile(fileobj=flux, mode="rb") if signature == b"\x1f\x8b" else flux
+
+
+def _est_utf8(flux):
+    """Le flux entier est-il de l'UTF-8 valide ? Vérifié par blocs, sans le charger."""
+    decodeur = codecs.getincrementaldecoder("utf-8")()
+    try:
+        for bloc in iter(lambda: flux.read(TAILLE_BLOC), b""):
+            decodeur.decode(bloc)
+        decodeur.decode(b"", final=True)
+        return True
+    except UnicodeDecodeError:
+        return False
+    finally:
+        flux.seek(0)
+
+
+def _dialecte_csv(flux):
+    """(encodage, séparateur, en-têtes) d'après la première ligne. UTF-8 (avec ou sans BOM), sinon Latin-1."""
+    # Ligne d'en-têtes prise dans le premier bloc (les flux Arrow n'ont pas de readline)
+    premiere = flux.read(TAILLE_BLOC).split(b"\n", 1)[0].rstrip(b"\r")
+    flux.seek(0)
+    if _est_utf8(flux):
+        texte, encodage = premiere.decode("utf-8-sig"), "utf8"
+    else:
+        texte, encodage = premiere.decode("latin-1"), "latin1"
+    separateur = max(SEPARATEURS, key=texte.count)
+    return encodage, separateur, next(csv.reader([texte], delimiter=separateur), [])
+
+
+def entetes_csv(flux):
+    return _dialecte_csv(_ouvrir_csv(flux))[2]
+
+
+def lire_csv(fichier, entetes):
+    """CSV (ou CSV gzip) lu en flux par le lecteur multi-thread d'Arrow, colonnes du mapping seulement."""
+    source = _ouvrir_csv(fichier)
+    encodage, separateur, noms = _dialecte_csv(source)
+    colonnes = [nom for nom in dict.fromkeys(noms) if nom in entetes]
+    if not colonnes:
+        return pd.DataFrame()
+    table = pa_csv.read_csv(
+        source,
+        read_options=pa_csv.ReadOptions(encoding=encodage, use_threads=True),
+        parse_options=pa_csv.ParseOptions(delimiter=separateur),
+        # Cellule vide = valeur manquante, comme dans les classeurs
+        convert_options=pa_csv.ConvertOptions(include_columns=colonnes, strings_can_be_null=True),
+    )
+    return table.to_pandas()
+
+
+def entetes_parquet(flux):
+    try:
+        return pa_parquet.ParquetFile(flux).schema_arrow.names
+    finally:
+        flux.seek(0)
+
+
+def lire_parquet(fichier, entetes):
+    """Parquet : seules les colonnes du mapping sont lues (format colonne, pas de parsing de texte)."""
+    parquet = pa_parquet.ParquetFile(fichier)
+    colonnes = [nom for nom in parquet.schema_arrow.names if nom in entetes]
+    if not colonnes:
+        return pd.DataFrame()
+    return parquet.read(columns=colonnes, use_threads=True).to_pandas()
+
+
+def entetes_ods(flux):
+    try:
+        return [nom for nom in pd.read_excel(flux, engine="odf", nrows=0).columns]
+    finally:
+        flux.seek(0)
+
+
+def lire_ods(fichier, entetes):
+    return pd.read_excel(fichier, engine="odf", usecols=lambda nom: nom in entetes)
+
+
+# Lecteur et lecture des en-têtes de chaque format
+LECTEURS = {"xlsx": lire_colonnes, "csv": lire_csv, "parquet": lire_parquet, "ods": lire_ods}
+ENTETES = {"csv": entetes_csv, "parquet": entetes_parquet, "ods": entetes_ods}
@@ -0,0 +1,35 @@
+"""
+Lots d'import.
+
+Chaque import reçoit un identifiant de lot : l'id de sa ligne dans
+historique_importation, réservé sur la séquence dès le début du chargement
+(les connexions du chargement parallèle en ont besoin avant la fin de la
+transaction). Les faits créés portent ce lot dans credit_facilite.id_import,
+les lignes marquées supprimées par un import delta dans id_import_suppression.
+"""
+
+
+def reserver_id_import(cur):
+    """Réserve l'id de la future ligne d'historique de l'import."""
+    cur.execute("SELECT nextval(pg_get_serial_sequence('historique_importation', 'id'))")
+    return cur.fetchone()[0]
+
+
+def annuler_import(cur, id_import):
+    """
+    Annule un import dans la transaction courante : supprime ses faits et
+    restaure les lignes qu'il avait marquées supprimées. Deux requêtes indexées
+    sur le lot, indépendantes de la taille de credit_facilite.
+    Retourne (faits supprimés, lignes restaurées).
+    """
+    cur.execute("DELETE FROM credit_facilite WHERE id_import = %s", (id_import,))
+    supprimes = cur.rowcount
+    cur.execute("""
+        UPDATE credit_facilite
+        SET supprime_le = NULL, id_import_suppression = NULL
+        WHERE id_import_suppression = %s
+    """, (id_import,))
+    restaurees = cur.rowcount
+
+    cur.execute("UPDATE historique_importation SET annule_le = now() WHERE id = %s", (id_import,))
+    return supprimes, restaurees
@@ -0,0 +1,123 @@
+"""
+Chargement parallèle des faits sur plusieurs connexions du pool.
+
+Le moteur ensembliste résout et écrit tous les faits par une seule requête, sur
+une seule connexion. En mode parallèle :
+  1. les dimensions manquantes (promoteur, psf, filière) sont ajoutées et
+     validées sur une connexion à part, pour être visibles des autres
+     connexions. Ce sont des données de référence idempotentes, les garder en
+     cas d'échec est sans effet ; la transaction de l'import reste ouverte ;
+  2. la staging est découpée en K partitions (ligne % K). Chaque partition est
+     résolue (jointures des référentiels, conversions de types) par sa propre
+     connexion, en parallèle, dans sa propre table UNLOGGED de faits résolus,
+     validée : aucune écriture dans credit_facilite ;
+  3. la connexion principale recopie les K tables dans credit_facilite par un
+     seul INSERT ... SELECT, dans la transaction de l'import.
+Les faits ne deviennent visibles qu'avec l'historique de l'import, au commit de
+sa transaction : l'import reste tout ou rien, même si le processus s'arrête.
+Les tables des faits résolus sont supprimées par l'appelant après sa transaction ;
+une table laissée par un arrêt brutal porte le préfixe des tables de staging.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from psycopg2 import sql
+
+from db import get_connection
+from importation import fusion, staging
+
+COLONNES = fusion.COLONNES_FAITS + fusion.COLONNES_RESOLUES + ["id_type_projet", "created_by", "id_import"]
+
+
+def _connexion():
+    conn = get_connection()
+    if conn is None:
+        raise RuntimeError("Connexion à la base impossible pour le chargement parallèle.")
+    return conn
+
+
+def inserer_dimensions(table):
+    """Ajoute les dimensions manquantes de la staging et les valide, sur une connexion à part."""
+    conn = _connexion()
+    try:
+        with conn.cursor() as cur:
+            fusion.inserer_dimensions(cur, table)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def creer_table_faits(conn):
+    """Table UNLOGGED validée, aux colonnes de credit_facilite chargées par l'import, plus `ligne`."""
+    with conn.cursor() as cur:
+        types = staging.colonnes_table(cur, 'credit_facilite')
+    return staging.creer_table(conn, [("ligne", "integer")] + [(col, types[col]) for col in COLONNES])
+
+
+def resoudre_partition(table, partition, id_type_projet, created_by, id_import):
+    """Résout les faits d'une partition de la staging dans sa table UNLOGGED. Retourne son nom."""
+    conn = _connexion()
+    try:
+        table_faits = creer_table_faits(conn)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    fusion.requete_faits(cur, table, cible=table_faits, avec_ligne=True, partition=partition),
+                    (id_type_projet, created_by, id_import),
+                )
+            conn.commit()
+        except Exception:
+            staging.supprimer_table(conn, table_faits)
+            raise
+        return table_faits
+    finally:
+        conn.close()
+
+
+def resoudre_faits(cur, table, id_type_projet, created_by, id_import, connexions):
+    """
+    Résout les faits de la staging en parallèle sur `connexions` connexions.
+    Retourne les tables des faits résolus, à recopier par inserer_faits_resolus()
+    puis à supprimer par l'appelant après la fin de sa transaction.
+    """
+    fusion.verifier_communes(cur, table)
+    inserer_dimensions(table)
+
+    with ThreadPoolExecutor(max_workers=connexions) as executor:
+        futures = [
+            executor.submit(resoudre_partition, table, (i, connexions), id_type_projet, created_by, id_import)
+            for i in range(connexions)
+        ]
+        tables_faits, erreurs = [], []
+        for future in futures:
+            try:
+                tables_faits.append(future.result())
+            except Exception as e:
+                erreurs.append(e)
+    if erreurs:
+        supprimer_tables(tables_faits)
+        raise erreurs[0]
+    return tables_faits
+
+
+def inserer_faits_resolus(cur, tables_faits):
+    """Recopie les faits résolus dans credit_facilite, dans la transaction courante. Retourne leur nombre."""
+    liste = sql.SQL(', ').join(map(sql.Identifier, COLONNES))
+    union = sql.SQL(' UNION ALL ').join(
+        sql.SQL("SELECT ligne, {} FROM {}").format(liste, sql.Identifier(t)) for t in tables_faits
+    )
+    cur.execute(sql.SQL("INSERT INTO credit_facilite ({}) SELECT {} FROM ({}) f ORDER BY ligne").format(
+        liste, liste, union
+    ))
+    return cur.rowcount
+
+
+def supprimer_tables(tables_faits):
+    """Supprime les tables des faits résolus, sur une connexion à part (la transaction de l'import reste ouverte)."""
+    if not tables_faits:
+        return
+    conn = _connexion()
+    try:
+        for table_faits in tables_faits:
+            staging.supprimer_table(conn, table_faits)
+    finally:
+        conn.close()
@@ -0,0 +1,335 @@
+"""
+Pipeline d'importation des fichiers Excel : lecture, mapping des colonnes,
+conversions de types et insertion dans PostgreSQL.
+
+Ce module charge pandas et numpy. Il n'est importé qu'au premier import de
+fichier (voir routes/authnew.py), ou préchargé par wsgi.py avant le fork des
+workers, pour que les routes d'authentification restent légères.
+"""
+import logging
+import time
+
+import pandas as pd
+import numpy as np
+from psycopg2.extras import Json
+
+from importation import delta, fusion, lecture, lots, parallele, plans, staging
+
+logger = logging.getLogger(__name__)
+
+# Moteurs de chargement : "sql" (ensembliste, par défaut) ou "lignes" (historique, pour comparaison)
+MOTEURS = ("sql", "lignes")
+
+# Modes d'import : "complet" ajoute toutes les lignes, "delta" n'écrit que les différences
+MODES = ("complet", "delta")
+
+# Connexions maximales pour le chargement parallèle des faits
+MAX_CONNEXIONS = 8
+
+
+def lire_excel(file, plan=None, feuille=None):
+    """
+    Lit une feuille (la première par défaut) ; avec un plan, seules les colonnes de son mapping sont décodées.
+    Les colonnes gardent leur type (str, float64, datetime64) et leurs valeurs manquantes (NaN, NaT) :
+    pas de conversion en objets Python.
+    """
+    if plan is None:
+        return pd.read_excel(file, sheet_name=feuille or 0)
+    return plans.categoriser(lecture.lire_colonnes(file, plan.renommage, feuille), plan)
+
+
+def lire_fichier(file, plan, format_fichier="xlsx"):
+    """
+    Lit un fichier envoyé (xlsx, csv, csv.gz, ods, parquet) ; seules les colonnes du mapping sont gardées,
+    et les colonnes à faible cardinalité sont encodées en catégories.
+    """
+    if format_fichier == "xlsx":
+        return lire_excel(file, plan)
+    return plans.categoriser(lecture.LECTEURS[format_fichier](file, plan.renommage), plan)
+
+
+def preparer(df, plan):
+    """Renomme les colonnes et convertit dates et nombres selon le plan du type de fichier."""
+    df = plans.appliquer(plan, df)
+
+    # Vérification rapide des colonnes importantes (journal de débogage, jamais sur la sortie standard)
+    logger.debug("Colonnes présentes après mapping : %s", df.columns.tolist())
+    if "nom_promoteur" not in df.columns or "denomination_entite" not in df.columns:
+        logger.debug("Colonnes nom_promoteur / denomination_entite absentes dans ce fichier")
+
+    return df
+
+
+def colonnes_staging():
+    """Colonnes de la table de staging : numéro de ligne, empreinte, puis les colonnes des plans."""
+    return [("ligne", "integer"), ("empreinte_ligne", "bigint")] + list(plans.colonnes_sql())
+
+
+def _objets(serie):
+    """Colonne en objets Python, None pour les valeurs manquantes (représentation des anciens imports)."""
+    return serie.astype(object).where(serie.notna(), None)
+
+
+def empreintes_lignes(df):
+    """Empreinte 64 bits de chaque ligne sur ses colonnes métier (cibles des mappings)."""
+    colonnes = [nom for nom, _ in colonnes_staging()[2:] if nom in df.columns]
+    valeurs = df[colonnes]
+
+    # Colonnes texte lues en nombres ou en dates, avec des vides : les anciens imports les passaient
+    # en objets Python, hachés sous forme de texte. Même représentation ici, pour que les
+    # empreintes déjà en base (mode delta) restent comparables.
+    heritees = {
+        nom: _objets(valeurs[nom]) for nom in colonnes
+        if plans.genre(nom) == "texte" and valeurs[nom].dtype.kind in "fM" and valeurs[nom].hasnans
+    }
+    # Dates et clés restent typées dans le DataFrame (datetime64, string) ; les anciens imports
+    # les hachaient en objets date Python et en str/None : même représentation, au hachage seulement
+    heritees.update({
+        nom: _objets(valeurs[nom].dt.date) if plans.genre(nom) == "date" else _objets(valeurs[nom])
+        for nom in colonnes
+        if plans.genre(nom) in ("date", "cle") and valeurs[nom].dtype != object
+    })
+    if heritees:
+        valeurs = valeurs.assign(**heritees)
+
+    empreintes = pd.util.hash_pandas_object(valeurs, index=False)
+    # uint64 -> bigint PostgreSQL, même motif binaire
+    return empreintes.to_numpy().view(np.int64)
+
+
+def charger_staging(conn, df):
+    """Crée la table de staging de l'import et y copie le fichier. Retourne son nom."""
+    colonnes = colonnes_staging()
+    table = staging.creer_table(conn, colonnes)
+
+    # Numéro de ligne Excel (ligne 1 = en-têtes)
+    df = df.assign(ligne=np.arange(2, len(df) + 2), empreinte_ligne=empreintes_lignes(df))
+    presentes = [nom for nom, _ in colonnes if nom in df.columns]
+    try:
+        staging.copier(conn, table, df, presentes,
+                       dates=[nom for nom, type_sql in colonnes if type_sql == "date"])
+    except Exception:
+        staging.supprimer_table(conn, table)
+        raise
+    return table
+
+
+def inserer_lignes(cur, df, id_type_projet, created_by, id_import):
+    """
+    Moteur "lignes" : insère le fichier ligne par ligne (dimensions, credit_facilite).
+    Conservé pour comparaison avec le moteur ensembliste (importation/fusion.py).
+    """
+    df = df.assign(empreinte_ligne=empreintes_lignes(df))
+    for _, row in df.iterrows():
+        row_dict = row.to_dict()
+
+        # ✅ Remplacer toutes les valeurs NaT/NaN par None pour PostgreSQL
+        for k, v in row_dict.items():
+            if pd.isna(v):
+                row_dict[k] = None
+
+        # Insertion promoteur (sans doublons)
+        if "nom_promoteur" in row_dict and "denomination_entite" in row_dict:
+            cur.execute("""
+                SELECT 1 FROM promoteur
+                WHERE nom_promoteur = %s AND nom_entite = %s
+            """, (row_dict.get("nom_promoteur"), row_dict.get("denomination_entite")))
+            exists = cur.fetchone()
+
+            if not exists:
+                cur.execute("""
+                    INSERT INTO promoteur (nom_promoteur, nom_entite, sexe_promoteur, statut_juridique, adresse_contact)
+                    VALUES (%s, %s, %s, %s, %s)
+                """, (
+                    row_dict.get("nom_promoteur"),
+                    row_dict.get("denomination_entite"),
+                    row_dict.get("sexe_promoteur"),
+                    row_dict.get("statut_juridique"),
+                    row_dict.get("adresse_contact")
+                ))
+
+
+        # Insertion PSF
+        if "psf" in row_dict:
+            cur.execute("""
+                INSERT INTO psf (nom_psf)
+                VALUES (%s)
+                ON CONFLICT (nom_psf) DO NOTHING
+            """, (row_dict.get("psf"),))
+
+        # Insertion filiere
+        if "filiere" in row_dict:
+            cur.execute("""
+                INSERT INTO filiere (nom_filiere, maillon)
+                VALUES (%s, %s)
+                ON CONFLICT (nom_filiere) DO NOTHING
+            """, (row_dict.get("filiere"), row_dict.get("maillon_type_credit")))
+
+        # Récupération des IDs
+        cur.execute("SELECT id_promoteur FROM promoteur WHERE nom_promoteur = %s AND nom_entite = %s",
+                    (row_dict.get("nom_promoteur"), row_dict.get("denomination_entite")))
+        id_promoteur = cur.fetchone()[0] if cur.rowcount > 0 else None
+
+        cur.execute("SELECT id_psf FROM psf WHERE nom_psf = %s", (row_dict.get("psf"),))
+        id_psf = cur.fetchone()[0] if cur.rowcount > 0 else None
+
+        cur.execute("SELECT id_filiere FROM filiere WHERE nom_filiere = %s", (row_dict.get("filiere"),))
+        id_filiere = cur.fetchone()[0] if cur.rowcount > 0 else None
+
+        # Ensuite récupérer la commune
+        nom_commune = row_dict.get("commune", "").strip().lower()
+        cur.execute("SELECT id_commune FROM commune WHERE LOWER(TRIM(nom_commune)) = %s", (nom_commune,))
+        id_commune = cur.fetchone()[0] if cur.rowcount > 0 else None
+
+        if not id_commune:
+            raise ValueError(f"Commune non trouvée pour : '{row_dict.get('commune')}'")
+
+        # Insertion credit_facilite
+        projet_data = {
+            "date_comite_validation": row_dict.get("date_comite_validation"),
+            "intitule_projet": row_dict.get("intitule_projet"),
+            "cout_total_projet": row_dict.get("cout_total_projet"),
+            "credit_solicite": row_dict.get("credit_solicite"),
+            "credit_accorde": row_dict.get("credit_accorde"),
+            "refinancement_accorde": row_dict.get("refinancement_accorde"),
+            "total_financement": row_dict.get("total_financement"),
+            "id_commune": id_commune,
+            "id_filiere": id_filiere,
+            "id_psf": id_psf,
+            "id_promoteur": id_promoteur,
+            "statut_dossier": row_dict.get("statut_dossier"),
+            "credit_accorde_statut": row_dict.get("credit_accorde_statut"),
+            "id_type_projet": id_type_projet,
+            "created_by": created_by,
+            "id_import": id_import,
+            "garantie_fnda_accordee": row_dict.get("garantie_fnda_accordee"),
+            "bonification_fnda_accordee": row_dict.get("bonification_fnda_accordee"),
+            "motif_credit_non_accordee": row_dict.get("motif_credit_non_accordee"),
+            "notification": row_dict.get("notification"),
+            "reference_si_notifiee": row_dict.get("reference_si_notifiee"),
+            "date_notification": row_dict.get("date_notification"),
+            "montant_decaisse": row_dict.get("montant_decaisse"),
+            "date_creation_entite": row_dict.get("date_creation_entite"),
+            "date_decaissement": row_dict.get("date_decaissement"),
+            "observations": row_dict.get("observations"),
+            "chiffre_affaires_annuel": row_dict.get("chiffre_affaires_annuel"),
+            "rang_cycle": row_dict.get("rang_cycle"),
+            "nom_beneficiaire": row_dict.get("nom_beneficiaire"),
+            "nb_beneficiaires_hommes": row_dict.get("nb_beneficiaires_hommes"),
+            "nb_beneficiaires_femmes": row_dict.get("nb_beneficiaires_femmes"),
+            "total_beneficiaires": row_dict.get("total_beneficiaires"),
+            "duree": row_dict.get("duree"),
+            "differe_mois": row_dict.get("differe_mois"),
+            "date_premiere_echeance": row_dict.get("date_premiere_echeance"),
+            "date_derniere_echeance": row_dict.get("date_derniere_echeance"),
+            "periodicite_remboursement": row_dict.get("periodicite_remboursement"),
+            "contrat_signe": row_dict.get("contrat_signe"),
+            "reference_ligne_refinancement": row_dict.get("reference_ligne_refinancement"),
+            "date_accord_ligne_refinancement": row_dict.get("date_accord_ligne_refinancement"),
+            "numero_reference_tirage": row_dict.get("numero_reference_tirage"),
+            "date_tirage": row_dict.get("date_tirage"),
+            "garanties_promoteurs": row_dict.get("garanties_promoteurs"),
+            "montant_accorde_sfd_banque": row_dict.get("montant_accorde_sfd_banque"),
+            "montant_credit_valide_fnda": row_dict.get("montant_credit_valide_fnda"),
+            "taux_interet_degressif": row_dict.get("taux_interet_degressif"),
+            "capital": row_dict.get("capital"),
+            "interets_promoteurs": row_dict.get("interets_promoteurs"),
+            "interets_fnda": row_dict.get("interets_fnda"),
+            "numero": row_dict.get("numero"),
+            "empreinte_ligne": int(row_dict["empreinte_ligne"])
+        }
+
+        cur.execute(f"""
+            INSERT INTO credit_facilite (
+                {', '.join(projet_data.keys())}
+            ) VALUES (
+                {', '.join(f"%({k})s" for k in projet_data.keys())}
+            )
+        """, projet_data)
+
+    return len(df)
+
+
+def charger(conn, df, id_type_projet, created_by, nom_fichier, moteur="sql", connexions=1,
+            mode="complet", empreinte=None, valider=True, archive=None, options=None, remplace=None,
+            fichiers=None):
+    """
+    Charge un DataFrame préparé : staging, faits, donnees_importees et historique,
+    en une transaction validée à la fin (ou annulée si valider=False, pour les mesures).
+    archive et options sont enregistrés dans l'historique pour pouvoir rejouer l'import ;
+    remplace est l'import d'origine d'un import rejoué, annulé dans la même transaction.
+    fichiers : fichiers d'origine d'un import par lot, [{nom_fichier, empreinte, archive, lignes}, ...].
+    Retourne les statistiques du chargement.
+    """
+    debut = time.perf_counter()
+    table = charger_staging(conn, df)
+    bilan = {}
+    # Tables des faits résolus du chargement parallèle, supprimées après la transaction
+    tables_faits = []
+    try:
+        with conn.cursor() as cur:
+            id_import = lots.reserver_id_import(cur)
+
+            if remplace is not None:
+                # Verrouillé : deux rejeux simultanés du même import ne l'annulent pas deux fois
+                cur.execute("SELECT annule_le FROM historique_importation WHERE id = %s FOR UPDATE", (remplace,))
+                ligne = cur.fetchone()
+                if ligne is None or ligne[0] is not None:
+                    raise ValueError(f"Import {remplace} introuvable ou déjà annulé")
+                # Avant le chargement : un import delta rejoué se compare à l'état sans l'import d'origine
+                lots.annuler_import(cur, remplace)
+
+            if mode == "delta":
+                bilan = delta.fusionner(cur, table, id_type_projet, created_by, id_import)
+                nb_lignes = bilan["lignes_inserees"] + bilan["lignes_modifiees"]
+            else:
+                if moteur == "lignes":
+                    nb_lignes = inserer_lignes(cur, df, id_type_projet, created_by, id_import)
+                elif connexions > 1:
+                    tables_faits = parallele.resoudre_faits(
+                        cur, table, id_type_projet, created_by, id_import, connexions
+                    )
+                    nb_lignes = parallele.inserer_faits_resolus(cur, tables_faits)
+                else:
+                    nb_lignes = fusion.fusionner(cur, table, id_type_projet, created_by, id_import)
+
+            # Publiée en dernier : le verrou de donnees_importees n'est tenu que jusqu'au commit
+            staging.publier_donnees_importees(cur, table)
+
+            # Historique importation (l'id est celui du lot porté par les faits)
+            cur.execute("""
+                INSERT INTO historique_importation
+                    (id, nom_fichier, id_type_projet, utilisateur, statut, empreinte_sha256,
+                     archive, options, remplace_import)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, (id_import, nom_fichier, id_type_projet, created_by, True, empreinte,
+                  archive, Json(options) if options is not None else None, remplace))
+
+            if fichiers:
+                # Import par lot : chaque fichier d'origine, pour les doublons et la traçabilité
+                cur.executemany("""
+                    INSERT INTO historique_importation_fichiers
+                        (id_import, nom_fichier, empreinte_sha256, archive, lignes)
+                    VALUES (%s, %s, %s, %s, %s)
+                """, [(id_import, f["nom_fichier"], f["empreinte"], f["archive"], f["lignes"]) for f in fichiers])
+
+        if valider:
+            conn.commit()
+        else:
+            conn.rollback()
+    finally:
+        staging.supprimer_table(conn, table)
+        for table_faits in tables_faits:
+            staging.supprimer_table(conn, table_faits)
+
+    duree = time.perf_counter() - debut
+    return {
+        "id_import": id_import,
+        "moteur": moteur,
+        "mode": mode,
+        "connexions": connexions,
+        "lignes": nb_lignes,
+        **bilan,
+        "duree_chargement_s": round(duree, 3),
+        "lignes_par_seconde": round(len(df) / duree, 1) if duree else None,
+    }
@@ -0,0 +1,304 @@
+"""
+Plans de colonnes compilés par type de fichier.
+
+Le plan d'un type_fichier est construit une fois puis mis en cache : renommage
+des en-têtes Excel, genre de chaque colonne (texte, clé, date, nombre, entier),
+type SQL et ordre des colonnes de la staging. La conversion d'un DataFrame
+suit le plan en une passe vectorisée, avec des formats de date explicites
+(dont les numéros de série Excel) au lieu de l'inférence de pd.to_datetime.
+"""
+import functools
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Mapping des fichiers de type tirage
+MAPPING_FICHIER1 = {
+    "N°": "numero",
+    "SFD": "psf",
+    "Référence ligne de refinancement": "reference_ligne_refinancement",
+    "Date accord ligne de refinancement": "date_accord_ligne_refinancement",
+    "N°  de référence de la demande du Tirage": "numero_reference_tirage",
+    "Date de la demande du tirage": "date_tirage",
+    "Date de signature de l'échancier du FNDA (Comité de validation)": "date_comite_validation",
+    "COMMUNE": "commune",
+    "PDA": "pda",
+    "Dates de décaissement": "date_decaissement",
+    "Noms du groupe/groupement/MPME/individu/…": "denomination_entite",
+    "Numéro Personnel d'Identification (NPI) du Bénéficiaire": "npi",
+    "Noms des bénéficiaires": "nom_beneficiaire",
+    "Nom du Responsable": "nom_promoteur",
+    "Contact": "adresse_contact",
+    "NOMBRE BENEFICIAIRE HOMME": "nb_beneficiaires_hommes",
+    "NOMBRE BENEFICIAIRE FEMME": "nb_beneficiaires_femmes",
+    "NOMBRE TOTAL  BENEFICIAIRE": "total_beneficiaires",
+    "OBJET DU CREDIT": "intitule_projet",
+    "Filière concernée par l'objet du crédit": "filiere",
+    "Types de crédits (Production/Transformation/Commercialisation/Mécanisation Agricole …)": "maillon_type_credit",
+    "Garanties fournies par les promoteurs": "garanties_promoteurs",
+    "Rang/cycles": "rang_cycle",
+    "Montants sollicités/étudiés": "credit_solicite",
+    "Montants accordés par le  SFD ou la Banque": "credit_accorde",
+    "Montant crédit validé par le FNDA": "montant_credit_valide_fnda",
+    "Garantie Accordée par le FNDA": "garantie_fnda_accordee",
+    "Durées (mois)": "duree",
+    "Différé (mois)": "differe_mois",
+    "Taux d'intérêt dégressif": "taux_interet_degressif",
+    "Périodicités de Remboursement": "periodicite_remboursement",
+    "Capital": "capital",
+    "Intérets à payer par les Promoteurs": "interets_promoteurs",
+    "Intérets à payer par le FNDA": "interets_fnda",
+    "Dates premières échéances": "date_premiere_echeance",
+    "Dates dernières échéances": "date_derniere_echeance",
+    "BONIFICATION": "bonification_fnda_accordee",
+    "Observations": "observations",
+}
+
+
+# Mapping correspondant aux fichiers de Garantie et de Bonification
+MAPPING_FICHIER2 = {
+    "DATE COMITE VALIDATION": "date_comite_validation",
+    "N°": "numero",
+    "PDA": "pda",
+    "PSF": "psf",
+    "Département": "departement",
+    "Commune": "commune",
+    "INTITULE DU PROJET": "intitule_projet",
+    "DENOMINATION DE L'ENTITE": "denomination_entite",
+    "NUMERO D'IDENTIFICATION PERSONNEL (NPI) DU PROMOTEUR": "npi",
+    "NOM DU PROMOTEUR": "nom_promoteur",
+    "SEXE PROMOTEUR": "sexe_promoteur",
+    "STATUT JURIDIQUE": "statut_juridique",
+    "Localisation ou adresse/contact": "adresse_contact",
+    "FILIERE": "filiere",
+    "COUT TOTAL DU PROJET": "cout_total_projet",
+    "CREDIT SOLLICITE": "credit_solicite",
+    "CREDIT ACCORDE": "credit_accorde",
+    "REFINANCEMENT ACCORDE ": "refinancement_accorde",
+    "GARANTIE FNDA ACCORDEE": "garantie_fnda_accordee",
+    "BONIFICATION ACCORDEE": "bonification_fnda_accordee",
+    "CREDIT ACCORDE?": "credit_accorde_statut",
+    "SI NON, MOTIF": "motif_credit_non_accordee",
+    "TOTAL FINANCEMENT": "total_financement",
+    "STATUT DOSSIER": "statut_dossier",
+    "DATE DE CREATION DE L'ENTITE": "date_creation_entite",
+    "NOTIFIE?": "notification",
+    "SI OUI, REFERENCE": "reference_si_notifiee",
+    "Date de notification": "date_notification",
+    "CONTRAT SIGNE?": "contrat_signe",
+    "MONTANT DECAISSE ?": "montant_decaisse",
+}
+
+MAPPINGS = {
+    "FICHIER 1": MAPPING_FICHIER1,
+    "FICHIER 2": MAPPING_FICHIER2,
+}
+
+# Colonnes date
+DATE_COLS = [
+    "date_comite_validation",
+    "date_decaissement",
+    "date_premiere_echeance",
+    "date_derniere_echeance",
+    "date_creation_entite",
+    "date_notification",
+    "date_accord_ligne_refinancement",
+    "date_tirage"
+]
+
+# Colonnes numériques et entières
+NUMERIC_COLS = [
+    "cout_total_projet", "credit_solicite", "credit_accorde", "refinancement_accorde",
+    "total_financement", "montant_decaisse", "chiffre_affaires_annuel",
+    "montant_accorde_sfd_banque", "montant_credit_valide_fnda", "taux_interet_degressif",
+    "capital", "interets_promoteurs", "interets_fnda"
+]
+INT_COLS = [
+    "rang_cycle", "nb_beneficiaires_hommes", "nb_beneficiaires_femmes",
+    "total_beneficiaires", "duree", "differe_mois"
+]
+
+
+# Colonnes texte à faible cardinalité (quelques valeurs répétées sur tout le fichier),
+# encodées en catégories dès la lecture : chaque valeur distincte n'est traitée qu'une fois
+CATEGORIES = [
+    "commune", "pda", "psf", "filiere", "departement",
+    "sexe_promoteur", "statut_juridique", "statut_dossier",
+]
+
+
+# Formats acceptés pour les dates saisies en texte (jour avant mois), essayés dans l'ordre
+FORMATS_DATE = ["%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y", "%d/%m/%y", "%Y-%m-%d %H:%M:%S", "%d/%m/%Y %H:%M:%S"]
+
+# Origine des numéros de série Excel (1 = 31/12/1899, avec le faux 29/02/1900)
+ORIGINE_EXCEL = "1899-12-30"
+
+# Clé métier de l'import différentiel
+CLES = ["numero"]
+
+TYPES_SQL = {"texte": "text", "cle": "text", "date": "date", "nombre": "numeric", "entier": "bigint"}
+
+Plan = namedtuple("Plan", ["type_fichier", "renommage", "colonnes"])
+
+
+def genre(col):
+    if col in CLES:
+        return "cle"
+    if col in DATE_COLS:
+        return "date"
+    if col in NUMERIC_COLS:
+        return "nombre"
+    if col in INT_COLS:
+        return "entier"
+    return "texte"
+
+
+@functools.lru_cache(maxsize=None)
+def plan(type_fichier):
+    """
+    Plan compilé du type de fichier, ou None s'il est inconnu.
+    colonnes = ((nom, genre), ...) : cibles du mapping puis colonnes typées connues.
+    """
+    mapping = MAPPINGS.get(type_fichier)
+    if mapping is None:
+        return None
+    noms = list(dict.fromkeys(mapping.values()))
+    noms += [c for c in DATE_COLS + NUMERIC_COLS + INT_COLS if c not in noms]
+    return Plan(type_fichier, dict(mapping), tuple((nom, genre(nom)) for nom in noms))
+
+
+@functools.lru_cache(maxsize=None)
+def colonnes_sql():
+    """
+    Colonnes typées de la staging, communes à tous les types de fichier : ((nom, type_sql), ...).
+    Ordre stable (cibles des mappings puis colonnes typées) : il fixe l'empreinte des lignes.
+    """
+    noms = [nom for mapping in MAPPINGS.values() for nom in mapping.values()]
+    noms += DATE_COLS + NUMERIC_COLS + INT_COLS
+    return tuple((nom, TYPES_SQL[genre(nom)]) for nom in dict.fromkeys(noms))
+
+
+def categoriser(df, plan_fichier):
+    """Encode en catégories les colonnes de CATEGORIES d'un fichier lu (en-têtes sources, avant renommage)."""
+    categories = {
+        entete: df[entete].astype("category")
+        for entete, cible in plan_fichier.renommage.items()
+        if cible in CATEGORIES and entete in df.columns
+    }
+    return df.assign(**categories) if categories else df
+
+
+def _textes(valeurs):
+    """Cellules texte d'une colonne object, NaN ailleurs (.str refuse les colonnes sans texte)."""
+    if pd.api.types.infer_dtype(valeurs, skipna=True) not in ("string", "mixed", "mixed-integer"):
+        return pd.Series(np.nan, index=valeurs.index, dtype=object)
+    return valeurs.where(valeurs.str.len().notna())
+
+
+def en_cle(serie):
+    """Clé en texte (dtype string, <NA> si absente), sans le ".0" des entiers lus en float par Excel."""
+    texte = serie.astype("string").str.strip()
+    # Le cas courant (N° saisis en texte) ne passe pas par la conversion numérique
+    if pd.api.types.infer_dtype(serie, skipna=True) != "string":
+        entiers = pd.to_numeric(serie, errors="coerce") % 1 == 0
+        texte = texte.mask(entiers, texte.str.replace(r"\.0+$", "", regex=True))
+    return texte.mask(texte == "")
+
+
+def _essayer_formats(textes, dates):
+    """
+    Écrit dans `dates` (tableau datetime64, par position) les textes reconnus
+    par un des FORMATS_DATE. Retourne les textes non reconnus.
+    """
+    # Le format le plus fréquent d'un échantillon d'abord : une seule passe complète en général
+    echantillon = textes.head(50)
+    formats = sorted(
+        FORMATS_DATE,
+        key=lambda fmt: -pd.to_datetime(echantillon, format=fmt, errors="coerce").notna().sum(),
+    )
+    for fmt in formats:
+        if textes.empty:
+            break
+        converties = pd.to_datetime(textes, format=fmt, errors="coerce")
+        reconnues = converties.notna().to_numpy()
+        dates[textes.index.to_numpy()[reconnues]] = converties.to_numpy()[reconnues]
+        textes = textes[~reconnues]
+    return textes
+
+
+def _dates_textes(textes, dates):
+    """Complète `dates` avec les textes aux formats FORMATS_DATE (NaT si aucun ne convient)."""
+    textes = textes.reset_index(drop=True)
+    restantes = _essayer_formats(textes[np.isnat(dates)].dropna(), dates)
+    # Espaces parasites : deuxième essai sur les seules cellules non reconnues
+    if not restantes.empty:
+        _essayer_formats(restantes.str.strip(), dates)
+    return dates
+
+
+def _dates_excel(nombres):
+    return pd.to_datetime(nombres.where(nombres > 0), unit="D", origin=ORIGINE_EXCEL)
+
+
+def en_dates(serie):
+    """
+    Dates Excel, numéros de série et textes aux formats FORMATS_DATE ; NaT sinon.
+    Colonne datetime64 ramenée au jour (pas d'objets date Python : la conversion se fait au COPY).
+    """
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie.dt.normalize()
+
+    valeurs = serie.astype(object)
+    genre_valeurs = pd.api.types.infer_dtype(valeurs, skipna=True)
+
+    # Colonnes homogènes : une seule conversion
+    if genre_valeurs in ("datetime", "datetime64", "date", "empty"):
+        return pd.to_datetime(valeurs, errors="coerce").dt.normalize()
+    if genre_valeurs in ("integer", "floating", "mixed-integer-float"):
+        return _dates_excel(pd.to_numeric(valeurs, errors="coerce")).dt.normalize()
+
+    if genre_valeurs == "string":
+        textes = valeurs
+        dates = np.full(len(valeurs), np.datetime64("NaT"), dtype="datetime64[ns]")
+    else:
+        # Colonne mixte : cellules date, numéros de série, puis textes
+        textes = _textes(valeurs)
+        nombres = pd.to_numeric(valeurs.where(textes.isna()), errors="coerce")
+        autres = pd.to_datetime(valeurs.where(textes.isna() & nombres.isna()), errors="coerce")
+        dates = autres.astype("datetime64[ns]").fillna(_dates_excel(nombres)).to_numpy(copy=True)
+
+    dates = _dates_textes(textes, dates)
+    return pd.Series(dates, index=serie.index).dt.normalize()
+
+
+def en_nombres(serie):
+    """Nombres, y compris saisis en texte à la française ("1 250 000", "12,5")."""
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie
+    valeurs = serie.astype(object)
+    textes = _textes(valeurs)
+    if textes.isna().all():
+        return pd.to_numeric(valeurs, errors="coerce")
+    nettoyes = textes.str.replace(r"[\s\u00a0\u202f]", "", regex=True).str.replace(",", ".", regex=False)
+    return pd.to_numeric(valeurs.mask(textes.notna(), nettoyes), errors="coerce")
+
+
+def en_entiers(serie):
+    """Entiers nullables ; une valeur non entière devient manquante."""
+    nombres = pd.to_numeric(en_nombres(serie), errors="coerce")
+    return nombres.where(nombres % 1 == 0).astype(pd.Int64Dtype())
+
+
+CONVERSIONS = {"cle": en_cle, "date": en_dates, "nombre": en_nombres, "entier": en_entiers}
+
+
+def appliquer(plan_fichier, df):
+    """Renomme et convertit le DataFrame selon le plan, en une seule affectation."""
+    df = df.rename(columns=plan_fichier.renommage)
+    conversions = {
+        nom: CONVERSIONS[g](df[nom])
+        for nom, g in plan_fichier.colonnes
+        if g in CONVERSIONS and nom in df.columns
+    }
+    return df.assign(**conversions)
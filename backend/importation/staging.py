@@ -0,0 +1,123 @@
+"""
+Tables de staging des imports.
+
+Chaque import charge ses lignes dans sa propre table UNLOGGED
+(staging_import_<token>), créée et validée hors de la transaction principale.
+Les données ne sont publiées dans donnees_importees qu'à la fin, dans la
+transaction de l'import, par DELETE + INSERT ... SELECT :
+  - les lecteurs ne sont jamais bloqués (MVCC), contrairement au TRUNCATE
+    qui prenait un verrou ACCESS EXCLUSIVE pendant tout l'import ;
+  - deux imports concurrents ne se croisent qu'au moment de la publication,
+    sérialisée par un verrou qui ne bloque que les autres écrivains.
+Contrairement à l'ancien TRUNCATE ... RESTART IDENTITY CASCADE, la séquence
+de donnees_importees.id n'est plus remise à 1 à chaque import (aucune table ne
+référence donnees_importees : le CASCADE était sans effet).
+"""
+import logging
+import uuid
+
+import psycopg2
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+from psycopg2 import sql
+
+logger = logging.getLogger(__name__)
+
+PREFIXE = 'staging_import_'
+
+
+def creer_table(conn, colonnes):
+    """Crée une table de staging UNLOGGED et la valide. colonnes = [(nom, type_sql), ...]"""
+    table = f"{PREFIXE}{uuid.uuid4().hex[:16]}"
+    definition = sql.SQL(', ').join(
+        sql.SQL('{} {}').format(sql.Identifier(nom), sql.SQL(type_sql)) for nom, type_sql in colonnes
+    )
+    with conn.cursor() as cur:
+        cur.execute(sql.SQL("CREATE UNLOGGED TABLE {} ({})").format(sql.Identifier(table), definition))
+    conn.commit()
+    return table
+
+
+def colonne_arrow(serie):
+    """Colonne Arrow d'une série ; une colonne texte aux valeurs mêlées (nombres et textes) devient du texte."""
+    try:
+        return pa.array(serie, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Valeurs manquantes remises à None : avant pandas 3, astype("str") les écrit "None" / "nan"
+        textes = serie.astype("str").to_numpy(dtype=object)
+        textes[serie.isna().to_numpy()] = None
+        return pa.array(textes, type=pa.string())
+
+
+def copier(conn, table, df, colonnes, dates=()):
+    """
+    Charge les colonnes du DataFrame dans la table via COPY (un seul aller-retour).
+    Le CSV est écrit par Arrow directement depuis les colonnes typées, sans passer
+    par une chaîne Python par cellule ; les valeurs manquantes deviennent NULL.
+    Les colonnes `dates` (datetime64) sont écrites en date32 : AAAA-MM-JJ.
+    """
+    arrow = {nom: colonne_arrow(df[nom]) for nom in colonnes}
+    for nom in dates:
+        if nom in arrow and pa.types.is_timestamp(arrow[nom].type):
+            arrow[nom] = arrow[nom].cast(pa.date32())
+    donnees = pa.table(arrow)
+    sortie = pa.BufferOutputStream()
+    pa_csv.write_csv(donnees, sortie, pa_csv.WriteOptions(include_header=False))
+    buffer = pa.BufferReader(sortie.getvalue())
+
+    requete = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)").format(
+        sql.Identifier(table),
+        sql.SQL(', ').join(map(sql.Identifier, colonnes)),
+    )
+    with conn.cursor() as cur:
+        cur.copy_expert(requete.as_string(cur), buffer)
+    conn.commit()
+
+
+def colonnes_table(cur, table):
+    """Retourne {colonne: type SQL} pour une table existante."""
+    cur.execute("""
+        SELECT attname, format_type(atttypid, atttypmod)
+        FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped
+        ORDER BY attnum
+    """, (table,))
+    return dict(cur.fetchall())
+
+
+def publier_donnees_importees(cur, table):
+    """
+    Remplace le contenu de donnees_importees par celui de la table de staging,
+    dans la transaction de l'import : les publications concurrentes se suivent.
+    """
+    cibles = colonnes_table(cur, 'donnees_importees')
+    sources = colonnes_table(cur, table)
+    communes = [c for c in sources if c in cibles]
+
+    # Sans verrou, sous READ COMMITTED, le DELETE d'un second import attend les lignes du premier,
+    # ne voit pas celles qu'il a insérées : donnees_importees garderait les deux fichiers.
+    # SHARE ROW EXCLUSIVE : exclut les autres écrivains jusqu'à la fin de la transaction, pas les lecteurs.
+    cur.execute("LOCK TABLE donnees_importees IN SHARE ROW EXCLUSIVE MODE")
+    cur.execute("DELETE FROM donnees_importees")
+    if not communes:
+        return
+
+    # Conversion explicite vers le type de la colonne cible (text -> numeric, etc.)
+    cur.execute(sql.SQL("INSERT INTO donnees_importees ({}) SELECT {} FROM {} ORDER BY ligne").format(
+        sql.SQL(', ').join(map(sql.Identifier, communes)),
+        sql.SQL(', ').join(
+            sql.SQL('{}::{}').format(sql.Identifier(c), sql.SQL(cibles[c])) for c in communes
+        ),
+        sql.Identifier(table),
+    ))
+
+
+def supprimer_table(conn, table):
+    try:
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(table)))
+        conn.commit()
+    except psycopg2.Error as e:
+        # Une table orpheline ne bloque rien ; elle se repère à son préfixe staging_import_
+        logger.warning("Suppression de la table de staging %s impossible : %s", table, e)
@@ -0,0 +1,197 @@
+"""
+Traitement d'un fichier à importer, hors de toute requête HTTP.
+
+Détection du type de fichier, contrôle de la facilité, doublon, lecture,
+conversions, validation, archivage et chargement : partagés par les routes
+d'import, l'import en masse (import_cli.py), le dossier de dépôt
+(surveiller_depot.py) et le rejeu des imports archivés.
+Un fichier donne le même résultat quel que soit son chemin d'arrivée.
+
+Les refus sont retournés sous la forme (corps, statut) : un dictionnaire
+{"error": ...} et le statut HTTP correspondant, que les routes renvoient tels
+quels et que les scripts affichent.
+"""
+from importation import archive, classeur, empreinte, entetes, lecture, pipeline, plans, validation
+
+
+def lire_valider(televersement, plan, format_fichier, connus, mode, feuilles=None,
+                 processus=classeur.MAX_PROCESSUS):
+    """
+    Lit le fichier projeté en mémoire (colonnes du mapping), le convertit et le valide.
+    feuilles : None (première feuille ou fichier non Excel), ou feuilles du classeur à lire et regrouper.
+    Retourne (df, erreurs, bilan par feuille ou None).
+    """
+    if feuilles is None:
+        brut = pipeline.lire_fichier(televersement.flux, plan, format_fichier)
+        df = pipeline.preparer(brut, plan)
+        return df, validation.valider(brut, df, plan, connus, mode=mode), None
+
+    # Feuilles lues en parallèle (chaque processus projette le fichier), regroupées en un seul import
+    lues = classeur.lire_feuilles(televersement.chemin, feuilles, plan.type_fichier, processus)
+    erreurs = validation.valider_feuilles(lues, plan, connus, mode=mode)
+    df, bilan = classeur.regrouper(lues)
+    return df, erreurs, bilan
+
+
+def doublon(cur, id_type_projet, sha256):
+    """Corps de la réponse si ce fichier a déjà été importé pour la facilité, sinon None."""
+    existant = empreinte.import_existant(cur, id_type_projet, sha256)
+    if not existant:
+        return None
+    return {
+        "message": "Fichier déjà importé pour cette facilité, aucune donnée modifiée. "
+                   "Renvoyer avec force=1 pour le réimporter.",
+        "doublon": True,
+        "id_historique": existant[0],
+        "date_import": existant[1].strftime('%Y-%m-%d %H:%M:%S') if existant[1] else None
+    }
+
+
+def preparer(conn, televersement, id_type_projet, options, processus=classeur.MAX_PROCESSUS):
+    """
+    En-têtes, empreinte, lecture, conversions et validation d'un fichier projeté en mémoire.
+    id_type_projet peut être None : la facilité est alors déduite du type de fichier détecté.
+    Retourne ({df, id_type_projet, type_fichier, empreinte, feuilles}, None) ou (None, (corps, statut)) ;
+    feuilles est le bilan par feuille des classeurs lus avec feuilles=toutes (None sinon).
+    """
+    # Format d'après l'extension : xlsx, csv (ou csv.gz), ods, parquet
+    format_fichier = lecture.format_fichier(televersement.nom)
+    if format_fichier is None:
+        return None, ({"error": "Format non pris en charge : .xlsx, .csv, .csv.gz, .ods ou .parquet attendu."}, 400)
+    if options["feuilles"] == "toutes" and format_fichier != "xlsx":
+        return None, ({"error": "feuilles=toutes ne s'applique qu'aux classeurs .xlsx."}, 400)
+
+    # Type de fichier détecté sur la seule ligne d'en-têtes, avant la lecture complète
+    feuilles = None
+    if options["feuilles"] == "toutes":
+        # Une détection par feuille ; les feuilles non reconnues (synthèse, notes...) sont ignorées
+        detectees = classeur.detecter_feuilles(televersement.flux)
+        if detectees is None:
+            return None, ({"error": "Fichier illisible : un classeur Excel (.xlsx) est attendu."}, 400)
+        types = {t for t in detectees.values() if t}
+        if len(types) != 1:
+            return None, ({
+                "error": "Les feuilles reconnues sont de types différents." if types
+                         else "Aucune feuille ne correspond à un type de fichier connu.",
+                "feuilles": detectees
+            }, 400)
+        type_fichier = types.pop()
+        feuilles = [nom for nom, t in detectees.items() if t]
+        ignorees = [nom for nom, t in detectees.items() if not t]
+    else:
+        noms = entetes.lire_entetes(televersement.flux, format_fichier)
+        if noms is None:
+            return None, ({"error": f"Fichier illisible au format {format_fichier}."}, 400)
+        type_fichier = entetes.detecter(noms)
+        if type_fichier is None:
+            return None, ({
+                "error": "En-têtes non reconnus : le fichier ne correspond à aucun type de fichier connu.",
+                "scores": entetes.scores(noms)
+            }, 400)
+
+    with conn.cursor() as cur:
+        if id_type_projet:
+            cur.execute("SELECT type_fichier FROM type_projet WHERE id_type_projet = %s", (id_type_projet,))
+            result = cur.fetchone()
+            if not result:
+                return None, ({"error": "Type de projet introuvable."}, 400)
+            if result[0] != type_fichier:
+                return None, ({
+                    "error": f"Le fichier est un {type_fichier}, la facilité sélectionnée attend un {result[0]}."
+                }, 400)
+        else:
+            # Pas de facilité choisie : la seule facilité de ce type de fichier
+            cur.execute("SELECT id_type_projet FROM type_projet WHERE type_fichier = %s", (type_fichier,))
+            facilites = [row[0] for row in cur.fetchall()]
+            if len(facilites) != 1:
+                return None, ({
+                    "error": f"{len(facilites)} facilité(s) de type {type_fichier} : préciser id_type_projet."
+                }, 400)
+            id_type_projet = facilites[0]
+
+        # Fichier déjà importé pour cette facilité ? (sauf réimport forcé)
+        sha256 = empreinte.sha256_flux(televersement.flux)
+        if not options["force"]:
+            deja = doublon(cur, id_type_projet, sha256)
+            if deja:
+                conn.rollback()
+                return None, (deja, 200)
+    conn.rollback()
+
+    # Plan de colonnes du type de fichier (compilé une fois par processus)
+    plan = plans.plan(type_fichier)
+    if plan is None:
+        return None, ({"error": f"Type de fichier inconnu : {type_fichier}"}, 400)
+
+    with conn.cursor() as cur:
+        connus = validation.noms_connus(cur)
+    conn.rollback()
+
+    # Lecture (colonnes du mapping seulement), renommage des colonnes et conversions,
+    # puis validation complète avant toute écriture : toutes les anomalies en une réponse
+    df, erreurs, bilan_feuilles = lire_valider(televersement, plan, format_fichier, connus,
+                                               options["mode"], feuilles, processus)
+    if bilan_feuilles is not None:
+        bilan_feuilles += [{"feuille": nom, "ignoree": True} for nom in ignorees]
+
+    if erreurs:
+        return None, ({
+            "error": f"Le fichier contient {len(erreurs)} anomalie(s), aucune donnée importée.",
+            "erreurs": erreurs
+        }, 422)
+
+    return {"df": df, "id_type_projet": id_type_projet, "type_fichier": type_fichier, "empreinte": sha256,
+            "feuilles": bilan_feuilles}, None
+
+
+def importer(conn, televersement, id_type_projet, options, created_by, dossier_archive,
+             processus=classeur.MAX_PROCESSUS):
+    """
+    Import complet d'un fichier projeté en mémoire : préparation, archivage du fichier
+    d'origine et chargement en une transaction. Retourne (corps, statut).
+    """
+    fichier, refus = preparer(conn, televersement, id_type_projet, options, processus)
+    if refus:
+        return refus
+
+    # Fichier d'origine archivé sous son empreinte : l'import pourra être rejoué sans renvoi
+    chemin_archive = archive.archiver(dossier_archive, televersement.flux, fichier["empreinte"], televersement.nom)
+
+    # Chargement (staging, faits, donnees_importees, historique) en une transaction
+    stats = pipeline.charger(conn, fichier["df"], fichier["id_type_projet"], created_by, televersement.nom,
+                             moteur=options["moteur"], connexions=options["connexions"],
+                             mode=options["mode"], empreinte=fichier["empreinte"],
+                             archive=chemin_archive, options=options)
+
+    if fichier["feuilles"]:
+        # Classeur multi-feuilles : bilan de chaque feuille
+        stats["feuilles"] = fichier["feuilles"]
+    return {"message": "Fichier importé et inséré avec succès.", **stats}, 200
+
+
+def charger_lot(conn, fichiers, options, created_by):
+    """
+    Charge en un seul import des fichiers préparés et archivés de la même facilité :
+    un chargement, une transaction et une ligne d'historique pour tout le lot ; chaque
+    fichier d'origine est enregistré dans historique_importation_fichiers.
+    fichiers : [{nom, archive, **préparation}, ...] (voir preparer). Retourne (corps, statut).
+    """
+    if len(fichiers) == 1:
+        # Lot d'un seul fichier : import ordinaire, rejouable depuis l'archive
+        fichier = fichiers[0]
+        stats = pipeline.charger(conn, fichier["df"], fichier["id_type_projet"], created_by, fichier["nom"],
+                                 moteur=options["moteur"], connexions=options["connexions"],
+                                 mode=options["mode"], empreinte=fichier["empreinte"],
+                                 archive=fichier["archive"], options=options)
+        return {"message": "Fichier importé et inséré avec succès.", **stats}, 200
+
+    # Catégories réencodées après la concaténation, comme pour les feuilles d'un classeur
+    df, _ = classeur.regrouper([(f["nom"], None, f["df"]) for f in fichiers])
+    noms = [f["nom"] for f in fichiers]
+    nom_lot = f"Lot de {len(noms)} fichiers : {', '.join(noms[:5])}{', ...' if len(noms) > 5 else ''}"
+    stats = pipeline.charger(conn, df, fichiers[0]["id_type_projet"], created_by, nom_lot,
+                             moteur=options["moteur"], connexions=options["connexions"],
+                             mode=options["mode"], options=options,
+                             fichiers=[{"nom_fichier": f["nom"], "empreinte": f["empreinte"],
+                                        "archive": f["archive"], "lignes": len(f["df"])} for f in fichiers])
+    return {"message": f"Lot de {len(noms)} fichiers importé et inséré avec succès.", **stats}, 200
@@ -0,0 +1,176 @@
+"""
+Validation d'un fichier préparé, avant toute écriture en base.
+
+Les contrôles sont vectorisés sur le DataFrame complet et le rapport liste
+toutes les anomalies d'un coup (ligne Excel, colonne, motif, valeur) : le
+fichier se corrige en un seul aller-retour, au lieu d'une erreur par envoi.
+  - colonnes obligatoires absentes ou vides ;
+  - dates, nombres et entiers illisibles ;
+  - montants et effectifs négatifs ;
+  - communes et PDA inconnus du référentiel ;
+  - N° en double.
+"""
+import numpy as np
+import pandas as pd
+from psycopg2 import sql
+
+# Colonnes obligatoires selon le mode d'import (le N° est la clé du mode delta)
+COLONNES_REQUISES = {
+    "complet": ["commune"],
+    "delta": ["commune", "numero"],
+}
+
+# Colonnes contrôlées contre un référentiel : colonne -> (table, colonne du nom, motif)
+REFERENTIELS = {
+    "commune": ("commune", "nom_commune", "commune inconnue"),
+    "pda": ("pda", "nom_pda", "PDA inconnu"),
+}
+
+MOTIFS_ILLISIBLE = {
+    "date": "date illisible",
+    "nombre": "nombre illisible",
+    "entier": "nombre entier attendu",
+}
+
+
+def _cle(serie):
+    """Même normalisation que la résolution SQL : LOWER(TRIM(nom))."""
+    return serie.astype("string").str.strip().str.lower()
+
+
+def _par_valeur(serie, test):
+    """
+    Masque booléen test(valeurs). Sur une colonne catégorielle, le test ne porte que sur
+    les valeurs distinctes et son résultat est diffusé par les codes (valeur manquante : False).
+    """
+    if not isinstance(serie.dtype, pd.CategoricalDtype):
+        return test(serie)
+    masque = np.asarray(test(pd.Series(serie.cat.categories)), dtype=bool)
+    # Code -1 (valeur manquante) -> dernier élément ajouté, False
+    return pd.Series(np.append(masque, False)[serie.cat.codes.to_numpy()], index=serie.index)
+
+
+def noms_connus(cur):
+    """Noms normalisés des référentiels : {colonne: set(noms)}."""
+    connus = {}
+    for colonne, (table, nom, _) in REFERENTIELS.items():
+        cur.execute(sql.SQL("SELECT DISTINCT LOWER(TRIM({nom})) FROM {table} WHERE {nom} IS NOT NULL").format(
+            nom=sql.Identifier(nom), table=sql.Identifier(table)
+        ))
+        connus[colonne] = {row[0] for row in cur.fetchall()}
+    return connus
+
+
+def _vides(serie):
+    """Cellules texte vides ou faites d'espaces."""
+    if pd.api.types.infer_dtype(serie, skipna=True) in ("string", "mixed", "mixed-integer"):
+        return serie.str.strip().eq("").fillna(False).astype(bool)
+    return pd.Series(False, index=serie.index)
+
+
+def _presentes(serie):
+    """Cellules renseignées (ni vides, ni faites d'espaces)."""
+    return serie.notna() & ~_par_valeur(serie, _vides)
+
+
+def _connues(serie, connus):
+    """Cellules dont le nom normalisé figure dans le référentiel."""
+    return _par_valeur(serie, lambda valeurs: _cle(valeurs).isin(connus).fillna(False).astype(bool))
+
+
+def _anomalies(masque, colonne, motif, valeurs=None):
+    index = masque.index[masque.to_numpy()]
+    if valeurs is None:
+        valeurs = pd.Series(None, index=index, dtype=object)
+    else:
+        valeurs = valeurs.loc[index].astype("string")
+    return pd.DataFrame({
+        "ligne": index + 2,  # ligne 1 = en-têtes
+        "colonne": colonne,
+        "motif": motif,
+        "valeur": valeurs.astype(object).where(valeurs.notna(), None).to_numpy(),
+    })
+
+
+def valider(brut, df, plan, connus, mode="complet"):
+    """
+    Contrôle le fichier `brut` (tel que lu) et sa version préparée `df`.
+    Retourne la liste des anomalies, triée par ligne : [{ligne, colonne, motif, valeur}].
+    """
+    brut = brut.rename(columns=plan.renommage)
+    entetes = {cible: entete for entete, cible in plan.renommage.items()}
+    rapports = []
+
+    def nom_affiche(col):
+        # L'utilisateur corrige son fichier : on lui donne l'en-tête Excel
+        return entetes.get(col, col)
+
+    # Colonnes obligatoires
+    for col in COLONNES_REQUISES[mode]:
+        if col not in df.columns:
+            rapports.append(pd.DataFrame([{
+                "ligne": None, "colonne": nom_affiche(col), "motif": "colonne obligatoire absente", "valeur": None,
+            }]))
+        else:
+            rapports.append(_anomalies(~_presentes(brut[col]), nom_affiche(col), "valeur obligatoire manquante"))
+
+    for col, genre in plan.colonnes:
+        if col not in df.columns or not isinstance(df[col], pd.Series):
+            continue
+
+        # Valeurs renseignées que la conversion n'a pas su lire
+        if genre in MOTIFS_ILLISIBLE:
+            illisibles = _presentes(brut[col]) & df[col].isna().to_numpy()
+            rapports.append(_anomalies(illisibles, nom_affiche(col), MOTIFS_ILLISIBLE[genre], brut[col]))
+
+        # Montants, taux, effectifs et durées ne sont jamais négatifs
+        if genre in ("nombre", "entier"):
+            negatives = (df[col] < 0).fillna(False).astype(bool)
+            rapports.append(_anomalies(negatives, nom_affiche(col), "valeur négative", brut[col]))
+
+    # Référentiels
+    for col, connus_col in connus.items():
+        if col in df.columns:
+            inconnues = _presentes(brut[col]) & ~_connues(brut[col], connus_col)
+            rapports.append(_anomalies(inconnues, nom_affiche(col), REFERENTIELS[col][2], brut[col]))
+
+    # N° en double (toutes les occurrences sont signalées)
+    if "numero" in df.columns:
+        numeros = df["numero"]
+        doublons = numeros.notna() & numeros.duplicated(keep=False)
+        rapports.append(_anomalies(doublons, nom_affiche("numero"), "N° en double", numeros))
+
+    rapports = [r for r in rapports if not r.empty]
+    if not rapports:
+        return []
+    rapport = pd.concat(rapports, ignore_index=True)
+    rapport = rapport.sort_values("ligne", kind="stable", na_position="first")
+    rapport["ligne"] = rapport["ligne"].astype("Int64")
+    rapport = rapport.astype(object)
+    return rapport.where(rapport.notna(), None).to_dict("records")
+
+
+def valider_feuilles(feuilles, plan, connus, mode="complet"):
+    """
+    Valide chaque feuille d'un classeur [(feuille, brut, df), ...] puis les N° présents
+    dans plusieurs feuilles. Chaque anomalie porte le nom de sa feuille.
+    """
+    erreurs = []
+    for feuille, brut, df in feuilles:
+        erreurs += [{"feuille": feuille, **erreur} for erreur in valider(brut, df, plan, connus, mode)]
+
+    # N° en double d'une feuille à l'autre (les doublons internes sont déjà signalés)
+    numeros = [
+        pd.DataFrame({"feuille": feuille, "ligne": df.index + 2, "valeur": df["numero"]})
+        for feuille, _, df in feuilles if "numero" in df.columns
+    ]
+    if numeros:
+        numeros = pd.concat(numeros, ignore_index=True).dropna(subset=["valeur"])
+        partages = numeros.groupby("valeur")["feuille"].transform("nunique") > 1
+        entete = {cible: entete for entete, cible in plan.renommage.items()}.get("numero", "numero")
+        erreurs += [
+            {"feuille": row.feuille, "ligne": int(row.ligne), "colonne": entete,
+             "motif": "N° présent dans plusieurs feuilles", "valeur": row.valeur}
+            for row in numeros[partages].itertuples(index=False)
+        ]
+    return erreurs
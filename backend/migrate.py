@@ -0,0 +1,54 @@
+"""
+Applique les migrations SQL de sql/migrations/ dans l'ordre des noms de fichier.
+
+Les migrations déjà appliquées sont enregistrées dans la table schema_migrations.
+
+Usage (depuis backend/, avec config.ini) :
+    python migrate.py
+"""
+import os
+import sys
+
+from db import get_connection
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sql', 'migrations')
+
+
+def appliquer_migrations(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                nom text PRIMARY KEY,
+                applique_le timestamp DEFAULT now()
+            )
+        """)
+        cur.execute("SELECT nom FROM schema_migrations")
+        deja = {row[0] for row in cur.fetchall()}
+    conn.commit()
+
+    appliquees = []
+    for nom in sorted(os.listdir(MIGRATIONS_DIR)):
+        if not nom.endswith('.sql') or nom in deja:
+            continue
+        with open(os.path.join(MIGRATIONS_DIR, nom), encoding='utf-8') as f:
+            contenu = f.read()
+        # Chaque migration est appliquée dans sa propre transaction
+        with conn.cursor() as cur:
+            cur.execute(contenu)
+            cur.execute("INSERT INTO schema_migrations (nom) VALUES (%s)", (nom,))
+        conn.commit()
+        appliquees.append(nom)
+    return appliquees
+
+
+if __name__ == "__main__":
+    conn = get_connection()
+    if conn is None:
+        sys.exit("Connexion à la base impossible.")
+    try:
+        appliquees = appliquer_migrations(conn)
+    finally:
+        conn.close()
+    for nom in appliquees:
+        print(f"✅ {nom}")
+    print(f"{len(appliquees)} migration(s) appliquée(s).")
@@ -0,0 +1,131 @@
+"""
+Profilage à la demande d'une seule requête, réservé aux administrateurs.
+
+Une requête portant l'en-tête `X-Profile: 1` (ou le paramètre `?_profile=1`)
+est exécutée sous cProfile. Le profil est enregistré au format pstats dans
+uploads/profiles/ et son nom est renvoyé dans l'en-tête `X-Profile-File`.
+Il se télécharge ensuite via GET /profiles/<nom> et se lit avec
+`python -m pstats` ou snakeviz.
+
+Les requêtes sans ce drapeau ne paient qu'une lecture d'en-tête. Le drapeau
+envoyé par un utilisateur qui n'est pas administrateur est ignoré : la requête
+s'exécute normalement, sans profilage. Une requête qui lève une exception
+n'a pas d'en-tête X-Profile-File, mais son profil est tout de même enregistré
+(GET /profiles) et le profileur arrêté.
+
+Les profils sont purgés à chaque nouvel enregistrement : plus vieux que
+PROFILING_TTL ou au-delà des PROFILING_MAX plus récents. DELETE /profiles/<nom>
+en supprime un.
+"""
+import cProfile
+import os
+import time
+import uuid
+from datetime import datetime
+
+from flask import current_app, g, request, send_from_directory, jsonify
+from flask_login import current_user, login_required
+
+from routes.authnew import admin_required
+
+PROFILES_FOLDER = os.path.join(os.getcwd(), 'uploads', 'profiles')
+
+
+def profilage_demande():
+    return request.headers.get('X-Profile') == '1' or request.args.get('_profile') == '1'
+
+
+def _est_admin():
+    # Même contrôle que admin_required, sans réponse d'erreur
+    return current_user.is_authenticated and getattr(current_user, 'admin', False)
+
+
+def purger(ttl, maximum):
+    """Supprime les profils plus vieux que ttl secondes et, au-delà des `maximum` plus récents, les autres."""
+    profils = []
+    for nom in os.listdir(PROFILES_FOLDER):
+        chemin = os.path.join(PROFILES_FOLDER, nom)
+        try:
+            if nom.endswith('.prof'):
+                profils.append((os.path.getmtime(chemin), chemin))
+        except FileNotFoundError:
+            pass
+    profils.sort(reverse=True)
+    limite = time.time() - ttl
+    for rang, (modifie, chemin) in enumerate(profils):
+        if rang >= maximum or modifie < limite:
+            try:
+                os.remove(chemin)
+            except FileNotFoundError:
+                # Purgé en même temps par un autre worker
+                pass
+
+
+def _enregistrer(profiler):
+    """Arrête le profileur, enregistre le profil et purge les anciens. Retourne le nom du fichier."""
+    profiler.disable()
+    endpoint = (request.endpoint or 'inconnu').replace('.', '_')
+    nom = f"{datetime.now():%Y%m%d-%H%M%S}-{endpoint}-{uuid.uuid4().hex[:8]}.prof"
+    profiler.dump_stats(os.path.join(PROFILES_FOLDER, nom))
+    purger(current_app.config['PROFILING_TTL'], current_app.config['PROFILING_MAX'])
+    return nom
+
+
+def init_profiling(app):
+    if not app.config.get('PROFILING_ENABLED', True):
+        return
+
+    app.config.setdefault('PROFILING_TTL', 7 * 24 * 3600)
+    app.config.setdefault('PROFILING_MAX', 200)
+    os.makedirs(PROFILES_FOLDER, exist_ok=True)
+    purger(app.config['PROFILING_TTL'], app.config['PROFILING_MAX'])
+
+    @app.before_request
+    def demarrer_profilage():
+        # Drapeau d'un non-administrateur : ignoré, la requête suit son cours
+        if not profilage_demande() or not _est_admin():
+            return None
+
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+        return None
+
+    @app.after_request
+    def arreter_profilage(response):
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            response.headers['X-Profile-File'] = _enregistrer(profiler)
+        return response
+
+    @app.teardown_request
+    def terminer_profilage(exc):
+        # after_request n'est pas appelé si la requête lève une exception non gérée :
+        # le profileur resterait actif sur ce thread pour toutes les requêtes suivantes
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            _enregistrer(profiler)
+
+    @app.route('/profiles', methods=['GET'])
+    @login_required
+    @admin_required
+    def lister_profils():
+        fichiers = sorted(os.listdir(PROFILES_FOLDER), reverse=True)
+        return jsonify([f for f in fichiers if f.endswith('.prof')]), 200
+
+    @app.route('/profiles/<path:filename>', methods=['GET'])
+    @login_required
+    @admin_required
+    def telecharger_profil(filename):
+        return send_from_directory(PROFILES_FOLDER, filename, as_attachment=True)
+
+    @app.route('/profiles/<nom>', methods=['DELETE'])
+    @login_required
+    @admin_required
+    def supprimer_profil(nom):
+        if not nom.endswith('.prof') or nom != os.path.basename(nom):
+            return jsonify({"error": "Nom de profil invalide."}), 400
+        try:
+            os.remove(os.path.join(PROFILES_FOLDER, nom))
+        except FileNotFoundError:
+            return jsonify({"error": "Profil introuvable."}), 404
+        return jsonify({"message": "Profil supprimé."}), 200
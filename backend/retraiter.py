@@ -0,0 +1,242 @@
+"""
+Rejoue des imports depuis l'archive des fichiers d'origine (après une correction de mapping...).
+
+Chaque import sélectionné est relu depuis l'archive avec le mapping et les
+conversions actuels, validé, puis rechargé : dans une même transaction,
+l'import d'origine est annulé et le nouvel import le remplace
+(historique_importation.remplace_import). Aucun fichier n'est redemandé aux
+utilisateurs, et le chemin HTTP n'est pas sollicité.
+
+Rejouer un import delta compare son fichier à l'état actuel de la facilité :
+tous les imports en vigueur de la facilité qui le suivent doivent être rejoués
+avec lui (dans l'ordre), sinon leurs lignes seraient marquées supprimées. Une
+sélection qui les omet est refusée (hors --simulation).
+
+Les imports sont répartis sur un pool de processus. Les imports complets sont
+indépendants et rejoués en parallèle ; les imports d'une facilité qui compte
+des imports delta sont rejoués dans l'ordre par un seul processus (chaque delta
+dépend de l'état laissé par les précédents).
+
+Usage (depuis backend/, avec config.ini) :
+    python retraiter.py --ids 12,15,18
+    python retraiter.py --depuis 2025-01-01 --jusqu-au 2025-12-31 --id-type-projet 1 --processus 4
+    python retraiter.py --depuis 2025-01-01 --simulation     # relecture et validation seulement
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import db
+
+# Même dossier que l'application (IMPORT_ARCHIVE_FOLDER)
+ARCHIVE_FOLDER = os.path.join(os.getcwd(), 'uploads', 'archive')
+
+# Options des imports antérieurs à l'enregistrement des options dans l'historique
+OPTIONS_DEFAUT = {"mode": "complet", "feuilles": "premiere"}
+
+
+def selectionner(cur, ids=None, depuis=None, jusqu_au=None, id_type_projet=None):
+    """Imports rejouables (réussis, non annulés, archivés) : [(id, id_type_projet, mode), ...] par id croissant."""
+    conditions = ["statut", "annule_le IS NULL", "archive IS NOT NULL"]
+    params = []
+    if ids:
+        conditions.append("id = ANY(%s)")
+        params.append(ids)
+    if depuis:
+        conditions.append("date_import >= %s")
+        params.append(depuis)
+    if jusqu_au:
+        conditions.append("date_import < %s::date + 1")
+        params.append(jusqu_au)
+    if id_type_projet:
+        conditions.append("id_type_projet = %s")
+        params.append(id_type_projet)
+    cur.execute(f"""
+        SELECT id, id_type_projet, COALESCE(options->>'mode', 'complet')
+        FROM historique_importation
+        WHERE {' AND '.join(conditions)}
+        ORDER BY id
+    """, params)
+    return cur.fetchall()
+
+
+def suivants_manquants(cur, imports):
+    """
+    Imports en vigueur postérieurs au premier import delta sélectionné de leur facilité,
+    et absents de la sélection : [(id, id_type_projet, archivé), ...] par id croissant.
+    """
+    premiers = {}
+    for id_import, id_type_projet, mode in imports:
+        if mode == "delta":
+            premiers[id_type_projet] = min(premiers.get(id_type_projet, id_import), id_import)
+    if not premiers:
+        return []
+    cur.execute("""
+        SELECT h.id, h.id_type_projet, h.archive IS NOT NULL
+        FROM historique_importation h
+        JOIN unnest(%s::integer[], %s::integer[]) AS d(id_type_projet, premier)
+          ON d.id_type_projet = h.id_type_projet
+        WHERE h.statut AND h.annule_le IS NULL AND h.id > d.premier AND h.id <> ALL(%s)
+        ORDER BY h.id
+    """, (list(premiers), list(premiers.values()), [id_import for id_import, _, _ in imports]))
+    return cur.fetchall()
+
+
+def taches(imports):
+    """
+    Tâches du pool : [[id, ...], ...]. Un import complet par tâche ; tous les imports
+    d'une facilité qui compte un import delta forment une seule tâche, dans l'ordre.
+    """
+    avec_delta = {id_type_projet for _, id_type_projet, mode in imports if mode == "delta"}
+    sequences = {}
+    independants = []
+    for id_import, id_type_projet, _ in imports:
+        if id_type_projet in avec_delta:
+            sequences.setdefault(id_type_projet, []).append(id_import)
+        else:
+            independants.append([id_import])
+    # Les séquences d'abord : ce sont les tâches les plus longues
+    return list(sequences.values()) + independants
+
+
+def rejouer_import(conn, id_import, dossier, simulation=False):
+    """Relit, valide et recharge un import depuis l'archive. Retourne son bilan."""
+    from importation import archive, classeur, lecture, pipeline, plans, traitement, validation
+    from televersements import projeter
+
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT h.nom_fichier, h.id_type_projet, h.utilisateur, h.empreinte_sha256, h.archive, h.options,
+                   t.type_fichier
+            FROM historique_importation h
+            JOIN type_projet t ON t.id_type_projet = h.id_type_projet
+            WHERE h.id = %s AND h.annule_le IS NULL AND h.archive IS NOT NULL
+        """, (id_import,))
+        ligne = cur.fetchone()
+        connus = validation.noms_connus(cur)
+    conn.rollback()
+    if ligne is None:
+        return {"id_import": id_import, "erreur": "import introuvable, annulé ou non archivé"}
+
+    nom_fichier, id_type_projet, utilisateur, empreinte, relatif, options, type_fichier = ligne
+    options = {**OPTIONS_DEFAUT, **(options or {})}
+    plan = plans.plan(type_fichier)
+
+    with archive.extraire(dossier, relatif) as chemin, projeter(chemin, nom_fichier) as televersement:
+        feuilles = None
+        if options["feuilles"] == "toutes":
+            detectees = classeur.detecter_feuilles(televersement.flux)
+            feuilles = [nom for nom, t in detectees.items() if t == type_fichier]
+        # Un seul processus de lecture : le parallélisme est déjà entre les imports
+        df, erreurs, _ = traitement.lire_valider(televersement, plan, lecture.format_fichier(chemin), connus,
+                                                 options["mode"], feuilles, processus=1)
+
+    if erreurs:
+        return {"id_import": id_import, "erreur": f"{len(erreurs)} anomalie(s) avec le mapping actuel",
+                "anomalies": erreurs[:5]}
+    if simulation:
+        return {"id_import": id_import, "lignes": len(df)}
+
+    stats = pipeline.charger(conn, df, id_type_projet, utilisateur, nom_fichier, mode=options["mode"],
+                             empreinte=empreinte, archive=relatif, options=options, remplace=id_import)
+    return {"id_import": id_import, "nouvel_import": stats["id_import"], "lignes": stats["lignes"]}
+
+
+def _init_processus():
+    db.init_pool(1, 1)
+
+
+def rejouer(ids, dossier, simulation=False):
+    """Exécutée dans un processus du pool : rejoue les imports `ids` dans l'ordre. Retourne leurs bilans."""
+    bilans = []
+    for id_import in ids:
+        if bilans and "erreur" in bilans[-1]:
+            # Séquence delta : les suivants dépendent de l'import en échec
+            bilans.append({"id_import": id_import, "erreur": f"non rejoué : échec de l'import {bilans[-1]['id_import']}"})
+            continue
+        debut = time.perf_counter()
+        conn = db.get_connection()
+        try:
+            bilan = rejouer_import(conn, id_import, dossier, simulation)
+        except Exception as e:
+            conn.rollback()
+            bilan = {"id_import": id_import, "erreur": str(e)}
+        finally:
+            conn.close()
+        bilan["duree_s"] = round(time.perf_counter() - debut, 3)
+        bilans.append(bilan)
+    return bilans
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rejeu des imports depuis l'archive des fichiers d'origine.")
+    parser.add_argument('--ids', help="Imports à rejouer, séparés par des virgules")
+    parser.add_argument('--depuis', help="Imports de cette date (AAAA-MM-JJ) ou après")
+    parser.add_argument('--jusqu-au', help="Imports de cette date (AAAA-MM-JJ) ou avant")
+    parser.add_argument('--id-type-projet', type=int, help="Imports de cette facilité seulement")
+    parser.add_argument('--processus', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--archive', default=ARCHIVE_FOLDER, help="Dossier de l'archive")
+    parser.add_argument('--simulation', action='store_true', help="Relecture et validation, sans écriture")
+    args = parser.parse_args(argv)
+
+    if not (args.ids or args.depuis or args.jusqu_au or args.id_type_projet):
+        parser.error("préciser au moins --ids, --depuis, --jusqu-au ou --id-type-projet")
+    ids = [int(i) for i in args.ids.split(',')] if args.ids else None
+
+    conn = db.get_connection()
+    if conn is None:
+        sys.exit("Connexion à la base impossible.")
+    try:
+        with conn.cursor() as cur:
+            imports = selectionner(cur, ids, args.depuis, args.jusqu_au, args.id_type_projet)
+            manquants = suivants_manquants(cur, imports)
+        conn.rollback()
+    finally:
+        conn.close()
+    if not imports:
+        print("Aucun import archivé ne correspond.")
+        return
+    if manquants and not args.simulation:
+        # Un delta rejoué seul marquerait supprimées les lignes des imports qui le suivent
+        print("Imports delta sélectionnés sans les imports suivants de leur facilité, à rejouer avec eux :")
+        for id_import, id_type_projet, archive in manquants:
+            print(f"  {id_import} (facilité {id_type_projet}){'' if archive else ' : non archivé, non rejouable'}")
+        sys.exit(1)
+
+    liste = taches(imports)
+    processus = max(1, min(args.processus, len(liste)))
+    print(f"{len(imports)} import(s) à rejouer, {len(liste)} tâche(s) sur {processus} processus"
+          f"{' (simulation)' if args.simulation else ''}")
+
+    debut = time.perf_counter()
+    bilans = []
+    if processus == 1:
+        _init_processus()
+        for ids_tache in liste:
+            bilans += rejouer(ids_tache, args.archive, args.simulation)
+    else:
+        # spawn, comme la lecture des classeurs : aucun état hérité (pool de connexions, verrous)
+        contexte = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=processus, mp_context=contexte, initializer=_init_processus) as pool:
+            futures = [pool.submit(rejouer, ids_tache, args.archive, args.simulation) for ids_tache in liste]
+            for future in as_completed(futures):
+                bilans += future.result()
+
+    echecs = 0
+    print(f"{'import':>8} {'nouvel':>8} {'lignes':>8} {'durée (s)':>10}  erreur")
+    for bilan in sorted(bilans, key=lambda b: b["id_import"]):
+        echecs += "erreur" in bilan
+        print(f"{bilan['id_import']:>8} {bilan.get('nouvel_import') or '-':>8} {bilan.get('lignes', '-'):>8} "
+              f"{bilan.get('duree_s', '-'):>10}  {bilan.get('erreur', '')}")
+        for anomalie in bilan.get("anomalies", []):
+            print(f"{'':>38}  {anomalie}")
+    print(f"{len(bilans) - echecs} import(s) rejoué(s), {echecs} échec(s) en {time.perf_counter() - debut:.1f} s")
+    if echecs:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,6 @@ from flask import Blueprint, request, jsonify, session, current_app, send_from_d
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user, UserMixin
 from db import get_connection
 from utils.password import hash_password, check_password, verify_password
-import pandas as pd
-import numpy as np
 from config import get_db_config
 import jwt
 from psycopg2.errors import UniqueViolation
@@ -18,6 +16,8 @@ from flask_cors import CORS
 import os
 from werkzeug.utils import secure_filename
 import traceback
+import json
+import televersements
 
 
 
@@ -641,6 +641,7 @@ def get_projets_financement():
                 LEFT JOIN promoteur p ON pf.id_promoteur = p.id_promoteur
                 LEFT JOIN type_projet tp ON pf.id_type_projet = tp.id_type_projet
                 LEFT JOIN pda ON c.id_pda = pda.id_pda
+                WHERE pf.supprime_le IS NULL
                 ORDER BY pf.created_at DESC
             """)
             rows = cur.fetchall()
@@ -710,6 +711,7 @@ def get_projets_par_facilite(id_type_projet):
                 LEFT JOIN promoteur p ON pf.id_promoteur = p.id_promoteur
                 LEFT JOIN type_projet tp ON pf.id_type_projet = tp.id_type_projet
                 WHERE pf.id_type_projet = %s
+                  AND pf.supprime_le IS NULL
                 ORDER BY pf.created_at DESC
             """, (id_type_projet,))
             rows = cur.fetchall()
@@ -751,7 +753,8 @@ def import_excel_history():
     try:
         with conn.cursor() as cur:
             cur.execute("""
-                SELECT id, nom_fichier, id_type_projet, utilisateur, date_import, statut
+                SELECT id, nom_fichier, id_type_projet, utilisateur, date_import, statut, annule_le,
+                       archive, remplace_import
                 FROM historique_importation
                 ORDER BY date_import DESC
                 LIMIT 100
@@ -812,6 +815,44 @@ def delete_history(id):
             conn.close()
 
 
+# Route pour annuler un import (suppression de ses faits par lot, restauration des lignes qu'il avait supprimées)
+
+@auth_bp.route('/history/<int:id>/rollback', methods=['DELETE'])
+@login_required
+@admin_required
+def rollback_import(id):
+    from importation import lots
+
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT annule_le FROM historique_importation WHERE id = %s FOR UPDATE", (id,))
+            row = cur.fetchone()
+            if row is None:
+                return jsonify({"error": "Historique non trouvé"}), 404
+            if row[0] is not None:
+                return jsonify({"error": f"Import {id} déjà annulé"}), 409
+
+            supprimes, restaurees = lots.annuler_import(cur, id)
+        conn.commit()
+
+        return jsonify({
+            "success": True,
+            "message": f"Import {id} annulé",
+            "lignes_supprimees": supprimes,
+            "lignes_restaurees": restaurees
+        }), 200
+
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        return jsonify({"error": str(e)}), 500
+
+    finally:
+        if conn:
+            conn.close()
+
+
 
 
 from flask import jsonify, request
@@ -868,9 +909,117 @@ def change_password():
 
 
 
+# Nombre de lignes renvoyées par l'aperçu d'un import
+APERCU_LIGNES = 100
+
+
+def _options_chargement(pipeline):
+    """Options de chargement du formulaire. Retourne (options, None) ou (None, réponse d'erreur)."""
+    # Moteur de chargement : ensembliste par défaut, ligne par ligne pour comparaison
+    moteur = request.form.get('moteur', 'sql')
+    if moteur not in pipeline.MOTEURS:
+        return None, (jsonify({"error": f"Moteur inconnu : {moteur}"}), 400)
+
+    # Nombre de connexions pour le chargement parallèle des faits (1 = pas de parallélisme)
+    connexions = request.form.get('connexions', 1, type=int)
+    if not 1 <= connexions <= pipeline.MAX_CONNEXIONS:
+        return None, (jsonify({"error": f"connexions doit être compris entre 1 et {pipeline.MAX_CONNEXIONS}"}), 400)
+
+    # Mode d'import : complet (ajout de toutes les lignes) ou delta (différences seulement)
+    mode = request.form.get('mode', 'complet')
+    if mode not in pipeline.MODES:
+        return None, (jsonify({"error": f"Mode inconnu : {mode}"}), 400)
+    if mode == 'delta' and (moteur != 'sql' or connexions > 1):
+        return None, (jsonify({"error": "Le mode delta utilise le moteur sql sur une seule connexion."}), 400)
+
+    # Classeurs à plusieurs feuilles : feuilles=toutes lit chaque feuille reconnue
+    from importation import classeur
+    feuilles = request.form.get('feuilles', 'premiere')
+    if feuilles not in classeur.FEUILLES:
+        return None, (jsonify({"error": f"feuilles doit valoir {' ou '.join(classeur.FEUILLES)}"}), 400)
+
+    force = request.form.get('force', '').lower() in ('1', 'true', 'oui')
+    return {"moteur": moteur, "connexions": connexions, "mode": mode, "feuilles": feuilles, "force": force}, None
+
+
+def _reponse_doublon(cur, id_type_projet, sha256):
+    """Réponse 200 si ce fichier a déjà été importé pour la facilité, sinon None."""
+    from importation import traitement
+
+    corps = traitement.doublon(cur, id_type_projet, sha256)
+    return (jsonify(corps), 200) if corps else None
+
+
+def _lire_fichier(conn, televersement, id_type_projet, options):
+    """
+    En-têtes, empreinte, lecture, conversions et validation du fichier envoyé (projeté en mémoire).
+    Retourne ({df, id_type_projet, type_fichier, empreinte, feuilles}, None) ou (None, réponse).
+    """
+    from importation import traitement
+
+    fichier, refus = traitement.preparer(conn, televersement, id_type_projet, options)
+    if refus:
+        corps, statut = refus
+        return None, (jsonify(corps), statut)
+    return fichier, None
+
+
+def _importer(conn, televersement, id_type_projet, options):
+    """Import complet d'un fichier projeté en mémoire (envoi direct ou fragmenté). Retourne la réponse."""
+    from importation import traitement
+
+    corps, statut = traitement.importer(conn, televersement, id_type_projet, options,
+                                        f"{current_user.prenom} {current_user.nom}",
+                                        current_app.config['IMPORT_ARCHIVE_FOLDER'])
+    if "id_import" in corps:
+        session.pop('id_type_projet', None)
+    return jsonify(corps), statut
+
+
 @auth_bp.route("/import_excel", methods=["POST"])
 @login_required
 def import_excel():
+    conn = None
+    try:
+        if 'file' not in request.files:
+            return jsonify({"error": "Aucun fichier fourni"}), 400
+
+        file = request.files['file']
+
+        # Le pipeline (pandas, numpy) n'est chargé qu'au premier import
+        from importation import pipeline
+
+        options, erreur = _options_chargement(pipeline)
+        if erreur:
+            return erreur
+
+        # 1️⃣ Facilité : formulaire, session, ou déduite des en-têtes du fichier
+        id_type_projet = request.form.get('id_type_projet', type=int) or session.get('id_type_projet')
+
+        conn = get_connection()
+        if conn is None:
+            return jsonify({"error": "Connexion à la base impossible."}), 500
+
+        # 2️⃣ Lecture, validation et chargement du fichier projeté en mémoire
+        with televersements.ouvrir(file) as televersement:
+            return _importer(conn, televersement, id_type_projet, options)
+
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        print("=== ERREUR IMPORT ===")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+    finally:
+        if conn:
+            conn.close()
+
+
+# Aperçu : le fichier est lu et validé une seule fois, puis conservé sous un jeton
+@auth_bp.route("/import_excel/preview", methods=["POST"])
+@login_required
+def import_excel_preview():
     conn = None
     try:
         if 'file' not in request.files:
@@ -879,316 +1028,257 @@ def import_excel():
         file = request.files['file']
         nom_fichier = file.filename if file else None
 
-        # 1️⃣ Lecture Excel
-        df = pd.read_excel(file)
-        df = df.replace({np.nan: None})
-
-        # 2️⃣ Mapping des fichiers de type tirage
-        mapping_fichier1 = {
-            "N°": "numero",
-            "SFD": "psf",
-            "Référence ligne de refinancement": "reference_ligne_refinancement",
-            "Date accord ligne de refinancement": "date_accord_ligne_refinancement",
-            "N°  de référence de la demande du Tirage": "numero_reference_tirage",
-            "Date de la demande du tirage": "date_tirage",
-            "Date de signature de l'échancier du FNDA (Comité de validation)": "date_comite_validation",
-            "COMMUNE": "commune",
-            "PDA": "pda",
-            "Dates de décaissement": "date_decaissement",
-            "Noms du groupe/groupement/MPME/individu/…": "denomination_entite",
-            "Numéro Personnel d'Identification (NPI) du Bénéficiaire": "npi",
-            "Noms des bénéficiaires": "nom_beneficiaire",
-            "Nom du Responsable": "nom_promoteur",
-            "Contact": "adresse_contact",
-            "NOMBRE BENEFICIAIRE HOMME": "nb_beneficiaires_hommes",
-            "NOMBRE BENEFICIAIRE FEMME": "nb_beneficiaires_femmes",
-            "NOMBRE TOTAL  BENEFICIAIRE": "total_beneficiaires",
-            "OBJET DU CREDIT": "intitule_projet",
-            "Filière concernée par l'objet du crédit": "filiere",
-            "Types de crédits (Production/Transformation/Commercialisation/Mécanisation Agricole …)": "maillon_type_credit",
-            "Garanties fournies par les promoteurs": "garanties_promoteurs",
-            "Rang/cycles": "rang_cycle",
-            "Montants sollicités/étudiés": "credit_solicite",    
-            "Montants accordés par le  SFD ou la Banque": "credit_accorde",
-            "Montant crédit validé par le FNDA": "montant_credit_valide_fnda",
-            "Garantie Accordée par le FNDA": "garantie_fnda_accordee",
-            "Durées (mois)": "duree",
-            "Différé (mois)": "differe_mois",
-            "Taux d'intérêt dégressif": "taux_interet_degressif",
-            "Périodicités de Remboursement": "periodicite_remboursement",
-            "Capital": "capital",
-            "Intérets à payer par les Promoteurs": "interets_promoteurs",
-            "Intérets à payer par le FNDA": "interets_fnda",
-            "Dates premières échéances": "date_premiere_echeance",
-            "Dates dernières échéances": "date_derniere_echeance",
-            "BONIFICATION": "bonification_fnda_accordee",
-            "Observations": "observations",
-        } 
-
-        # Mapping correspondant aux fichiers de Garantie et de Bonification
-
-        mapping_fichier2 = {
-                "DATE COMITE VALIDATION": "date_comite_validation",
-                "N°": "numero",
-                "PDA": "pda",
-                "PSF": "psf",
-                "Département": "departement",
-                "Commune": "commune",
-                "INTITULE DU PROJET": "intitule_projet",
-                "DENOMINATION DE L'ENTITE": "denomination_entite",
-                "NUMERO D'IDENTIFICATION PERSONNEL (NPI) DU PROMOTEUR": "npi",
-                "NOM DU PROMOTEUR": "nom_promoteur",
-                "SEXE PROMOTEUR": "sexe_promoteur",
-                "STATUT JURIDIQUE": "statut_juridique",    
-                "Localisation ou adresse/contact": "adresse_contact",
-                "FILIERE": "filiere",
-                "COUT TOTAL DU PROJET": "cout_total_projet",
-                "CREDIT SOLLICITE": "credit_solicite",
-                "CREDIT ACCORDE": "credit_accorde",
-                "REFINANCEMENT ACCORDE ": "refinancement_accorde",
-                "GARANTIE FNDA ACCORDEE": "garantie_fnda_accordee",
-                "BONIFICATION ACCORDEE": "bonification_fnda_accordee",
-                "CREDIT ACCORDE?": "credit_accorde_statut",
-                "SI NON, MOTIF":"motif_credit_non_accordee",
-                "TOTAL FINANCEMENT": "total_financement",
-                "STATUT DOSSIER": "statut_dossier",
-                "DATE DE CREATION DE L'ENTITE": "date_creation_entite",
-                "NOTIFIE?": "notification",
-                "SI OUI, REFERENCE": "reference_si_notifiee",
-                "Date de notification": "date_notification",
-                "CONTRAT SIGNE?": "contrat_signe",
-                "MONTANT DECAISSE ?": "montant_decaisse"
+        from importation import apercu, archive, pipeline
 
-            }
+        options, erreur = _options_chargement(pipeline)
+        if erreur:
+            return erreur
 
+        id_type_projet = request.form.get('id_type_projet', type=int) or session.get('id_type_projet')
 
-        # 3️⃣ Colonnes date
-        date_cols = [
-            "date_comite_validation",
-            "date_decaissement",
-            "date_premiere_echeance",
-            "date_derniere_echeance",
-            "date_creation_entite",
-            "date_notification",
-            "date_accord_ligne_refinancement",
-            "date_tirage"
-        ]
-
-        # 4️⃣ Type de fichier depuis la session
-        id_type_projet = session.get('id_type_projet')
-        if not id_type_projet:
-            return jsonify({"error": "Type de projet non sélectionné dans la session."}), 400
+        conn = get_connection()
+        if conn is None:
+            return jsonify({"error": "Connexion à la base impossible."}), 500
+
+        with televersements.ouvrir(file) as televersement:
+            fichier, reponse = _lire_fichier(conn, televersement, id_type_projet, options)
+            if reponse:
+                return reponse
+            # Le fichier n'est plus disponible à la validation de l'aperçu : archivé dès maintenant
+            chemin_archive = archive.archiver(current_app.config['IMPORT_ARCHIVE_FOLDER'], televersement.flux,
+                                              fichier["empreinte"], nom_fichier)
+
+        # Artefact Arrow IPC : la validation de l'import n'aura pas à relire l'Excel
+        dossier = current_app.config['IMPORT_ARTEFACTS_FOLDER']
+        ttl = current_app.config['IMPORT_ARTEFACTS_TTL']
+        apercu.purger(dossier, ttl)
+        df = fichier["df"]
+        token = apercu.enregistrer(dossier, df, {
+            "id_type_projet": fichier["id_type_projet"],
+            "type_fichier": fichier["type_fichier"],
+            "nom_fichier": nom_fichier,
+            "empreinte": fichier["empreinte"],
+            "archive": chemin_archive,
+            "id_utilisateur": current_user.id,
+            "options": options,
+            "feuilles": fichier["feuilles"],
+        })
+
+        lignes = json.loads(df.head(APERCU_LIGNES).to_json(orient="records", date_format="iso", force_ascii=False))
+        expire_le = datetime.datetime.now() + datetime.timedelta(seconds=ttl)
+        return jsonify({
+            "token": token,
+            "expire_le": expire_le.strftime('%Y-%m-%d %H:%M:%S'),
+            "nom_fichier": nom_fichier,
+            "nb_lignes": len(df),
+            "colonnes": list(df.columns),
+            "feuilles": fichier["feuilles"],
+            "lignes": lignes,
+        }), 200
+
+    except Exception as e:
+        print("=== ERREUR APERÇU IMPORT ===")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+    finally:
+        if conn:
+            conn.close()
+
+
+# Validation de l'aperçu : chargement depuis l'artefact, sans relire l'Excel
+@auth_bp.route("/import_excel/commit/<token>", methods=["POST"])
+@login_required
+def import_excel_commit(token):
+    conn = None
+    try:
+        from importation import apercu, pipeline
+
+        dossier = current_app.config['IMPORT_ARTEFACTS_FOLDER']
+        artefact = apercu.lire(dossier, token, current_app.config['IMPORT_ARTEFACTS_TTL'])
+        if artefact is None:
+            return jsonify({"error": "Aperçu introuvable ou expiré, renvoyer le fichier."}), 404
+        df, meta = artefact
+        if meta["id_utilisateur"] != current_user.id:
+            return jsonify({"error": "Aperçu introuvable ou expiré, renvoyer le fichier."}), 404
+
+        # Options figées à l'aperçu (le mode conditionne la validation déjà faite)
+        options = meta["options"]
+        id_type_projet = meta["id_type_projet"]
 
         conn = get_connection()
         if conn is None:
             return jsonify({"error": "Connexion à la base impossible."}), 500
 
-        with conn.cursor() as cur:
-            cur.execute("SELECT type_fichier FROM type_projet WHERE id_type_projet = %s", (id_type_projet,))
-            result = cur.fetchone()
-            if not result:
-                return jsonify({"error": "Type de projet introuvable."}), 400
-            type_fichier = result[0]
-
-        # 5️⃣ Choisir le mapping
-        if type_fichier == "FICHIER 1":
-            column_mapping = mapping_fichier1
-        elif type_fichier == "FICHIER 2":
-            column_mapping = mapping_fichier2
-        else:
-            return jsonify({"error": f"Type de fichier inconnu : {type_fichier}"}), 400
-        
-
-        # 6️⃣ Renommer les colonnes
-        df.rename(columns=column_mapping, inplace=True)
-        df = df.replace({np.nan: None})
-
-        # Vérification rapide des colonnes importantes
-        print("=== Colonnes présentes après mapping ===", df.columns.tolist())
-
-        if "nom_promoteur" in df.columns and "denomination_entite" in df.columns:
-            print(df[['nom_promoteur', 'denomination_entite']].head(10))
-        else:
-            print("⚠️ Colonnes nom_promoteur / denomination_entite absentes dans ce fichier")
-
-
-
-
-        # 7️⃣ Conversion dates
-        for col in date_cols:
-            if col in df.columns:
-                df[col] = pd.to_datetime(df[col], errors="coerce").dt.date
-
-        # 8️⃣ Conversion numériques et entiers
-        numeric_cols = [
-            "cout_total_projet", "credit_solicite", "credit_accorde", "refinancement_accorde",
-            "total_financement", "montant_decaisse", "chiffre_affaires_annuel",
-            "montant_accorde_sfd_banque", "montant_credit_valide_fnda", "taux_interet_degressif",
-            "capital", "interets_promoteurs", "interets_fnda"
-        ]
-        int_cols = [
-            "rang_cycle", "nb_beneficiaires_hommes", "nb_beneficiaires_femmes",
-            "total_beneficiaires", "duree", "differe_mois"
-        ]
-        for col in numeric_cols:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors="coerce")
-        for col in int_cols:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors="coerce").astype(pd.Int64Dtype())
+        # Un import du même fichier a pu aboutir depuis l'aperçu
+        if not options["force"]:
+            with conn.cursor() as cur:
+                doublon = _reponse_doublon(cur, id_type_projet, meta["empreinte"])
+            conn.rollback()
+            if doublon:
+                apercu.supprimer(dossier, token)
+                return doublon
 
         created_by = f"{current_user.prenom} {current_user.nom}"
-        
+        stats = pipeline.charger(conn, df, id_type_projet, created_by, meta["nom_fichier"],
+                                 moteur=options["moteur"], connexions=options["connexions"],
+                                 mode=options["mode"], empreinte=meta["empreinte"],
+                                 archive=meta.get("archive"), options=options)
 
-        # 9️⃣ Insertion
-        with conn.cursor() as cur:
-            cur.execute("TRUNCATE TABLE donnees_importees RESTART IDENTITY CASCADE")
-
-            for _, row in df.iterrows():
-                row_dict = row.to_dict()
-
-                 # ✅ Remplacer toutes les valeurs NaT/NaN par None pour PostgreSQL
-                for k, v in row_dict.items():
-                        if pd.isna(v):
-                            row_dict[k] = None
-
-                # Sécurité : colonnes existantes dans donnees_importees
-                cur.execute("SELECT column_name FROM information_schema.columns WHERE table_name='donnees_importees'")
-                allowed_cols = [c[0] for c in cur.fetchall()]
-                safe_row = {k: row_dict.get(k) for k in row_dict if k in allowed_cols}
-
-                # Insertion donnees_importees
-                if safe_row:
-                    columns = ', '.join(safe_row.keys())
-                    placeholders = ', '.join(f"%({k})s" for k in safe_row.keys())
-                    cur.execute(f"INSERT INTO donnees_importees ({columns}) VALUES ({placeholders})", safe_row)
-
-              # Insertion promoteur (sans doublons)
-                if "nom_promoteur" in row_dict and "denomination_entite" in row_dict:
-                    cur.execute("""
-                        SELECT 1 FROM promoteur 
-                        WHERE nom_promoteur = %s AND nom_entite = %s
-                    """, (row_dict.get("nom_promoteur"), row_dict.get("denomination_entite")))
-                    exists = cur.fetchone()
-
-                    if not exists:
-                        cur.execute("""
-                            INSERT INTO promoteur (nom_promoteur, nom_entite, sexe_promoteur, statut_juridique, adresse_contact)
-                            VALUES (%s, %s, %s, %s, %s)
-                        """, (
-                            row_dict.get("nom_promoteur"),
-                            row_dict.get("denomination_entite"),
-                            row_dict.get("sexe_promoteur"),
-                            row_dict.get("statut_juridique"),
-                            row_dict.get("adresse_contact")
-                        ))
-
-
-                # Insertion PSF
-                if "psf" in row_dict:
-                    cur.execute("""
-                        INSERT INTO psf (nom_psf)
-                        VALUES (%s)
-                        ON CONFLICT (nom_psf) DO NOTHING
-                    """, (row_dict.get("psf"),))
-
-                # Insertion filiere
-                if "filiere" in row_dict:
-                    cur.execute("""
-                        INSERT INTO filiere (nom_filiere, maillon)
-                        VALUES (%s, %s)
-                        ON CONFLICT (nom_filiere) DO NOTHING
-                    """, (row_dict.get("filiere"), row_dict.get("maillon_type_credit")))
-
-                # Récupération des IDs
-                cur.execute("SELECT id_promoteur FROM promoteur WHERE nom_promoteur = %s AND nom_entite = %s",
-                            (row_dict.get("nom_promoteur"), row_dict.get("denomination_entite")))
-                id_promoteur = cur.fetchone()[0] if cur.rowcount > 0 else None
-
-                cur.execute("SELECT id_psf FROM psf WHERE nom_psf = %s", (row_dict.get("psf"),))
-                id_psf = cur.fetchone()[0] if cur.rowcount > 0 else None
-
-                cur.execute("SELECT id_filiere FROM filiere WHERE nom_filiere = %s", (row_dict.get("filiere"),))
-                id_filiere = cur.fetchone()[0] if cur.rowcount > 0 else None
-
-                # Ensuite récupérer la commune
-                nom_commune = row_dict.get("commune", "").strip().lower()
-                cur.execute("SELECT id_commune FROM commune WHERE LOWER(TRIM(nom_commune)) = %s", (nom_commune,))
-                id_commune = cur.fetchone()[0] if cur.rowcount > 0 else None
-
-                if not id_commune:
-                    raise ValueError(f"Commune non trouvée pour : '{row_dict.get('commune')}'")
-
-               # Insertion credit_facilite
-                projet_data = {
-                    "date_comite_validation": row_dict.get("date_comite_validation"),
-                    "intitule_projet": row_dict.get("intitule_projet"),
-                    "cout_total_projet": row_dict.get("cout_total_projet"),
-                    "credit_solicite": row_dict.get("credit_solicite"),
-                    "credit_accorde": row_dict.get("credit_accorde"),
-                    "refinancement_accorde": row_dict.get("refinancement_accorde"),
-                    "total_financement": row_dict.get("total_financement"),
-                    "id_commune": id_commune,
-                    "id_filiere": id_filiere,
-                    "id_psf": id_psf,
-                    "id_promoteur": id_promoteur,
-                    "statut_dossier": row_dict.get("statut_dossier"),
-                    "credit_accorde_statut": row_dict.get("credit_accorde_statut"),
-                    "id_type_projet": id_type_projet,
-                    "created_by": created_by,
-                    "garantie_fnda_accordee": row_dict.get("garantie_fnda_accordee"),
-                    "bonification_fnda_accordee": row_dict.get("bonification_fnda_accordee"),
-                    "motif_credit_non_accordee": row_dict.get("motif_credit_non_accordee"),
-                    "notification": row_dict.get("notification"),
-                    "reference_si_notifiee": row_dict.get("reference_si_notifiee"),
-                    "date_notification": row_dict.get("date_notification"),
-                    "montant_decaisse": row_dict.get("montant_decaisse"),
-                    "date_creation_entite": row_dict.get("date_creation_entite"),
-                    "date_decaissement": row_dict.get("date_decaissement"),
-                    "observations": row_dict.get("observations"),
-                    "chiffre_affaires_annuel": row_dict.get("chiffre_affaires_annuel"),
-                    "rang_cycle": row_dict.get("rang_cycle"),
-                    "nom_beneficiaire": row_dict.get("nom_beneficiaire"),
-                    "nb_beneficiaires_hommes": row_dict.get("nb_beneficiaires_hommes"),
-                    "nb_beneficiaires_femmes": row_dict.get("nb_beneficiaires_femmes"),
-                    "total_beneficiaires": row_dict.get("total_beneficiaires"),
-                    "duree": row_dict.get("duree"),
-                    "differe_mois": row_dict.get("differe_mois"),
-                    "date_premiere_echeance": row_dict.get("date_premiere_echeance"),
-                    "date_derniere_echeance": row_dict.get("date_derniere_echeance"),
-                    "periodicite_remboursement": row_dict.get("periodicite_remboursement"),
-                    "contrat_signe": row_dict.get("contrat_signe"),
-                    "reference_ligne_refinancement": row_dict.get("reference_ligne_refinancement"),
-                    "date_accord_ligne_refinancement": row_dict.get("date_accord_ligne_refinancement"),
-                    "numero_reference_tirage": row_dict.get("numero_reference_tirage"),
-                    "date_tirage": row_dict.get("date_tirage"),
-                    "garanties_promoteurs": row_dict.get("garanties_promoteurs"),
-                    "montant_accorde_sfd_banque": row_dict.get("montant_accorde_sfd_banque"),
-                    "montant_credit_valide_fnda": row_dict.get("montant_credit_valide_fnda"),
-                    "taux_interet_degressif": row_dict.get("taux_interet_degressif"),
-                    "capital": row_dict.get("capital"),
-                    "interets_promoteurs": row_dict.get("interets_promoteurs"),
-                    "interets_fnda": row_dict.get("interets_fnda")
-                }
+        if meta.get("feuilles"):
+            stats["feuilles"] = meta["feuilles"]
 
-                cur.execute(f"""
-                    INSERT INTO credit_facilite (
-                        {', '.join(projet_data.keys())}
-                    ) VALUES (
-                        {', '.join(f"%({k})s" for k in projet_data.keys())}
-                    )
-                """, projet_data)
-            conn.commit()
+        apercu.supprimer(dossier, token)
+        session.pop('id_type_projet', None)
+        return jsonify({"message": "Fichier importé et inséré avec succès.", **stats}), 200
 
-            # Historique importation
-            cur.execute("""
-                INSERT INTO historique_importation (nom_fichier, id_type_projet, utilisateur, statut)
-                VALUES (%s, %s, %s, %s)
-            """, (nom_fichier, id_type_projet, created_by, True))
-            conn.commit()
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        print("=== ERREUR IMPORT ===")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
 
-        session.pop('id_type_projet', None)
-        return jsonify({"message": "Fichier importé et inséré avec succès."}), 200
+    finally:
+        if conn:
+            conn.close()
+
+# Envois fragmentés : ouverture, fragments par PUT (reprise possible), puis import du fichier assemblé
+def _envoi_courant(id_envoi):
+    """Métadonnées de l'envoi de l'utilisateur connecté, ou None (inconnu, expiré ou d'un autre utilisateur)."""
+    from importation import envois
+
+    meta = envois.lire(current_app.config['IMPORT_ENVOIS_FOLDER'], id_envoi,
+                       current_app.config['IMPORT_ENVOIS_TTL'])
+    if meta is None or meta["id_utilisateur"] != current_user.id:
+        return None
+    return meta
+
+
+@auth_bp.route("/import_excel/envois", methods=["POST"])
+@login_required
+def import_excel_envoi_ouvrir():
+    try:
+        from importation import envois, lecture
+
+        data = request.get_json(silent=True) or {}
+        nom_fichier = data.get('nom_fichier')
+        taille = data.get('taille')
+        sha256 = (data.get('sha256') or '').lower() or None
+
+        if lecture.format_fichier(nom_fichier) is None:
+            return jsonify({"error": "Format non pris en charge : .xlsx, .csv, .csv.gz, .ods ou .parquet attendu."}), 400
+        # Même plafond que l'envoi direct
+        taille_max = current_app.config['MAX_CONTENT_LENGTH']
+        if not isinstance(taille, int) or not 0 < taille <= taille_max:
+            return jsonify({"error": f"taille doit être comprise entre 1 et {taille_max} octets."}), 400
+        if sha256 and not envois.FORMAT_SHA256.fullmatch(sha256):
+            return jsonify({"error": "sha256 doit être une empreinte hexadécimale de 64 caractères."}), 400
+
+        dossier = current_app.config['IMPORT_ENVOIS_FOLDER']
+        envois.purger(dossier, current_app.config['IMPORT_ENVOIS_TTL'])
+        id_envoi, meta = envois.creer(dossier, nom_fichier, taille, {
+            "sha256": sha256,
+            "id_utilisateur": current_user.id,
+        })
+        return jsonify(envois.etat(dossier, id_envoi, meta)), 201
+
+    except Exception as e:
+        print("=== ERREUR OUVERTURE ENVOI ===")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+
+@auth_bp.route("/import_excel/envois/<id_envoi>", methods=["GET"])
+@login_required
+def import_excel_envoi_etat(id_envoi):
+    """État d'un envoi : le client reprend en renvoyant les fragments manquants."""
+    from importation import envois
+
+    meta = _envoi_courant(id_envoi)
+    if meta is None:
+        return jsonify({"error": "Envoi introuvable ou expiré."}), 404
+    return jsonify(envois.etat(current_app.config['IMPORT_ENVOIS_FOLDER'], id_envoi, meta)), 200
+
+
+@auth_bp.route("/import_excel/envois/<id_envoi>", methods=["PUT"])
+@login_required
+def import_excel_envoi_fragment(id_envoi):
+    """Fragment à ?offset=N, corps brut, SHA-256 du fragment dans l'en-tête X-Fragment-Sha256."""
+    try:
+        from importation import envois
+
+        meta = _envoi_courant(id_envoi)
+        if meta is None:
+            return jsonify({"error": "Envoi introuvable ou expiré."}), 404
+        offset = request.args.get('offset', type=int)
+        if offset is None:
+            return jsonify({"error": "Paramètre offset manquant."}), 400
+
+        dossier = current_app.config['IMPORT_ENVOIS_FOLDER']
+        # Corps lu par blocs et écrit au fil de l'eau
+        refus = envois.ecrire_fragment(dossier, id_envoi, meta, offset, request.stream,
+                                       request.headers.get('X-Fragment-Sha256'))
+        etat = envois.etat(dossier, id_envoi, meta)
+        if refus:
+            return jsonify({"error": f"Fragment refusé, à renvoyer : {refus}", **etat}), 400
+        return jsonify(etat), 200
+
+    except Exception as e:
+        print("=== ERREUR FRAGMENT ===")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+
+@auth_bp.route("/import_excel/envois/<id_envoi>", methods=["DELETE"])
+@login_required
+def import_excel_envoi_abandonner(id_envoi):
+    from importation import envois
+
+    if _envoi_courant(id_envoi) is None:
+        return jsonify({"error": "Envoi introuvable ou expiré."}), 404
+    envois.supprimer(current_app.config['IMPORT_ENVOIS_FOLDER'], id_envoi)
+    return jsonify({"message": "Envoi abandonné."}), 200
+
+
+@auth_bp.route("/import_excel/envois/<id_envoi>/complete", methods=["POST"])
+@login_required
+def import_excel_envoi_terminer(id_envoi):
+    """Fichier assemblé importé comme un envoi direct (mêmes options de formulaire)."""
+    conn = None
+    try:
+        from importation import empreinte, envois, pipeline
+
+        meta = _envoi_courant(id_envoi)
+        if meta is None:
+            return jsonify({"error": "Envoi introuvable ou expiré."}), 404
+
+        dossier = current_app.config['IMPORT_ENVOIS_FOLDER']
+        etat = envois.etat(dossier, id_envoi, meta)
+        if not etat["complet"]:
+            return jsonify({"error": f"{len(etat['manquants'])} fragment(s) manquant(s).", **etat}), 409
+
+        options, erreur = _options_chargement(pipeline)
+        if erreur:
+            return erreur
+
+        id_type_projet = request.form.get('id_type_projet', type=int) or session.get('id_type_projet')
+
+        conn = get_connection()
+        if conn is None:
+            return jsonify({"error": "Connexion à la base impossible."}), 500
+
+        with televersements.projeter(envois.chemin_fichier(dossier, id_envoi), meta["nom_fichier"]) as televersement:
+            # Fichier assemblé identique à celui du client ?
+            if meta["sha256"] and empreinte.sha256_flux(televersement.flux) != meta["sha256"]:
+                envois.supprimer(dossier, id_envoi)
+                return jsonify({"error": "Le fichier assemblé diffère de l'original (SHA-256), le renvoyer."}), 422
+            reponse = _importer(conn, televersement, id_type_projet, options)
+
+        # Fichier traité (importé, doublon ou refusé) : l'envoi est clos.
+        # Sur une erreur serveur (exception), il est gardé pour un nouvel essai sans renvoi.
+        envois.supprimer(dossier, id_envoi)
+        return reponse
 
     except Exception as e:
         if conn:
@@ -1392,7 +1482,7 @@ def promoteurs_par_filiere():
                 SELECT f.nom_filiere, cf.id_type_projet, COUNT(DISTINCT cf.id_promoteur) AS nb_promoteurs
                 FROM credit_facilite cf
                 JOIN filiere f ON cf.id_filiere = f.id_filiere
-                WHERE 1=1
+                WHERE cf.supprime_le IS NULL
             """
             conditions = []
             params = []
@@ -1459,7 +1549,8 @@ def credits_par_commune():
                 SELECT c.nom_commune, cf.id_type_projet, SUM(cf.credit_accorde) AS total_credits
                 FROM credit_facilite cf
                 JOIN commune c ON cf.id_commune = c.id_commune
-                WHERE cf.date_comite_validation >= %s::date
+                WHERE cf.supprime_le IS NULL
+                  AND cf.date_comite_validation >= %s::date
                   AND cf.date_comite_validation < %s::date
                   AND cf.credit_accorde IS NOT NULL
                 GROUP BY c.nom_commune, cf.id_type_projet
@@ -1518,6 +1609,7 @@ def projets_par_departement():
                 LEFT JOIN credit_facilite cf
                        ON cf.id_commune = c.id_commune
                       AND cf.id_type_projet = tp.id_type_projet
+                      AND cf.supprime_le IS NULL
                       AND cf.date_comite_validation >= %s::date
                       AND cf.date_comite_validation < %s::date
                 GROUP BY d.nom_departement, tp.id_type_projet
@@ -1572,6 +1664,7 @@ def projets_par_pda():
                 LEFT JOIN credit_facilite cf
                        ON cf.id_commune = c.id_commune
                       AND cf.id_type_projet = tp.id_type_projet
+                      AND cf.supprime_le IS NULL
                       AND cf.date_comite_validation >= %s::date
                       AND cf.date_comite_validation < %s::date
                 GROUP BY p.nom_pda, tp.id_type_projet
@@ -1626,6 +1719,7 @@ def credits_par_departement():
                 LEFT JOIN credit_facilite cf
                        ON cf.id_commune = c.id_commune
                       AND cf.id_type_projet = tp.id_type_projet
+                      AND cf.supprime_le IS NULL
                       AND cf.credit_accorde IS NOT NULL
                       AND cf.date_comite_validation >= %s::date
                       AND cf.date_comite_validation <= %s::date
@@ -1682,6 +1776,7 @@ def credits_par_pda():
                 LEFT JOIN credit_facilite cf
                        ON cf.id_commune = c.id_commune
                       AND cf.id_type_projet = tp.id_type_projet
+                      AND cf.supprime_le IS NULL
                       AND cf.credit_accorde IS NOT NULL
                       AND cf.date_comite_validation >= %s::date
                       AND cf.date_comite_validation <= %s::date
@@ -1734,7 +1829,8 @@ def credits_par_filiere():
                 SELECT f.nom_filiere, cf.id_type_projet, SUM(cf.credit_accorde) AS total_credits
                 FROM credit_facilite cf
                 JOIN filiere f ON cf.id_filiere = f.id_filiere
-                WHERE cf.credit_accorde IS NOT NULL
+                WHERE cf.supprime_le IS NULL
+                  AND cf.credit_accorde IS NOT NULL
                   AND cf.date_comite_validation >= %s::date
                   AND cf.date_comite_validation <= %s::date
                 GROUP BY f.nom_filiere, cf.id_type_projet
@@ -1789,6 +1885,7 @@ def projets_par_commune():
                 LEFT JOIN credit_facilite cf
                        ON cf.id_commune = c.id_commune
                       AND cf.id_type_projet = tp.id_type_projet
+                      AND cf.supprime_le IS NULL
                       AND cf.date_comite_validation >= %s::date
                       AND cf.date_comite_validation <= %s::date
                 GROUP BY c.nom_commune, tp.id_type_projet
@@ -1845,7 +1942,8 @@ def stats_credits_par_filiere():
                 SELECT f.nom_filiere, SUM(cf.credit_accorde) AS total_credits
                 FROM credit_facilite cf
                 JOIN filiere f ON cf.id_filiere = f.id_filiere
-                WHERE cf.date_comite_validation >= %s::date
+                WHERE cf.supprime_le IS NULL
+                  AND cf.date_comite_validation >= %s::date
                   AND cf.date_comite_validation < %s::date
                   AND cf.credit_accorde IS NOT NULL
                 GROUP BY f.nom_filiere
@@ -1882,7 +1980,8 @@ def stats_credits_par_pda():
                 FROM credit_facilite cf
                 JOIN commune c ON cf.id_commune = c.id_commune
                 JOIN pda p ON c.id_pda = p.id_pda
-                WHERE cf.date_comite_validation >= %s::date
+                WHERE cf.supprime_le IS NULL
+                  AND cf.date_comite_validation >= %s::date
                   AND cf.date_comite_validation < %s::date
                   AND cf.credit_accorde IS NOT NULL
                 GROUP BY p.nom_pda
@@ -1920,7 +2019,8 @@ def stats_credits_par_departement():
                 FROM credit_facilite cf
                 JOIN commune c ON cf.id_commune = c.id_commune
                 JOIN departement d ON c.id_departement = d.id_departement
-                WHERE cf.date_comite_validation >= %s::date
+                WHERE cf.supprime_le IS NULL
+                  AND cf.date_comite_validation >= %s::date
                   AND cf.date_comite_validation < %s::date
                   AND cf.credit_accorde IS NOT NULL
                 GROUP BY d.nom_departement
@@ -1956,7 +2056,8 @@ def stats_credits_par_commune():
                 SELECT c.nom_commune, SUM(cf.credit_accorde) AS total_credits
                 FROM credit_facilite cf
                 JOIN commune c ON cf.id_commune = c.id_commune
-                WHERE cf.date_comite_validation >= %s::date
+                WHERE cf.supprime_le IS NULL
+                  AND cf.date_comite_validation >= %s::date
                   AND cf.date_comite_validation < %s::date
                   AND cf.credit_accorde IS NOT NULL
                 GROUP BY c.nom_commune
@@ -0,0 +1,6 @@
+-- Empreinte SHA-256 du fichier importé, pour détecter les ré-envois du même classeur
+ALTER TABLE historique_importation ADD COLUMN IF NOT EXISTS empreinte_sha256 char(64);
+
+CREATE INDEX IF NOT EXISTS idx_historique_importation_empreinte
+    ON historique_importation (id_type_projet, empreinte_sha256)
+    WHERE statut;
@@ -0,0 +1,9 @@
+-- Import différentiel : clé métier (N° du classeur), empreinte de la ligne et suppression logique
+ALTER TABLE credit_facilite ADD COLUMN IF NOT EXISTS numero text;
+ALTER TABLE credit_facilite ADD COLUMN IF NOT EXISTS empreinte_ligne bigint;
+ALTER TABLE credit_facilite ADD COLUMN IF NOT EXISTS supprime_le timestamp;
+
+-- Lignes vivantes d'une facilité, par numéro : comparaison avec le fichier entrant
+CREATE INDEX IF NOT EXISTS idx_credit_facilite_numero_vivant
+    ON credit_facilite (id_type_projet, numero)
+    WHERE supprime_le IS NULL;
@@ -0,0 +1,12 @@
+-- Lot d'import : chaque fait porte l'import qui l'a créé (et celui qui l'a marqué supprimé)
+ALTER TABLE credit_facilite ADD COLUMN IF NOT EXISTS id_import integer;
+ALTER TABLE credit_facilite ADD COLUMN IF NOT EXISTS id_import_suppression integer;
+
+-- Annulation d'un import : suppression et restauration indexées, indépendantes de la taille de la table
+CREATE INDEX IF NOT EXISTS idx_credit_facilite_id_import
+    ON credit_facilite (id_import);
+CREATE INDEX IF NOT EXISTS idx_credit_facilite_id_import_suppression
+    ON credit_facilite (id_import_suppression)
+    WHERE id_import_suppression IS NOT NULL;
+
+ALTER TABLE historique_importation ADD COLUMN IF NOT EXISTS annule_le timestamp;
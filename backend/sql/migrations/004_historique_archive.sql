@@ -0,0 +1,8 @@
+-- Fichier d'origine de chaque import, conservé dans l'archive adressée par contenu (chemin relatif)
+ALTER TABLE historique_importation ADD COLUMN IF NOT EXISTS archive text;
+
+-- Options de l'import (mode, feuilles...), pour le rejouer à l'identique
+ALTER TABLE historique_importation ADD COLUMN IF NOT EXISTS options jsonb;
+
+-- Import rejoué depuis l'archive : l'import d'origine qu'il remplace (et qui est annulé)
+ALTER TABLE historique_importation ADD COLUMN IF NOT EXISTS remplace_import integer;
@@ -0,0 +1,15 @@
+-- Import d'un lot de fichiers (dossier de dépôt) : un import, une ligne par fichier d'origine
+CREATE TABLE IF NOT EXISTS historique_importation_fichiers (
+    id serial PRIMARY KEY,
+    id_import integer NOT NULL REFERENCES historique_importation (id) ON DELETE CASCADE,
+    nom_fichier text NOT NULL,
+    empreinte_sha256 char(64) NOT NULL,
+    archive text,
+    lignes integer
+);
+
+-- Doublons : un fichier déjà importé dans un lot est reconnu à son empreinte
+CREATE INDEX IF NOT EXISTS idx_historique_importation_fichiers_empreinte
+    ON historique_importation_fichiers (empreinte_sha256);
+CREATE INDEX IF NOT EXISTS idx_historique_importation_fichiers_id_import
+    ON historique_importation_fichiers (id_import);
@@ -0,0 +1,256 @@
+"""
+Surveillance d'un dossier de dépôt : les fichiers que les partenaires y déposent sont importés sans saisie manuelle.
+
+Le dossier est parcouru à intervalle régulier (pas de notifications du système :
+sur un partage réseau, les écritures des autres machines n'en déclenchent pas).
+Un fichier n'est pris qu'une fois sa copie terminée : même taille et même date de
+modification pendant --stabilite secondes. Son type de fichier est détecté sur ses
+en-têtes ; la facilité est celle du sous-dossier (<dossier>/<id_type_projet>/) ou,
+pour un fichier déposé à la racine, la seule facilité de ce type.
+
+Les petits fichiers (--seuil-lot) prêts pour une même facilité sont chargés ensemble :
+un import, une transaction et une ligne d'historique_importation par lot, chaque
+fichier étant enregistré dans historique_importation_fichiers. Les gros fichiers sont
+importés un par un. Tous passent par importation.traitement (doublons, validation,
+archivage), comme /auth/import_excel.
+
+Les fichiers traités sont déplacés dans <dossier>/done/ (importés ou déjà importés)
+ou <dossier>/failed/, avec dans ce cas un <fichier>.erreur.json qui donne le motif.
+
+Usage (depuis backend/, avec config.ini) :
+    python surveiller_depot.py /srv/depot
+    python surveiller_depot.py /srv/depot --stabilite 30 --seuil-lot 10 --taille-lot 100
+    python surveiller_depot.py /srv/depot --une-fois    # un seul passage (cron, reprise)
+"""
+import argparse
+import fcntl
+import getpass
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+
+import db
+
+# Même dossier que l'application (IMPORT_ARCHIVE_FOLDER)
+ARCHIVE_FOLDER = os.path.join(os.getcwd(), 'uploads', 'archive')
+
+TERMINES = "done"
+ECHECS = "failed"
+
+# Un seul processus de surveillance par dossier
+VERROU = ".surveillance.lock"
+
+# Fichiers cachés, temporaires ou en cours de copie : jamais pris
+PREFIXES_IGNORES = (".", "~$")
+SUFFIXES_IGNORES = (".tmp", ".part", ".crdownload")
+
+
+def journal(message):
+    print(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] {message}", flush=True)
+
+
+def _candidat(entree):
+    nom = entree.name
+    return (entree.is_file() and not nom.startswith(PREFIXES_IGNORES)
+            and not nom.lower().endswith(SUFFIXES_IGNORES))
+
+
+def scanner(dossier):
+    """Fichiers déposés : {chemin: id_type_projet du sous-dossier, ou None à la racine}."""
+    deposes = {}
+    for entree in os.scandir(dossier):
+        if entree.is_dir() and entree.name.isdigit():
+            for fichier in os.scandir(entree.path):
+                if _candidat(fichier):
+                    deposes[fichier.path] = int(entree.name)
+        elif _candidat(entree):
+            deposes[entree.path] = None
+    return deposes
+
+
+def stables(deposes, suivi, stabilite, maintenant):
+    """
+    Fichiers dont la copie est terminée : taille et date de modification inchangées
+    depuis au moins `stabilite` secondes. suivi ({chemin: (signature, vue_le)}) est mis à jour.
+    """
+    prets = []
+    for chemin in deposes:
+        try:
+            st = os.stat(chemin)
+        except FileNotFoundError:
+            continue
+        signature = (st.st_size, st.st_mtime_ns)
+        precedent = suivi.get(chemin)
+        if precedent is None or precedent[0] != signature:
+            suivi[chemin] = (signature, maintenant)
+        elif maintenant - precedent[1] >= stabilite:
+            prets.append(chemin)
+    for chemin in set(suivi) - set(deposes):
+        del suivi[chemin]
+    return prets
+
+
+def _destination(cible, nom):
+    horodatage = datetime.now().strftime("%Y%m%d-%H%M%S")
+    destination = os.path.join(cible, f"{horodatage}-{nom}")
+    n = 1
+    while os.path.exists(destination):
+        n += 1
+        destination = os.path.join(cible, f"{horodatage}-{n}-{nom}")
+    return destination
+
+
+def conclure(dossier, chemins, corps, statut):
+    """Déplace des fichiers traités dans done/ ou failed/ (avec le motif) et journalise l'issue."""
+    noms = ", ".join(os.path.basename(chemin) for chemin in chemins)
+    if statut == 200 and corps.get("doublon"):
+        journal(f"{noms} : déjà importé (import {corps['id_historique']})" if corps.get("id_historique")
+                else f"{noms} : {corps['message']}")
+    elif statut == 200:
+        journal(f"{noms} : import {corps['id_import']}, {corps['lignes']} lignes")
+    else:
+        journal(f"{noms} : refusé ({statut}) {corps.get('error') or corps.get('message', '')}")
+
+    cible = os.path.join(dossier, TERMINES if statut == 200 else ECHECS)
+    for chemin in chemins:
+        destination = _destination(cible, os.path.basename(chemin))
+        os.replace(chemin, destination)
+        if statut != 200:
+            with open(destination + ".erreur.json", "w", encoding="utf-8") as f:
+                json.dump(corps, f, ensure_ascii=False, indent=2, default=str)
+
+
+def traiter(conn, dossier, prets, facilites, options, utilisateur, dossier_archive, seuil, taille_lot):
+    """Importe les fichiers prêts (les petits par lots d'une même facilité) et les déplace."""
+    from importation import archive, traitement
+    from televersements import projeter
+
+    lots = {}   # id_type_projet : [fichier préparé et archivé, ...]
+    vus = {}    # empreinte : nom, même contenu déposé deux fois dans le même passage
+
+    def charger(id_type_projet):
+        lot = lots.pop(id_type_projet)
+        try:
+            corps, statut = traitement.charger_lot(conn, lot, options, utilisateur)
+        except Exception as e:
+            conn.rollback()
+            corps, statut = {"error": str(e)}, 500
+        conclure(dossier, [fichier["chemin"] for fichier in lot], corps, statut)
+
+    for chemin in sorted(prets):
+        nom = os.path.basename(chemin)
+        try:
+            with projeter(chemin, nom) as televersement:
+                if os.path.getsize(chemin) > seuil:
+                    # Gros fichier : un import à lui seul
+                    corps, statut = traitement.importer(conn, televersement, facilites[chemin], options,
+                                                        utilisateur, dossier_archive)
+                    conclure(dossier, [chemin], corps, statut)
+                    continue
+
+                fichier, refus = traitement.preparer(conn, televersement, facilites[chemin], options, processus=1)
+                if fichier and fichier["empreinte"] in vus:
+                    refus = ({"message": f"Même contenu que {vus[fichier['empreinte']]}, déposé en même temps.",
+                              "doublon": True}, 200)
+                if refus:
+                    conclure(dossier, [chemin], *refus)
+                    continue
+                fichier.update(nom=nom, chemin=chemin,
+                               archive=archive.archiver(dossier_archive, televersement.flux,
+                                                        fichier["empreinte"], nom))
+        except Exception as e:
+            conn.rollback()
+            conclure(dossier, [chemin], {"error": str(e)}, 500)
+            continue
+
+        vus[fichier["empreinte"]] = nom
+        lots.setdefault(fichier["id_type_projet"], []).append(fichier)
+        if len(lots[fichier["id_type_projet"]]) >= taille_lot:
+            # Lot plein : chargé sans attendre, la mémoire reste bornée
+            charger(fichier["id_type_projet"])
+
+    for id_type_projet in list(lots):
+        charger(id_type_projet)
+
+
+def main(argv=None):
+    from importation import classeur
+
+    parser = argparse.ArgumentParser(description="Import automatique des fichiers déposés dans un dossier.")
+    parser.add_argument('dossier', nargs='?', default=os.environ.get('IMPORT_DEPOT_FOLDER'),
+                        help="Dossier de dépôt (par défaut : variable IMPORT_DEPOT_FOLDER)")
+    parser.add_argument('--intervalle', type=float, default=10, help="Secondes entre deux parcours du dossier")
+    parser.add_argument('--stabilite', type=float, default=15,
+                        help="Secondes sans changement de taille ni de date avant de prendre un fichier")
+    parser.add_argument('--seuil-lot', type=float, default=5,
+                        help="Taille (Mo) jusqu'à laquelle un fichier est chargé avec d'autres en un lot")
+    parser.add_argument('--taille-lot', type=int, default=50, help="Fichiers par lot au plus")
+    parser.add_argument('--feuilles', choices=classeur.FEUILLES, default='premiere')
+    parser.add_argument('--utilisateur', default=f"surveiller_depot ({getpass.getuser()})")
+    parser.add_argument('--archive', default=ARCHIVE_FOLDER, help="Dossier de l'archive")
+    parser.add_argument('--une-fois', action='store_true',
+                        help="Un seul passage : les fichiers stables pendant --stabilite secondes, puis fin")
+    args = parser.parse_args(argv)
+
+    if not args.dossier or not os.path.isdir(args.dossier):
+        parser.error("dossier de dépôt introuvable (argument ou variable IMPORT_DEPOT_FOLDER)")
+    if args.taille_lot < 1:
+        parser.error("--taille-lot doit être au moins 1")
+    dossier = os.path.abspath(args.dossier)
+    for sous_dossier in (TERMINES, ECHECS):
+        os.makedirs(os.path.join(dossier, sous_dossier), exist_ok=True)
+
+    # Deux surveillances du même dossier importeraient deux fois les mêmes fichiers
+    verrou = open(os.path.join(dossier, VERROU), "w")
+    try:
+        fcntl.flock(verrou, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        sys.exit(f"Une autre surveillance traite déjà {dossier}.")
+
+    db.init_pool(1, 1)
+    arret = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        # Arrêt entre deux passages : un lot en cours de chargement va à son terme
+        signal.signal(signum, lambda *_: arret.set())
+
+    # Dépôt : imports complets, les doublons sont écartés (jamais de réimport forcé)
+    options = {"moteur": "sql", "connexions": 1, "mode": "complet", "feuilles": args.feuilles, "force": False}
+    seuil = args.seuil_lot * 1024 * 1024
+    journal(f"Surveillance de {dossier} (toutes les {args.intervalle:g} s, stabilité {args.stabilite:g} s)")
+
+    suivi = {}
+    premier = True
+    while not arret.is_set():
+        try:
+            deposes = scanner(dossier)
+            prets = stables(deposes, suivi, args.stabilite, time.monotonic())
+            if prets:
+                conn = db.get_connection()
+                if conn is None:
+                    journal("Connexion à la base impossible, nouvel essai au prochain passage.")
+                else:
+                    try:
+                        traiter(conn, dossier, prets, deposes, options, args.utilisateur, args.archive,
+                                seuil, args.taille_lot)
+                    finally:
+                        conn.close()
+                    for chemin in prets:
+                        suivi.pop(chemin, None)
+        except Exception as e:
+            # Partage momentanément inaccessible, déplacement impossible... : le passage suivant reprend
+            journal(f"Passage interrompu : {e}")
+
+        if args.une_fois and not premier:
+            break
+        premier = False
+        # --une-fois : un second parcours après --stabilite secondes, pour voir les fichiers stables
+        arret.wait(args.stabilite if args.une_fois else args.intervalle)
+    journal("Surveillance arrêtée.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Fichiers envoyés : écrits sur disque au fil de la réception, lus par projection mémoire.
+
+Par défaut, Werkzeug garde les petits fichiers en mémoire et les autres dans un
+fichier temporaire anonyme, sans limite de taille : un envoi démesuré fait
+gonfler le worker. Ici :
+  - la taille des requêtes est plafonnée (MAX_CONTENT_LENGTH) : un envoi trop
+    gros est refusé en 413 dès l'en-tête Content-Length, avant toute lecture ;
+  - chaque fichier est écrit dans le dossier UPLOAD_SPOOL_FOLDER, jamais en mémoire ;
+  - les lecteurs reçoivent une projection mémoire (mmap) du fichier écrit : les
+    pages sont lues à la demande et partagées avec le cache du système, la
+    mémoire du worker ne dépend plus de la taille du fichier envoyé ;
+  - le fichier est supprimé à la fin de la requête (fermeture par Flask), et
+    les restes d'un worker interrompu sont purgés au démarrage.
+"""
+import contextlib
+import os
+import tempfile
+import time
+from collections import namedtuple
+
+from flask import Request, current_app, jsonify, request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+PREFIXE = "envoi-"
+
+# Fichier envoyé projeté en mémoire : nom d'origine, chemin sur disque, flux binaire (lecture seule)
+Televersement = namedtuple("Televersement", ["nom", "chemin", "flux"])
+
+
+class RequeteSpoolee(Request):
+    """Requête dont les fichiers sont toujours écrits dans le dossier UPLOAD_SPOOL_FOLDER."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # Fichier nommé (et non anonyme) : il peut être projeté en mémoire ou rouvert par un autre processus
+        return tempfile.NamedTemporaryFile(
+            mode="w+b", prefix=PREFIXE, dir=current_app.config["UPLOAD_SPOOL_FOLDER"]
+        )
+
+
+def purger(dossier, ttl):
+    """Supprime les fichiers envoyés plus vieux que ttl secondes (worker interrompu en cours de requête)."""
+    limite = time.time() - ttl
+    for nom in os.listdir(dossier):
+        chemin = os.path.join(dossier, nom)
+        try:
+            if nom.startswith(PREFIXE) and os.path.getmtime(chemin) < limite:
+                os.remove(chemin)
+        except OSError:
+            # Déjà supprimé par sa requête
+            pass
+
+
+@contextlib.contextmanager
+def projeter(chemin, nom):
+    """
+    Projection mémoire (lecture seule) du fichier `chemin`, fermée en sortie de bloc.
+    Le flux se lit comme un fichier (read, seek) ; Arrow le lit sans copie.
+    """
+    import pyarrow as pa
+
+    if os.path.getsize(chemin) == 0:
+        # Un fichier vide ne peut pas être projeté
+        flux = pa.BufferReader(b"")
+    else:
+        flux = pa.memory_map(chemin, "r")
+    try:
+        yield Televersement(nom, chemin, flux)
+    finally:
+        flux.close()
+
+
+def ouvrir(fichier):
+    """Projection mémoire d'un fichier envoyé (FileStorage écrit par RequeteSpoolee)."""
+    fichier.stream.flush()
+    return projeter(fichier.stream.name, fichier.filename)
+
+
+def init_televersements(app):
+    dossier = app.config["UPLOAD_SPOOL_FOLDER"]
+    os.makedirs(dossier, exist_ok=True)
+    purger(dossier, app.config["UPLOAD_SPOOL_TTL"])
+
+    app.request_class = RequeteSpoolee
+
+    @app.before_request
+    def recevoir_fichiers():
+        # Réception des fichiers avant la route : un envoi trop gros est refusé (413)
+        # ici, et non pris pour une erreur d'import par le try/except de la route
+        if request.mimetype == "multipart/form-data":
+            request.files
+
+    @app.errorhandler(RequestEntityTooLarge)
+    def envoi_trop_volumineux(erreur):
+        limite = app.config["MAX_CONTENT_LENGTH"]
+        return jsonify({
+            "error": f"Fichier trop volumineux : {limite // (1024 * 1024)} Mo au plus.",
+            "taille_max": limite
+        }), 413
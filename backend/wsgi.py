@@ -0,0 +1,23 @@
+"""
+Point d'entrée WSGI de production.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Avec preload_app (voir gunicorn.conf.py), ce module est importé une seule fois
+dans le processus maître : les modules lourds chargés ici sont partagés par
+les workers en copy-on-write. Le pool de connexions est créé après le fork,
+dans chaque worker (hook post_fork -> app.init_worker).
+"""
+import importlib
+import os
+
+# Modules lourds à charger avant le fork
+PRELOAD_MODULES = ['pandas', 'numpy', 'openpyxl', 'importation.pipeline']
+
+if os.environ.get('PRELOAD_MODULES', '1') != '0':
+    for module in PRELOAD_MODULES:
+        importlib.import_module(module)
+
+from app import create_app
+
+app = create_app()
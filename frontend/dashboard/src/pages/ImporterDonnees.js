@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { FiUpload, FiEdit, FiCheckCircle, FiDatabase } from 'react-icons/fi';
 import * as XLSX from 'xlsx';
+import { Sha256 } from '../utils/sha256';
 
 // Conversion date Excel -> YYYY-MM-DD
 const excelDateToJSDate = (serial) => {
@@ -17,6 +18,113 @@ const formatNumber = (value) => {
   return Number(value).toLocaleString('fr-FR');
 };
 
+// Au-delà de cette taille, le fichier est envoyé par fragments (reprise possible sur liaison lente)
+const SEUIL_ENVOI_FRAGMENTE = 20 * 1024 * 1024;
+const ESSAIS_FRAGMENTS = 3;
+
+const sha256Hex = async (buffer) => {
+  const empreinte = await crypto.subtle.digest('SHA-256', buffer);
+  return Array.from(new Uint8Array(empreinte)).map(b => b.toString(16).padStart(2, '0')).join('');
+};
+
+// Empreinte du fichier entier, lu par tranches : vérifiée par le serveur sur le fichier assemblé
+const TAILLE_LECTURE = 8 * 1024 * 1024;
+
+const sha256Fichier = async (file) => {
+  const empreinte = new Sha256();
+  for (let debut = 0; debut < file.size; debut += TAILLE_LECTURE) {
+    empreinte.update(await file.slice(debut, debut + TAILLE_LECTURE).arrayBuffer());
+  }
+  return empreinte.hex();
+};
+
+// Envois en cours, gardés entre deux sessions : le même fichier choisi à nouveau reprend son envoi
+const CLE_ENVOIS = 'envois_import';
+
+const cleFichier = (file) => `${file.name}|${file.size}|${file.lastModified}`;
+
+const lireEnvois = () => {
+  try {
+    return JSON.parse(localStorage.getItem(CLE_ENVOIS)) || {};
+  } catch {
+    return {};
+  }
+};
+
+const enregistrerEnvoi = (file, id_envoi) => {
+  const envoisEnCours = lireEnvois();
+  envoisEnCours[cleFichier(file)] = { id_envoi, name: file.name, size: file.size, lastModified: file.lastModified };
+  localStorage.setItem(CLE_ENVOIS, JSON.stringify(envoisEnCours));
+};
+
+const oublierEnvoi = (file) => {
+  const envoisEnCours = lireEnvois();
+  delete envoisEnCours[cleFichier(file)];
+  localStorage.setItem(CLE_ENVOIS, JSON.stringify(envoisEnCours));
+};
+
+// Envoi déjà ouvert pour ce fichier (rechargement de la page, session coupée) : son état, ou null
+const reprendreEnvoi = async (file) => {
+  const enregistre = lireEnvois()[cleFichier(file)];
+  if (!enregistre) return null;
+  try {
+    const reponse = await fetch(`http://localhost:5000/auth/import_excel/envois/${enregistre.id_envoi}`, { credentials: "include" });
+    if (reponse.ok) return reponse.json();
+  } catch (err) {
+    console.error("État de l'envoi indisponible :", err);
+  }
+  // Expiré, terminé ou ouvert par un autre utilisateur : nouvel envoi
+  oublierEnvoi(file);
+  return null;
+};
+
+// Envoi fragmenté : ouverture (ou reprise), envoi des fragments manquants (plusieurs tours), puis import du fichier assemblé
+const envoyerParFragments = async (file, champs) => {
+  let etat = await reprendreEnvoi(file);
+  if (!etat) {
+    const ouverture = await fetch("http://localhost:5000/auth/import_excel/envois", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ nom_fichier: file.name, taille: file.size, sha256: await sha256Fichier(file) }),
+      credentials: "include",
+    });
+    if (!ouverture.ok) return ouverture;
+    etat = await ouverture.json();
+    enregistrerEnvoi(file, etat.id_envoi);
+  }
+
+  for (let essai = 0; essai < ESSAIS_FRAGMENTS && !etat.complet; essai++) {
+    for (const index of etat.manquants) {
+      const debut = index * etat.taille_fragment;
+      const fragment = await file.slice(debut, debut + etat.taille_fragment).arrayBuffer();
+      try {
+        await fetch(`http://localhost:5000/auth/import_excel/envois/${etat.id_envoi}?offset=${debut}`, {
+          method: "PUT",
+          headers: { "Content-Type": "application/octet-stream", "X-Fragment-Sha256": await sha256Hex(fragment) },
+          body: fragment,
+          credentials: "include",
+        });
+      } catch (err) {
+        // Fragment perdu : il reste dans les manquants et sera renvoyé au tour suivant
+        console.error(`Fragment ${index} non envoyé :`, err);
+      }
+    }
+    const reponse = await fetch(`http://localhost:5000/auth/import_excel/envois/${etat.id_envoi}`, { credentials: "include" });
+    etat = await reponse.json();
+  }
+
+  const formData = new FormData();
+  Object.entries(champs).forEach(([nom, valeur]) => formData.append(nom, valeur));
+  const reponse = await fetch(`http://localhost:5000/auth/import_excel/envois/${etat.id_envoi}/complete`, {
+    method: "POST",
+    body: formData,
+    credentials: "include",
+  });
+  // Fragments manquants (409) ou erreur serveur : l'envoi est gardé par le serveur, à reprendre
+  if (reponse.status !== 409 && reponse.status < 500) oublierEnvoi(file);
+  return reponse;
+};
+
 function Importation() {
   const [facilites, setFacilites] = useState([]);
   const [selectedFacilite, setSelectedFacilite] = useState('');
@@ -170,11 +278,16 @@ const handleImportToDB = () => {
   formData.append('id_type_projet', selectedFacilite); // ← IMPORTANT
 
 
-  fetch("http://localhost:5000/auth/import_excel", {
-    method: "POST",
-    body: formData,
-    credentials: "include",
-  })
+  // Gros fichiers : envoi fragmenté, les autres en un seul POST
+  const envoi = file.size > SEUIL_ENVOI_FRAGMENTE
+    ? envoyerParFragments(file, { id_type_projet: selectedFacilite })
+    : fetch("http://localhost:5000/auth/import_excel", {
+        method: "POST",
+        body: formData,
+        credentials: "include",
+      });
+
+  envoi
     .then(res => {
       clearInterval(interval);
       setImporting(false);
@@ -182,6 +295,13 @@ const handleImportToDB = () => {
         setProgress(100);
         setProgressText("Fichier importé avec succès ! 🎉");
         setImportStatus({ success: true, message: `${data.length - 1} lignes traitées.` });
+      } else if (res.status === 422) {
+        // Rapport de validation : toutes les anomalies du fichier, rien n'a été importé
+        setProgress(0);
+        setProgressText('');
+        res.json().then(body => {
+          setImportStatus({ success: false, message: body.error, erreurs: body.erreurs || [] });
+        });
       } else {
         setProgress(0);
         setProgressText('');
@@ -262,10 +382,10 @@ const handleImportToDB = () => {
               <div className="bg-white rounded-xl shadow-lg p-10 text-center border-2 border-dashed border-green-600 w-96 mx-auto">
                 <FiUpload className="text-green-600 mx-auto mb-4" size={80} />
                 <h2 className="text-xl font-semibold text-green-700 mb-2">Déposez un fichier Excel ici</h2>
-                <p className="text-gray-600 mb-6">Format accepté : .xlsx</p>
+                <p className="text-gray-600 mb-6">Formats acceptés : .xlsx, .csv, .ods</p>
                 <label className="inline-block bg-green-600 text-white px-6 py-3 rounded-lg cursor-pointer hover:bg-green-700 transition">
                   Choisir un fichier Excel
-                  <input type="file" accept=".xlsx" className="hidden" onChange={handleFileChange} />
+                  <input type="file" accept=".xlsx,.csv,.ods" className="hidden" onChange={handleFileChange} />
                 </label>
               </div>
             ) : (
@@ -367,6 +487,15 @@ const handleImportToDB = () => {
                         {importStatus.success ? 'Succès' : 'Erreur'}
                       </h2>
                       <p className="mb-4">{importStatus.message}</p>
+                      {importStatus.erreurs && importStatus.erreurs.length > 0 && (
+                        <ul className="mb-4 max-h-64 overflow-y-auto text-left text-sm">
+                          {importStatus.erreurs.map((e, i) => (
+                            <li key={i}>
+                              {e.ligne ? `Ligne ${e.ligne}` : 'Fichier'} — {e.colonne} : {e.motif}{e.valeur ? ` (${e.valeur})` : ''}
+                            </li>
+                          ))}
+                        </ul>
+                      )}
                       <button onClick={() => setImportStatus(null)} className="bg-green-600 hover:bg-green-700 text-white px-6 py-2 rounded-lg">OK</button>
                     </div>
                   </div>